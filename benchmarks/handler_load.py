@@ -0,0 +1,245 @@
+"""
+Load-test the notify REST handlers with concurrent requests.
+
+Starts the ``notify`` and ``notify-trigger`` handlers of an in-process
+``NotifyExtension`` on a local port, with SMTP and Slack replaced by stubs,
+and fires concurrent cell registrations and notification triggers at them
+with the Tornado HTTP client. Reports latency percentiles, error rate,
+thread count and memory growth of the process.
+
+Client and server share the process and the IOLoop, so absolute latencies
+include client overhead; compare runs against each other.
+
+Usage:
+    PYTHONPATH=. python benchmarks/handler_load.py [--requests 5000]
+        [--concurrency 200] [--timeout-share 0.5] [--backend-latency 0]
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+from tornado.web import Application
+from traitlets.config import Config
+from jupyter_server.auth import IdentityProvider
+from jupyter_server.base.handlers import JupyterHandler
+
+from jupyterlab_notify.extension import NotifyExtension
+from jupyterlab_notify.resources import read_process_usage
+
+
+class BenchIdentityProvider(IdentityProvider):
+    async def get_user(self, handler):
+        return {"name": "bench-user"}
+
+
+class StubSMTP:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.sent = 0
+
+    def connect(self, *args):
+        pass
+
+    def send_message(self, message):
+        time.sleep(self.latency)
+        self.sent += 1
+
+
+class StubSlack:
+    def __init__(self, latency):
+        self.latency = latency
+        self.sent = 0
+
+    def conversations_open(self, users):
+        return {"channel": {"id": "D0"}}
+
+    def chat_postMessage(self, channel, text):
+        time.sleep(self.latency)
+        self.sent += 1
+
+
+def _rss():
+    usage = read_process_usage(os.getpid())
+    return usage[1] if usage else None
+
+
+def _percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _make_extension(backend_latency):
+    extension = NotifyExtension()
+    extension.update_config(
+        Config(
+            {
+                "NotificationConfig": {
+                    "email": "bench@example.com",
+                    "smtp_class": f"{__name__}.StubSMTP",
+                    "smtp_args": [backend_latency],
+                    "slack_token": "xoxb-bench",
+                    "health_check_interval": 0,
+                    "config_reload_interval": 0,
+                }
+            }
+        )
+    )
+    extension._init_config()
+    extension._init_dispatch()
+    extension.slack_client = StubSlack(backend_latency)
+    extension.slack_imported = True
+    extension.is_listening = True
+    extension.initialize_handlers()
+    return extension
+
+
+def _make_app(extension):
+    # Requests come without XSRF tokens.
+    JupyterHandler.check_xsrf_cookie = lambda self: None
+    handlers = [
+        (pattern, handler, {**kwargs, "name": extension.name})
+        for pattern, handler, kwargs in extension.handlers
+    ]
+    return Application(handlers, identity_provider=BenchIdentityProvider())
+
+
+def _payload(index, mode):
+    return {
+        "cell_id": f"cell-{index}",
+        "mode": mode,
+        "slackEnabled": True,
+        "emailEnabled": True,
+        "successMessage": "Done",
+        "failureMessage": "Failed",
+        # Long enough for custom timeouts to stay pending during the run.
+        "threshold": 3600,
+        "notebook_name": "bench.ipynb",
+    }
+
+
+async def _run(args):
+    extension = _make_extension(args.backend_latency)
+    sock, port = bind_unused_port()
+    server = HTTPServer(_make_app(extension))
+    server.add_sockets([sock])
+    base_url = f"http://127.0.0.1:{port}/api/jupyter-notify"
+    client = AsyncHTTPClient(max_clients=args.concurrency)
+
+    gc.collect()
+    threads_before = threading.active_count()
+    rss_before = _rss()
+    peak_threads = threads_before
+
+    requests = []
+    timeouts = int(args.requests * args.timeout_share)
+    for index in range(args.requests):
+        mode = "custom-timeout" if index < timeouts else "default"
+        requests.append(("notify", _payload(index, mode)))
+        trigger = _payload(index, mode)
+        trigger.update(success=True, timer=mode == "custom-timeout")
+        requests.append(("notify-trigger", trigger))
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def fire(endpoint, payload):
+        nonlocal peak_threads
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.fetch(
+                f"{base_url}/{endpoint}",
+                method="POST",
+                body=json.dumps(payload),
+                raise_error=False,
+                request_timeout=120,
+            )
+            latencies[endpoint].append(time.perf_counter() - started)
+            if response.code != 200:
+                errors[endpoint] += 1
+            peak_threads = max(peak_threads, threading.active_count())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(fire(endpoint, body) for endpoint, body in requests))
+    elapsed = time.perf_counter() - started
+
+    # Let queued notifications go out before measuring the steady state.
+    extension._dispatch_executor.shutdown(wait=True)
+    gc.collect()
+    rss_after = _rss()
+    threads_after = threading.active_count()
+
+    print(
+        f"{len(requests)} requests in {elapsed:.2f}s ({len(requests) / elapsed:.0f}/s)"
+    )
+    print(
+        f"{'endpoint':<16}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}"
+        f"{'p99 ms':>10}{'max ms':>10}"
+    )
+    for endpoint, values in latencies.items():
+        values.sort()
+        print(
+            f"{endpoint:<16}{len(values):>8}{errors[endpoint]:>8}"
+            + "".join(
+                f"{value * 1000:>10.1f}"
+                for value in (
+                    _percentile(values, 0.50),
+                    _percentile(values, 0.95),
+                    _percentile(values, 0.99),
+                    values[-1],
+                )
+            )
+        )
+    total_errors = sum(errors.values())
+    print(f"error rate: {total_errors / len(requests):.2%}")
+    print(
+        f"threads: {threads_before} before, {peak_threads} peak, {threads_after} after"
+    )
+    print(f"pending scheduled calls: {len(extension.scheduler)}")
+    print(f"registered cells: {len(extension.cell_ids)}")
+    if rss_before and rss_after:
+        growth = (rss_after - rss_before) / 2**20
+        print(
+            f"RSS: {rss_before / 2**20:.1f} MiB -> {rss_after / 2**20:.1f} MiB "
+            f"({growth:+.1f} MiB)"
+        )
+
+    extension.scheduler.stop()
+    client.close()
+    server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=5000,
+        help="Number of cells registered and triggered",
+    )
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument(
+        "--timeout-share",
+        type=float,
+        default=0.5,
+        help="Share of cells using the custom-timeout mode",
+    )
+    parser.add_argument(
+        "--backend-latency",
+        type=float,
+        default=0.0,
+        help="Seconds each stubbed SMTP or Slack call takes",
+    )
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Measure the per-cell overhead of ``%%notify`` on tight cells.
+
+Runs the same cell through an in-process IPython shell with and without the
+magic and reports the median and p95 time per execution. SMTP is not set up
+and notifications are captured, so only the magic machinery is measured.
+
+The overhead is a fixed cost per cell, about 100 us on a recent machine: the
+magic dispatch of the armed line and publishing the notification display. On
+a trivial cell such as ``x = 1`` this roughly doubles the execution time; it
+is negligible on any cell doing real work.
+
+Usage:
+    python benchmarks/magic_overhead.py [--runs 2000] [--cell "x = 1"]
+"""
+
+import argparse
+import statistics
+import time
+from unittest.mock import patch
+
+from IPython.core.interactiveshell import InteractiveShell
+from IPython.utils.capture import capture_output
+
+from jupyterlab_notify.magics import NotifyCellCompletionMagics
+
+
+def _time_cell(shell, cell, runs):
+    timings = []
+    with capture_output():
+        for _ in range(runs):
+            started = time.perf_counter()
+            shell.run_cell(cell)
+            timings.append(time.perf_counter() - started)
+    return timings
+
+
+def _summary(timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    return statistics.median(timings), p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=2000)
+    parser.add_argument("--cell", default="x = 1")
+    args = parser.parse_args()
+
+    with patch.object(NotifyCellCompletionMagics, "_setup_smtp_instance"):
+        shell = InteractiveShell.instance()
+        with capture_output():
+            shell.register_magics(NotifyCellCompletionMagics)
+
+        cases = {
+            "plain": args.cell,
+            "%%notify": f"%%notify\n{args.cell}",
+            "%%notify (async)": f"%%notify\nimport asyncio\nawait asyncio.sleep(0)\n{args.cell}",
+            "plain (async)": f"import asyncio\nawait asyncio.sleep(0)\n{args.cell}",
+        }
+        # Warm up caches (compilation, imports) before measuring.
+        for cell in cases.values():
+            _time_cell(shell, cell, 10)
+
+        results = {
+            name: _summary(_time_cell(shell, cell, args.runs))
+            for name, cell in cases.items()
+        }
+
+    print(f"{'case':<20}{'median (us)':>14}{'p95 (us)':>12}")
+    for name, (median, p95) in results.items():
+        print(f"{name:<20}{median * 1e6:>14.1f}{p95 * 1e6:>12.1f}")
+    overhead = results["%%notify"][0] - results["plain"][0]
+    ratio = results["%%notify"][0] / results["plain"][0]
+    print(
+        f"\n%%notify median overhead: {overhead * 1e6:.1f} us per cell"
+        f" ({ratio:.1f}x a plain execution of the cell)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+# Sends needed in the window before the failure rate is trusted.
+MIN_CALLS = 5
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of a notification backend.
+
+    The outcome of the last ``window`` sends is kept; a send that failed or
+    took longer than ``slow_call`` seconds counts as a failure. Once at
+    least ``MIN_CALLS`` sends were made and the failure rate reaches
+    ``failure_rate`` the breaker opens: sends are refused at once instead
+    of waiting for a connect or read timeout. After ``open_seconds``, or as
+    soon as ``half_open`` is called, e.g. after a successful health probe,
+    a single send goes through as a probe and closes the breaker again if
+    it succeeds.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        window: int = 10,
+        slow_call: float = 10.0,
+        open_seconds: float = 30.0,
+        on_change: Optional[Callable[[str, str], None]] = None,
+        log: Optional[logging.Logger] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.on_change = on_change
+        self.log = log or logging.getLogger(__name__)
+        self.clock = clock
+        self.state = CLOSED
+        self.opened_at: Optional[float] = None
+        self._opened_time: Optional[float] = None
+        self.rejected = 0
+        # Changes of state, for cache validation of the status.
+        self.version = 0
+        self._outcomes: Deque[bool] = deque(maxlen=max(1, window))
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a send may go ahead; refused sends are counted."""
+        with self._lock:
+            if (
+                self.state == OPEN
+                and self.clock() - self.opened_at >= self.open_seconds
+            ):
+                self._set_state(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def refusing(self) -> bool:
+        """Whether ``allow`` would refuse a send now; counts nothing."""
+        with self._lock:
+            if self.state == OPEN:
+                return self.clock() - self.opened_at < self.open_seconds
+            return self.state == HALF_OPEN and self._probing
+
+    def record(self, success: bool, latency: float = 0.0) -> None:
+        """Record the outcome of a send allowed by ``allow``."""
+        failed = not success or (self.slow_call > 0 and latency > self.slow_call)
+        with self._lock:
+            if self.state == HALF_OPEN and self._probing:
+                self._probing = False
+                if failed:
+                    self._open()
+                else:
+                    self._outcomes.clear()
+                    self._set_state(CLOSED)
+                return
+            if self.state != CLOSED:
+                return
+            self._outcomes.append(failed)
+            if (
+                self.failure_rate > 0
+                and len(self._outcomes) >= MIN_CALLS
+                and sum(self._outcomes) >= self.failure_rate * len(self._outcomes)
+            ):
+                self._open()
+
+    def half_open(self) -> None:
+        """Let the next send probe the backend before the cooldown ended."""
+        with self._lock:
+            if self.state == OPEN:
+                self._set_state(HALF_OPEN)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """State and UNIX time it last opened; only changes with ``version``."""
+        with self._lock:
+            return {"state": self.state, "opened_at": self._opened_time}
+
+    def _open(self) -> None:
+        self.opened_at = self.clock()
+        self._opened_time = time.time()
+        self._outcomes.clear()
+        self._set_state(OPEN)
+
+    def _set_state(self, state: str) -> None:
+        if state == self.state:
+            return
+        if state == OPEN:
+            self.log.warning(
+                f"{self.name} notifications failing, pausing sends for "
+                f"{self.open_seconds:g}s"
+            )
+        elif state == CLOSED:
+            self.log.info("%s notifications resumed", self.name)
+        self.state = state
+        self.version += 1
+        if self.on_change is not None:
+            self.on_change(self.name, state)
@@ -1,13 +1,27 @@
 from getpass import getuser
 from pathlib import Path
+from jupyter_core.paths import jupyter_data_dir
 from traitlets.config import Configurable
-from traitlets import Unicode, default, Any
+from traitlets import (
+    Unicode,
+    Int,
+    Float,
+    Bool,
+    Dict as DictTrait,
+    List,
+    default,
+    Any,
+)
 from importlib import import_module
 import inspect
-from dataclasses import dataclass, fields
+from dataclasses import MISSING, dataclass, fields
 from typing import Optional, Dict
 from threading import Timer
 
+from .resources import ResourceUsage
+from .routing import Router, RoutingRuleError
+from .templates import TemplateError, TemplateSet
+
 
 @dataclass
 class NotificationParams:
@@ -23,19 +37,78 @@ class NotificationParams:
     timer: Optional[Timer] = None
     start_time: Optional[str] = None
     notebook_name: Optional[str] = None
+    notebook_path: Optional[str] = None
+    kernel_id: Optional[str] = None
     execution_count: Optional[int] = None
     notification_sent: bool = False
+    duration: Optional[float] = None
+    baseline_p95: Optional[float] = None
+    baseline_mean: Optional[float] = None
+    resources: Optional[ResourceUsage] = None
+    in_live_run: bool = False
+    recipient_email: Optional[str] = None
+    recipient_slack_id: Optional[str] = None
+    user: Optional[str] = None
+    run_total: Optional[int] = None
+    run_done: int = 0
+    msg_id: Optional[str] = None
+    timed_out: bool = False
+    registered_at: Optional[float] = None
+
+
+# Fields set by the server while it follows a cell, never taken from requests.
+SERVER_FIELDS = frozenset(
+    {
+        "timer",
+        "notification_sent",
+        "duration",
+        "baseline_p95",
+        "baseline_mean",
+        "resources",
+        "in_live_run",
+        "recipient_email",
+        "recipient_slack_id",
+        "user",
+        "run_total",
+        "run_done",
+        "timed_out",
+        "registered_at",
+    }
+)
+
+
+def notification_params_from_dict(
+    data: Dict[str, Any], trusted: bool = False
+) -> NotificationParams:
+    """
+    Convert JSON data to NotificationParams.
 
+    Unknown fields are dropped, and so are ``SERVER_FIELDS`` unless
+    ``trusted``, i.e. the data was written by the server itself.
 
-def notification_params_from_dict(data: Dict[str, Any]) -> NotificationParams:
-    """Convert JSON data to NotificationParams."""
+    Raises:
+        ValueError: If the data is not an object or lacks required fields.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
 
     # Get valid field names from NotificationParams
     allowed_fields = {f.name for f in fields(NotificationParams)}
+    if not trusted:
+        allowed_fields -= SERVER_FIELDS
 
     # Filter out unexpected fields
     filtered_data = {k: v for k, v in data.items() if k in allowed_fields}
 
+    missing = [
+        f.name
+        for f in fields(NotificationParams)
+        if f.default is MISSING
+        and f.default_factory is MISSING
+        and f.name not in filtered_data
+    ]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
     return NotificationParams(**filtered_data)
 
 
@@ -84,11 +157,374 @@ class NotificationConfig(Configurable):
         config=True,
     )
 
+    slack_live_status = Bool(
+        False,
+        config=True,
+        help=(
+            "Post one Slack message per notebook run and edit it as cells "
+            "complete, instead of one message per cell"
+        ),
+    )
+
+    slack_live_status_interval = Float(
+        5.0,
+        config=True,
+        help="Minimum interval in seconds between edits of a Slack run status message",
+    )
+
+    recipients_file = Unicode(
+        "",
+        config=True,
+        help=(
+            "Path of a JSON file mapping Jupyter user names to their email and "
+            'Slack user ID, e.g. {"alice": {"email": "alice@example.com", '
+            '"slack_user_id": "U123"}}'
+        ),
+    )
+
+    recipients_source = Any(
+        None,
+        allow_none=True,
+        config=True,
+        help=(
+            "Callable, or 'module.function' name of one, returning the mapping of "
+            "Jupyter user names to recipients; takes precedence over recipients_file"
+        ),
+    )
+
+    recipients_ttl = Float(
+        300.0,
+        config=True,
+        help="Interval in seconds at which the recipients mapping is reloaded",
+    )
+
+    routing_rules = List(
+        DictTrait(),
+        config=True,
+        help=(
+            "Rules sending notifications to other destinations, first match wins. "
+            "Each rule matches a 'notebook' path glob ('**' spans directories), "
+            "a 'status' and a 'user' (strings or lists, all optional), and sends "
+            "to its 'slack_channel', 'slack_user_id' and/or 'email' instead of "
+            "the defaults"
+        ),
+    )
+
+    message_max_bytes = DictTrait(
+        default_value={"slack": 3500, "email": 65536},
+        key_trait=Unicode(),
+        value_trait=Int(),
+        config=True,
+        help=(
+            "Maximum size in bytes of a notification message per backend, keyed "
+            "by 'slack' and 'email'. Longer errors are condensed to their first "
+            "and last lines; errors are never kept longer than the largest limit"
+        ),
+    )
+
+    message_templates = DictTrait(
+        key_trait=Unicode(),
+        value_trait=Unicode(),
+        config=True,
+        help=(
+            "Message templates keyed by format, optionally narrowed to a mode and "
+            "a status as 'format:mode:status' ('*' matches any). Formats are "
+            "'text', 'slack' (mrkdwn), 'slack_blocks' (a Block Kit JSON list), "
+            "'email' and 'email_html'; 'slack' and 'email' default to 'text'. "
+            "Templates use $field placeholders: notebook, notebook_line, "
+            "notebook_path, cell_id, cell_info, execution_count, mode, user, "
+            "status, message, error, duration, resources and resources_line"
+        ),
+    )
+
+    error_store_max_bytes = Int(
+        0,
+        config=True,
+        help=(
+            "Memory in bytes used to keep the full text of condensed errors, "
+            "compressed, for retrieval from the server; 0 disables the store"
+        ),
+    )
+
+    iopub_tracking = Bool(
+        True,
+        config=True,
+        help=(
+            "Follow cell executions from the kernels' IOPub messages when "
+            "jupyter_server_nbmodel is not installed, so notifications do not "
+            "depend on the browser staying connected"
+        ),
+    )
+
+    event_trace_path = Unicode(
+        "",
+        config=True,
+        help=(
+            "Path of a JSON lines file recording the timing of every cell "
+            "execution event and registration, anonymised, for replay with "
+            "jupyter notify-replay; empty disables recording"
+        ),
+    )
+
+    event_batch_size = Int(
+        256,
+        config=True,
+        help="Maximum number of nbmodel events processed per IOLoop iteration",
+    )
+
+    dispatch_workers = Int(
+        4,
+        config=True,
+        help="Number of worker threads used to deliver Slack and email notifications",
+    )
+
+    dispatch_aging = Float(
+        30.0,
+        config=True,
+        help=(
+            "Head start in seconds given to each notification priority level: "
+            "failures go before timeouts, and timeouts before successes, unless "
+            "the lower priority notification has waited this much longer"
+        ),
+    )
+
+    dispatch_concurrency = DictTrait(
+        key_trait=Unicode(),
+        value_trait=Int(),
+        config=True,
+        help=(
+            "Maximum number of workers sending each class of notification at once, "
+            "keyed by 'failure', 'timeout' and 'success', and running periodic "
+            "work, keyed by 'housekeeping'. By default successes may use all "
+            "workers but one, which stays available for alerts, and housekeeping "
+            "half of them"
+        ),
+    )
+
+    heartbeat_count = Int(
+        0,
+        config=True,
+        help=(
+            "Number of 'still running' notifications sent after a custom timeout "
+            "fires, while the cell keeps executing"
+        ),
+    )
+
+    heartbeat_factor = Float(
+        2.0,
+        config=True,
+        help=(
+            "Growth factor of the elapsed time between 'still running' notifications; "
+            "with a factor of 2 they fire at 2x, 4x, 8x... the timeout"
+        ),
+    )
+
+    config_reload_interval = Float(
+        5.0,
+        config=True,
+        help=(
+            "Interval in seconds at which the notify config files are checked for "
+            "changes and reloaded; 0 disables reloading"
+        ),
+    )
+
+    breaker_failure_rate = Float(
+        0.5,
+        config=True,
+        help=(
+            "Fraction of failed or slow sends among the last breaker_window "
+            "sends of a backend that opens its circuit breaker; 0 disables it"
+        ),
+    )
+
+    breaker_window = Int(
+        10,
+        config=True,
+        help="Number of recent sends per backend the failure rate is computed on",
+    )
+
+    breaker_slow_call = Float(
+        10.0,
+        config=True,
+        help="Seconds after which a send counts as failed; 0 counts only errors",
+    )
+
+    breaker_open_seconds = Float(
+        30.0,
+        config=True,
+        help=(
+            "Seconds sends to a backend are refused once its breaker opened, "
+            "before a single probe send is tried"
+        ),
+    )
+
+    health_check_interval = Float(
+        60.0,
+        config=True,
+        help=(
+            "Interval in seconds between SMTP and Slack health probes; "
+            "0 disables the probes"
+        ),
+    )
+
+    history_path = Unicode(
+        "",
+        config=True,
+        help=(
+            "Path of the SQLite database recording sent notifications; "
+            "empty disables the history"
+        ),
+    )
+
+    history_max_age_days = Int(
+        90,
+        config=True,
+        help="Delete history entries older than this many days; 0 keeps them forever",
+    )
+
+    history_max_rows = Int(
+        1_000_000,
+        config=True,
+        help="Maximum number of history entries kept; 0 means no limit",
+    )
+
+    regression_factor = Float(
+        1.5,
+        config=True,
+        help=(
+            "In regression mode, notify when a cell runs longer than its "
+            "historical p95 execution time multiplied by this factor"
+        ),
+    )
+
+    regression_min_samples = Int(
+        5,
+        config=True,
+        help=(
+            "Number of successful runs of a cell recorded before regression mode "
+            "starts comparing its execution time"
+        ),
+    )
+
+    duration_history_path = Unicode(
+        "",
+        config=True,
+        help=(
+            "Path of the JSON file persisting per-cell execution time statistics; "
+            "empty keeps them in memory only"
+        ),
+    )
+
+    profile_enabled = Bool(
+        False,
+        config=True,
+        help=(
+            "Record the execution time of every cell, not only the ones with "
+            "notifications, and serve per-notebook profiles"
+        ),
+    )
+
+    profile_max_notebooks = Int(
+        64,
+        config=True,
+        help="Maximum number of notebooks profiled; the least recently active are dropped",
+    )
+
+    profile_max_runs = Int(
+        2000,
+        config=True,
+        help="Number of most recent cell runs kept in each notebook timeline",
+    )
+
+    resource_sample_interval = Float(
+        1.0,
+        config=True,
+        help=(
+            "Interval in seconds at which the kernel CPU time and memory are "
+            "sampled while cells with notifications run; 0 disables the sampling"
+        ),
+    )
+
+    mail_queue_max = Int(
+        100,
+        config=True,
+        help=(
+            "Maximum number of kernel mails queued on the notification workers; "
+            "further mails are refused, for the kernels to send them with their "
+            "own SMTP settings. 0 for no limit"
+        ),
+    )
+
+    mail_rate_limit = Float(
+        10.0,
+        config=True,
+        help=(
+            "Kernel mails each user may send through the server per minute, "
+            "after a burst of mail_rate_burst; further mails are refused with "
+            "429. 0 for no limit"
+        ),
+    )
+
+    mail_rate_burst = Int(
+        10,
+        config=True,
+        help="Kernel mails a user may send at once before mail_rate_limit applies",
+    )
+
+    registration_timeout = Float(
+        86400.0,
+        config=True,
+        help=(
+            "Seconds after which cells and notebook runs registered for "
+            "notifications that did not start executing are forgotten, e.g. when "
+            "their execution was interrupted before they ran; 0 keeps them until "
+            "they run"
+        ),
+    )
+
+    shutdown_timeout = Float(
+        10.0,
+        config=True,
+        help=(
+            "Seconds the server waits on shutdown for queued notifications to be "
+            "sent; the ones not sent by then are spooled and sent on next start"
+        ),
+    )
+
+    spool_path = Unicode(
+        config=True,
+        help="Path of the JSON lines file holding notifications not sent at shutdown",
+    )
+
+    @default("spool_path")
+    def _default_spool_path(self):
+        return str(Path(jupyter_data_dir()) / "notify" / "spool.jsonl")
+
     def __init__(self, config=None, logger=None, **kwargs):
         super().__init__(config=config, **kwargs)
         self.log = logger
         self.smtp_instance = None
         self._setup_smtp_instance()
+        self.router = self._compile_routing_rules()
+        self.templates = self._compile_templates()
+
+    def _compile_routing_rules(self):
+        if not self.routing_rules:
+            return None
+        try:
+            return Router(self.routing_rules)
+        except RoutingRuleError as e:
+            if self.log:
+                self.log.error(f"Routing rules ignored: {str(e)}")
+            return None
+
+    def _compile_templates(self):
+        try:
+            return TemplateSet(self.message_templates)
+        except TemplateError as e:
+            if self.log:
+                self.log.error(f"Message templates ignored: {str(e)}")
+            return TemplateSet()
 
     def _setup_smtp_instance(self):
         try:
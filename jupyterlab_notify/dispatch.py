@@ -0,0 +1,141 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+FAILURE = 0
+TIMEOUT = 1
+SUCCESS = 2
+# Periodic work of the extension: health probes, configuration polling,
+# resource samples, live status edits and statistics saves.
+HOUSEKEEPING = 3
+PRIORITY_NAMES = ("failure", "timeout", "success", "housekeeping")
+
+_WorkItem = Tuple[float, Future, Callable[..., Any], Tuple[Any, ...], Dict[str, Any]]
+
+
+class PriorityDispatcher(Executor):
+    """
+    Thread pool running failure alerts before timeouts, timeouts before
+    successes, and successes before the extension's housekeeping.
+
+    Each priority class has its own FIFO queue. A task is ranked by its
+    submission time plus ``aging`` seconds per priority level, so a success
+    that waited longer than ``aging`` goes ahead of a new timeout and cannot
+    be starved. ``budgets`` caps the number of workers running each class at
+    once; keeping the success budget below ``max_workers`` leaves workers
+    free for alerts while a run-all floods the pool with successes.
+
+    ``submit`` uses ``default_priority``, which lets the dispatcher serve as
+    the executor of the ``Scheduler``.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        budgets: Optional[Dict[int, int]] = None,
+        aging: float = 30.0,
+        default_priority: int = TIMEOUT,
+        thread_name_prefix: str = "notify-dispatch",
+        log: Optional[logging.Logger] = None,
+    ) -> None:
+        self.max_workers = max(1, max_workers)
+        self.budgets = [self.max_workers] * len(PRIORITY_NAMES)
+        for priority, budget in (budgets or {}).items():
+            self.budgets[priority] = max(1, min(budget, self.max_workers))
+        self.aging = aging
+        self.default_priority = default_priority
+        self.thread_name_prefix = thread_name_prefix
+        self.log = log or logging.getLogger(__name__)
+        self._queues: List[Deque[_WorkItem]] = [deque() for _ in PRIORITY_NAMES]
+        self._running = [0] * len(PRIORITY_NAMES)
+        self._threads: List[threading.Thread] = []
+        self._idle = 0
+        self._condition = threading.Condition()
+        self._shutdown = False
+
+    def queued(self) -> Dict[str, int]:
+        """Number of queued tasks per priority class."""
+        with self._condition:
+            return {
+                name: len(queue) for name, queue in zip(PRIORITY_NAMES, self._queues)
+            }
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        return self.submit_with_priority(self.default_priority, fn, *args, **kwargs)
+
+    def submit_with_priority(
+        self, priority: int, fn: Callable[..., Any], /, *args: Any, **kwargs: Any
+    ) -> Future:
+        """Queue ``fn(*args, **kwargs)`` in the given priority class."""
+        future: Future = Future()
+        rank = time.monotonic() + priority * self.aging
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            self._queues[priority].append((rank, future, fn, args, kwargs))
+            if self._idle == 0 and len(self._threads) < self.max_workers:
+                thread = threading.Thread(
+                    target=self._work,
+                    name=f"{self.thread_name_prefix}_{len(self._threads)}",
+                    daemon=True,
+                )
+                self._threads.append(thread)
+                thread.start()
+            else:
+                self._condition.notify()
+        return future
+
+    def _next_priority(self) -> Optional[int]:
+        """Class of the best ranked queued task that is within its budget."""
+        best = None
+        for priority, queue in enumerate(self._queues):
+            if not queue or self._running[priority] >= self.budgets[priority]:
+                continue
+            if best is None or queue[0][0] < self._queues[best][0][0]:
+                best = priority
+        return best
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while True:
+                    priority = self._next_priority()
+                    if priority is not None:
+                        break
+                    if self._shutdown and not any(self._queues):
+                        return
+                    self._idle += 1
+                    self._condition.wait()
+                    self._idle -= 1
+                _, future, fn, args, kwargs = self._queues[priority].popleft()
+                self._running[priority] += 1
+
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        result = fn(*args, **kwargs)
+                    except BaseException as exc:
+                        future.set_exception(exc)
+                    else:
+                        future.set_result(result)
+            finally:
+                with self._condition:
+                    self._running[priority] -= 1
+                    # Tasks of this class may have waited for the freed slot.
+                    self._condition.notify_all()
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        with self._condition:
+            self._shutdown = True
+            if cancel_futures:
+                for queue in self._queues:
+                    for item in queue:
+                        item[1].cancel()
+                    queue.clear()
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
@@ -0,0 +1,140 @@
+import re
+import threading
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+# CSI sequences (colors, cursor moves) and OSC sequences (titles, links).
+_ANSI = re.compile(r"\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)")
+
+# Longest run of lines, e.g. the frames of a recursion, collapsed when repeated.
+MAX_REPEATED_BLOCK = 8
+
+
+def strip_ansi(text: str) -> str:
+    return _ANSI.sub("", text)
+
+
+def collapse_repeats(
+    lines: List[str], max_block: int = MAX_REPEATED_BLOCK
+) -> List[str]:
+    """Replace consecutive repetitions of a block of lines by a count."""
+    collapsed: List[str] = []
+    i = 0
+    while i < len(lines):
+        for size in range(1, min(max_block, (len(lines) - i) // 2) + 1):
+            block = lines[i : i + size]
+            repeats = 1
+            while lines[i + repeats * size : i + (repeats + 1) * size] == block:
+                repeats += 1
+            if (repeats - 1) * size > 1:
+                collapsed.extend(block)
+                noun = "line" if size == 1 else f"{size} lines"
+                collapsed.append(f"[Previous {noun} repeated {repeats - 1} more times]")
+                i += repeats * size
+                break
+        else:
+            collapsed.append(lines[i])
+            i += 1
+    return collapsed
+
+
+def _clip(line: str, budget: int) -> str:
+    """Keep the start and end of a line longer than ``budget`` bytes."""
+    data = line.encode("utf-8")
+    if len(data) <= budget:
+        return line
+    half = max(0, (budget - 40) // 2)
+    omitted = len(data) - 2 * half
+    return (
+        data[:half].decode("utf-8", "ignore")
+        + f" ... [{omitted} bytes omitted] ... "
+        + data[len(data) - half :].decode("utf-8", "ignore")
+    )
+
+
+def condense(text: str, max_bytes: int) -> Tuple[str, bool]:
+    """
+    Condense an error or message to at most about ``max_bytes`` bytes.
+
+    ANSI escape codes are removed and repeated frames collapsed. If the text
+    is still too long, its first lines and its last lines, which hold the
+    exception, are kept around a marker of what was left out.
+
+    Returns:
+        Tuple of (condensed text, whether any content was dropped).
+    """
+    lines = collapse_repeats(strip_ansi(text).splitlines())
+    sizes = [len(line.encode("utf-8")) + 1 for line in lines]
+    if sum(sizes) <= max_bytes:
+        return "\n".join(lines), False
+
+    # A third for the head, the rest for the tail and the marker.
+    head_budget = max_bytes // 3
+    tail_budget = max_bytes - head_budget - 64
+    tail: List[str] = []
+    end = len(lines)
+    while end > 0 and sizes[end - 1] <= tail_budget:
+        end -= 1
+        tail_budget -= sizes[end]
+        tail.append(lines[end])
+    if not tail and lines:
+        # The last line alone is over the budget, e.g. a huge exception repr.
+        end -= 1
+        tail.append(_clip(lines[end], tail_budget))
+    tail.reverse()
+
+    head: List[str] = []
+    start = 0
+    while start < end and sizes[start] <= head_budget:
+        head_budget -= sizes[start]
+        head.append(lines[start])
+        start += 1
+    if start < end and not head:
+        head.append(_clip(lines[start], head_budget))
+        start += 1
+
+    omitted = end - start
+    if omitted:
+        head.append(f"... [{omitted} lines omitted] ...")
+    return "\n".join(head + tail), True
+
+
+class ErrorStore:
+    """
+    Full error texts, zlib compressed, held in memory for later retrieval.
+
+    The oldest entries are dropped once the compressed total exceeds
+    ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, text: str) -> Optional[str]:
+        """Store a text; returns its key, or None if it does not fit at all."""
+        data = zlib.compress(text.encode("utf-8"))
+        if len(data) > self.max_bytes:
+            return None
+        key = uuid.uuid4().hex[:16]
+        with self._lock:
+            self._entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+        return key
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            data = self._entries.get(key)
+        if data is None:
+            return None
+        return zlib.decompress(data).decode("utf-8")
@@ -1,45 +1,882 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import asdict, fields
+from email import message_from_string
 from email.message import EmailMessage
-from typing import Dict, Any, Optional
+from email.policy import default as default_policy
+from functools import partial
+from importlib import import_module
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
 
 from jupyter_server.extension.application import ExtensionApp
-from .handlers import NotifyHandler, NotifyTriggerHandler
-from .config import NotificationConfig, NotificationParams
-from datetime import datetime, timedelta
+from traitlets.config import Config
+from .handlers import (
+    NotifyErrorHandler,
+    NotifyHandler,
+    NotifyHistoryHandler,
+    NotifyMailHandler,
+    NotifyProfileHandler,
+    NotifyRunHandler,
+    NotifyRunningHandler,
+    NotifyTriggerHandler,
+)
+from .config import (
+    NotificationConfig,
+    NotificationParams,
+    notification_params_from_dict,
+)
+from .errors import ErrorStore, condense
+from .dispatch import (
+    FAILURE,
+    HOUSEKEEPING,
+    PRIORITY_NAMES,
+    SUCCESS,
+    TIMEOUT,
+    PriorityDispatcher,
+)
+from .breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from .health import HealthMonitor
+from .history import HistoryStore
+from .intake import EventBatch, EventIntake
+from .iopub import KERNEL_ACTIONS_SCHEMA_ID, IOPubTracker
+from .live_status import Destination, SlackLiveStatus
+from .mail import build_rich_message
+from . import metrics
+from .profile import ExecutionProfiler
+from .ratelimit import RateLimiter
+from .recipients import RecipientDirectory, load_recipients_file
+from .resources import ResourceSampler, ResourceUsage
+from .running import RunningCell, RunningIndex
+from .runs import RunTracker, TrackedRun
+from .scheduler import Scheduler
+from .stats import DurationHistory
+from .templates import MessageFields, RenderedMessage
+from .trace import EventRecorder
+from datetime import datetime, timedelta, timezone
 
 NBMODEL_SCHEMA_ID = (
     "https://events.jupyter.org/jupyter_server_nbmodel/cell_execution/v1"
 )
 
+# Seconds a health probe may wait for the SMTP session and its reply.
+HEALTH_PROBE_TIMEOUT = 10.0
+
+# Seconds between saves of the cell duration statistics.
+DURATION_SAVE_INTERVAL = 30.0
+
+# Longest time between two checks for expired cell registrations.
+REGISTRATION_SWEEP_INTERVAL = 60.0
+
+# Modes notifying every completion, which a live run status can report.
+_LIVE_STATUS_MODES = frozenset({"default", "custom-timeout"})
+
+
+def _parse_timestamp(value: str) -> datetime:
+    """Parse an ISO 8601 timestamp, accepting the ``Z`` suffix used by nbmodel."""
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value)
+
+
+def _elapsed_since(timestamp: Optional[str]) -> Optional[float]:
+    """Seconds since an ISO 8601 timestamp, None if missing or invalid."""
+    if not timestamp:
+        return None
+    try:
+        start = _parse_timestamp(timestamp)
+    except ValueError:
+        return None
+    now = datetime.now(start.tzinfo) if start.tzinfo else datetime.now()
+    return max(0.0, (now - start).total_seconds())
+
+
+class QueuedMail(NamedTuple):
+    """A kernel mail handed to the notification workers."""
+
+    message: EmailMessage
+    # False for failures, sent ahead of successes and spooled as such.
+    success: bool
+
+
+_BREAKER_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def _export_breaker_state(backend: str, state: str) -> None:
+    metrics.BACKEND_CIRCUIT_STATE.labels(backend=backend).set(
+        _BREAKER_STATE_VALUES[state]
+    )
+
+
+def _notebook_key(params: NotificationParams) -> str:
+    """Identify the notebook of a registration, by path when known."""
+    return params.notebook_path or params.notebook_name or ""
+
+
+def _live_destination(params: NotificationParams) -> Destination:
+    """The Slack destination of the live run status of a registration."""
+    return (params.recipient_slack_id, None)
+
+
+def _cell_label(params: NotificationParams) -> str:
+    if params.execution_count is not None:
+        return f"Cell [{params.execution_count}]"
+    return f"Cell {params.cell_id[:8]}"
+
+
+def _format_bytes(size: float) -> str:
+    """Format a size in bytes as e.g. ``1.5 GiB``."""
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024:
+            break
+        size /= 1024
+    else:
+        unit = "TiB"
+    return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+
+
+def _format_duration(seconds: float) -> str:
+    """Format a duration as e.g. ``1h 2m 3s``."""
+    minutes, secs = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    parts = []
+    if hours:
+        parts.append(f"{hours}h")
+    if minutes:
+        parts.append(f"{minutes}m")
+    if secs or not parts:
+        parts.append(f"{secs}s")
+    return " ".join(parts)
+
 
 class NotifyExtension(ExtensionApp):
     name = "notify"
 
+    _dispatch_executor: Optional[PriorityDispatcher] = None
+    _intake: Optional[EventIntake] = None
+    scheduler: Optional[Scheduler] = None
+    health: Optional[HealthMonitor] = None
+    breakers: Optional[Dict[str, CircuitBreaker]] = None
+    mail_limiter: Optional[RateLimiter] = None
+    history: Optional[HistoryStore] = None
+    durations: Optional[DurationHistory] = None
+    profiler: Optional[ExecutionProfiler] = None
+    resources: Optional[ResourceSampler] = None
+    live_status: Optional[SlackLiveStatus] = None
+    runs: Optional[RunTracker] = None
+    running: Optional[RunningIndex] = None
+    recipients: Optional[RecipientDirectory] = None
+    errors: Optional[ErrorStore] = None
+    recorder: Optional[EventRecorder] = None
+    iopub: Optional[IOPubTracker] = None
+
     def initialize(self) -> None:
         """Initialize extension, configuration, logging, and event listeners."""
         self._init_config()
+        self._init_dispatch()
+        self._init_spool()
+        self._init_mail_limiter()
+        self._init_resources()
+        self._init_live_status()
+        self._init_registration_expiry()
+        self._init_recipients()
+        self._init_errors()
+        self._init_config_watcher()
+        self._init_breakers()
+        self._init_health_checks()
+        self._init_history()
+        self._init_durations()
+        self._init_profiler()
+        self._init_recorder()
         self._init_nbmodel_listener()
+        self._init_iopub_tracker()
         super().initialize()
 
+    async def stop_extension(self) -> None:
+        """
+        Drain pending work before the server exits.
+
+        Timers are cancelled in bulk and queued events processed. Queued
+        notifications are then sent concurrently by the worker pool until
+        ``shutdown_timeout``; those not started by then are spooled and sent
+        on next start. A summary is logged and kept in ``shutdown_report``.
+        """
+        started = time.monotonic()
+        deadline = started + self._config.shutdown_timeout
+        report = self.shutdown_report = {
+            "timers_cancelled": 0,
+            "events_drained": 0,
+            "delivered": 0,
+            "in_progress": 0,
+            "spooled": 0,
+        }
+
+        if self.iopub is not None:
+            self.iopub.close()
+        if self.scheduler is not None:
+            report["timers_cancelled"] = len(self.scheduler.stop())
+        if self.live_status is not None:
+            self.live_status.close()
+        if self._intake is not None:
+            report["events_drained"] = len(self._intake)
+            await self._intake.flush()
+
+        if self._dispatch_executor is not None:
+            with self._in_flight_lock:
+                in_flight = dict(self._in_flight)
+            if in_flight:
+                await asyncio.wait(
+                    [asyncio.wrap_future(future) for future in in_flight],
+                    timeout=max(0.0, deadline - time.monotonic()),
+                )
+            undelivered = []
+            for future, notifications in in_flight.items():
+                if future.cancel():
+                    undelivered.extend(notifications)
+                elif future.done():
+                    report["delivered"] += len(notifications)
+                else:
+                    # Already being sent; the worker finishes it on its own.
+                    report["in_progress"] += len(notifications)
+            self._dispatch_executor.shutdown(wait=False)
+            self._dispatch_executor = None
+            report["spooled"] = self._spool(undelivered)
+
+        if self.durations is not None:
+            self.durations.save()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.history is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.history.close, max(0.0, deadline - time.monotonic())
+            )
+
+        report["duration"] = round(time.monotonic() - started, 3)
+        self.log.info(
+            "Notify extension stopped in %.2fs: %d timers cancelled, %d events "
+            "drained, %d notifications sent, %d in progress, %d spooled",
+            report["duration"],
+            report["timers_cancelled"],
+            report["events_drained"],
+            report["delivered"],
+            report["in_progress"],
+            report["spooled"],
+        )
+
     def _init_config(self) -> None:
         """Initialize and set up the notification configuration."""
-        self._config = NotificationConfig(config=self.config, log=self.log)
-        self.slack_client = None
-        self.slack_imported = False
+        self._config_lock = threading.RLock()
+        # SMTP sessions are not thread-safe; serialize their use.
+        self._smtp_lock = threading.Lock()
+        # Guards the registrations and the timers scheduled for them.
+        self._timer_lock = threading.Lock()
+        self.config_generation = 0
+        self.config_loaded_at = time.time()
+        self.config_reload_error: Optional[str] = None
 
-        # Initialize email and Slack configuration
-        self.email = self._config.email
-        self.slack_user_id = self._config.slack_user_id
-        self.slack_channel_name = self._config.slack_channel_name
+        config = NotificationConfig(config=self.config, logger=self.log)
+        self._apply_config(config, *self._create_slack_client(config))
 
+    def _create_slack_client(self, config: NotificationConfig) -> Tuple[Any, bool]:
+        """
+        Create a Slack client for the given configuration.
+
+        Returns:
+            Tuple of (client, imported). The client is None without a token.
+        """
         try:
             from slack_sdk import WebClient
 
-            if self._config.slack_token:
-                self.slack_client = WebClient(token=self._config.slack_token)
-            self.slack_imported = True
+            client = None
+            if config.slack_token:
+                client = WebClient(token=config.slack_token)
+            return client, True
         except Exception as e:
             self.log.debug(f"Failed to configure slack: {e}")
-            self.slack_imported = False
+            return None, False
+
+    def _apply_config(
+        self, config: NotificationConfig, slack_client: Any, slack_imported: bool
+    ) -> None:
+        """Swap in a configuration and its backends in one step."""
+        with self._config_lock:
+            self._config = config
+            self.slack_client = slack_client
+            self.slack_imported = slack_imported
+
+            # Initialize email and Slack configuration
+            self.email = config.email
+            self.slack_user_id = config.slack_user_id
+            self.slack_channel_name = config.slack_channel_name
+            # DM channel ids by Slack user id, valid for this client only.
+            self._dm_channels: Dict[str, str] = {}
+
+    def _init_breakers(self) -> None:
+        """Create the circuit breakers of the SMTP and Slack backends."""
+        self.breakers = {
+            name: CircuitBreaker(
+                name,
+                failure_rate=self._config.breaker_failure_rate,
+                window=self._config.breaker_window,
+                slow_call=self._config.breaker_slow_call,
+                open_seconds=self._config.breaker_open_seconds,
+                on_change=_export_breaker_state,
+                log=self.log,
+            )
+            for name in ("smtp", "slack")
+        }
+        for name in self.breakers:
+            _export_breaker_state(name, CLOSED)
+
+    def _init_health_checks(self) -> None:
+        """Start periodic health probes of the SMTP and Slack backends."""
+        self.health = HealthMonitor(
+            {"smtp": self._probe_smtp, "slack": self._probe_slack}, log=self.log
+        )
+        if self._config.health_check_interval > 0:
+            self.scheduler.call_later(0, self._run_health_checks)
+
+    def _run_health_checks(self) -> None:
+        try:
+            self.health.run()
+            for name, breaker in (self.breakers or {}).items():
+                if self.health.is_healthy(name):
+                    # Probe with the next send rather than wait for the cooldown.
+                    breaker.half_open()
+        finally:
+            interval = self._config.health_check_interval
+            if interval > 0:
+                try:
+                    self.scheduler.call_later(interval, self._run_health_checks)
+                except RuntimeError:
+                    # Scheduler stopped, the server is shutting down.
+                    pass
+
+    def _probe_smtp(self) -> None:
+        """Check the SMTP session with a NOOP command."""
+        with self._config_lock:
+            smtp_instance = self._config.smtp_instance
+        if smtp_instance is None:
+            raise RuntimeError("SMTP is not configured")
+        noop = getattr(smtp_instance, "noop", None)
+        if not callable(noop):
+            # Custom SMTP classes are not required to implement NOOP.
+            return
+        # Sends wait on the lock, so neither it nor the reply may block for long.
+        if not self._smtp_lock.acquire(timeout=HEALTH_PROBE_TIMEOUT):
+            # A send holds the session, its outcome feeds the circuit breaker.
+            return
+        try:
+            sock = getattr(smtp_instance, "sock", None)
+            previous = sock.gettimeout() if sock is not None else None
+            if sock is not None:
+                sock.settimeout(HEALTH_PROBE_TIMEOUT)
+            try:
+                reply = noop()
+            finally:
+                if sock is not None and sock.fileno() != -1:
+                    sock.settimeout(previous)
+        finally:
+            self._smtp_lock.release()
+        code = reply[0] if isinstance(reply, tuple) else None
+        if code is not None and code != 250:
+            raise RuntimeError(f"SMTP NOOP returned {code}: {reply[1]!r}")
+
+    def _probe_slack(self) -> None:
+        """Check the Slack token with ``auth.test``."""
+        with self._config_lock:
+            slack_client = self.slack_client
+        if slack_client is None:
+            raise RuntimeError("Slack is not configured")
+        slack_client.auth_test()
+
+    def _init_history(self) -> None:
+        """Open the notification history store if one is configured."""
+        if not self._config.history_path:
+            return
+        try:
+            self.history = HistoryStore(
+                self._config.history_path,
+                max_age_days=self._config.history_max_age_days,
+                max_rows=self._config.history_max_rows,
+                log=self.log,
+            )
+        except Exception as exc:
+            self.log.error(f"Failed to open notification history: {exc}")
+
+    def _init_durations(self) -> None:
+        """Load the per-cell execution time statistics used by regression mode."""
+        self.durations = DurationHistory(
+            self._config.duration_history_path, log=self.log
+        )
+        if self.durations.path:
+            self.scheduler.call_later(DURATION_SAVE_INTERVAL, self._save_durations)
+
+    def _save_durations(self) -> None:
+        try:
+            self.durations.save()
+        finally:
+            try:
+                self.scheduler.call_later(DURATION_SAVE_INTERVAL, self._save_durations)
+            except RuntimeError:
+                # Scheduler stopped, the server is shutting down.
+                pass
+
+    def _init_profiler(self) -> None:
+        """Record the timeline of every cell run if profiling is enabled."""
+        if self._config.profile_enabled:
+            self.profiler = ExecutionProfiler(
+                max_notebooks=self._config.profile_max_notebooks,
+                max_runs=self._config.profile_max_runs,
+            )
+
+    def _init_recorder(self) -> None:
+        """Record execution events to a trace file if one is configured."""
+        if not self._config.event_trace_path:
+            return
+        try:
+            self.recorder = EventRecorder(self._config.event_trace_path, log=self.log)
+        except OSError as exc:
+            self.log.error(f"Failed to open event trace: {exc}")
+
+    def _init_config_watcher(self) -> None:
+        """Poll the notify config files and reload them when they change."""
+        self._config_signature = self._config_files_signature()
+        if self._config.config_reload_interval > 0:
+            self.scheduler.call_later(
+                self._config.config_reload_interval, self._check_config_files
+            )
+
+    def _config_files_signature(self) -> Tuple[Tuple[str, int, int], ...]:
+        signature = []
+        for directory in self.config_file_paths:
+            for ext in (".py", ".json"):
+                path = os.path.join(directory, self.config_file_name + ext)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                signature.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _check_config_files(self) -> None:
+        try:
+            signature = self._config_files_signature()
+            if signature != self._config_signature:
+                self._config_signature = signature
+                self.reload_config()
+        finally:
+            interval = self._config.config_reload_interval
+            if interval > 0:
+                try:
+                    self.scheduler.call_later(interval, self._check_config_files)
+                except RuntimeError:
+                    # Scheduler stopped, the server is shutting down.
+                    pass
+
+    def reload_config(self) -> bool:
+        """
+        Re-read the notify config files and swap in new SMTP and Slack backends.
+
+        The new backends are fully built before the swap; notifications already
+        queued are delivered with whichever backends are current when they are
+        sent. On error the previous configuration stays in place.
+
+        Returns:
+            Whether the configuration was reloaded.
+        """
+        try:
+            new_config = Config()
+            for loaded, _ in self._load_config_files(
+                self.config_file_name,
+                path=self.config_file_paths,
+                log=self.log,
+                raise_config_file_errors=True,
+            ):
+                new_config.merge(loaded)
+            # Command line options keep their priority over config files.
+            new_config.merge(self.cli_config)
+            config = NotificationConfig(config=new_config, logger=self.log)
+            slack_client, slack_imported = self._create_slack_client(config)
+        except Exception as exc:
+            self.log.error(f"Failed to reload notification configuration: {exc}")
+            self.config_reload_error = str(exc)
+            return False
+
+        old_smtp = self._config.smtp_instance
+        self._apply_config(config, slack_client, slack_imported)
+        with self._config_lock:
+            self.config_generation += 1
+            self.config_loaded_at = time.time()
+            self.config_reload_error = None
+        self.log.info(
+            "Reloaded notification configuration (generation %d)",
+            self.config_generation,
+        )
+
+        if self.health is not None and self._config.health_check_interval > 0:
+            self.scheduler.call_later(0, self.health.run)
+
+        # Close the previous SMTP session once in-flight sends had time to finish.
+        if old_smtp is not None and old_smtp is not config.smtp_instance:
+            self.scheduler.call_later(60, self._close_smtp, old_smtp)
+        return True
+
+    def _close_smtp(self, smtp_instance: Any) -> None:
+        try:
+            smtp_instance.quit()
+        except Exception as exc:
+            self.log.debug(f"Failed to close previous SMTP session: {exc}")
+
+    def _init_dispatch(self) -> None:
+        """Set up the batched event intake and the notification worker pool."""
+        self._intake = EventIntake(
+            self._process_event_batch,
+            batch_size=self._config.event_batch_size,
+            log=self.log,
+        )
+        workers = self._config.dispatch_workers
+        budgets = {SUCCESS: max(1, workers - 1), HOUSEKEEPING: max(1, workers // 2)}
+        for name, budget in self._config.dispatch_concurrency.items():
+            if name in PRIORITY_NAMES:
+                budgets[PRIORITY_NAMES.index(name)] = budget
+            else:
+                self.log.warning(
+                    f"Unknown notification class in dispatch_concurrency: {name}"
+                )
+        # Scheduled callbacks run in the housekeeping class, unless scheduled
+        # with a priority as custom timeouts and heartbeats are.
+        self._dispatch_executor = PriorityDispatcher(
+            max_workers=workers,
+            budgets=budgets,
+            aging=self._config.dispatch_aging,
+            default_priority=HOUSEKEEPING,
+            log=self.log,
+        )
+        self.scheduler = Scheduler(executor=self._dispatch_executor, log=self.log)
+        # Notifications, as (params, end time), and kernel mails handed to the
+        # pool and not sent yet, for the shutdown.
+        self._in_flight: Dict[Future, List[Tuple[Any, Any]]] = {}
+        self._in_flight_lock = threading.Lock()
+        self._mails_queued = 0
+
+    def _init_spool(self) -> None:
+        """Send the notifications spooled by the previous shutdown."""
+        path = self._config.spool_path
+        try:
+            with open(path) as f:
+                lines = f.readlines()
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        except OSError as exc:
+            self.log.error(f"Failed to read spooled notifications: {exc}")
+            return
+
+        notifications = []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                if "mail" in entry:
+                    self._requeue_mail(entry)
+                    continue
+                params = notification_params_from_dict(entry["params"], trusted=True)
+            except (ValueError, KeyError, TypeError) as exc:
+                self.log.error(f"Dropping invalid spooled notification: {exc}")
+                continue
+            if isinstance(params.resources, dict):
+                params.resources = ResourceUsage(**params.resources)
+            notifications.append((params, entry.get("end_time")))
+        if notifications:
+            self.log.info(
+                "Sending %d notifications spooled at last shutdown", len(notifications)
+            )
+            self._dispatch(notifications)
+
+    def _requeue_mail(self, entry: Dict[str, Any]) -> None:
+        """Queue a kernel mail spooled by the previous shutdown."""
+        message = message_from_string(entry["mail"], policy=default_policy)
+        error = self.queue_mail(message, bool(entry["success"]))
+        if error is not None:
+            self.log.error(f"Dropping spooled mail to {message['To']}: {error}")
+
+    def _spool(self, notifications: List[Tuple[Any, Any]]) -> int:
+        """
+        Append notifications, and kernel mails, to the spool file.
+
+        Returns:
+            The number of notifications and mails written.
+        """
+        if not notifications:
+            return 0
+        path = self._config.spool_path
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "a") as f:
+                for notification in notifications:
+                    if isinstance(notification, QueuedMail):
+                        entry = {
+                            "mail": notification.message.as_string(),
+                            "success": notification.success,
+                        }
+                        f.write(json.dumps(entry) + "\n")
+                        continue
+                    params, end_time = notification
+                    data = {
+                        field.name: getattr(params, field.name)
+                        for field in fields(params)
+                        if field.name != "timer"
+                    }
+                    if params.resources is not None:
+                        data["resources"] = asdict(params.resources)
+                    f.write(json.dumps({"params": data, "end_time": end_time}) + "\n")
+        except (OSError, TypeError, ValueError) as exc:
+            self.log.error(f"Failed to spool {len(notifications)} notifications: {exc}")
+            return 0
+        return len(notifications)
+
+    def _init_mail_limiter(self) -> None:
+        """Limit the rate of the kernel mails of each user if configured."""
+        if self._config.mail_rate_limit > 0:
+            self.mail_limiter = RateLimiter(
+                self._config.mail_rate_limit, self._config.mail_rate_burst
+            )
+
+    def _init_live_status(self) -> None:
+        """Track notebook runs in live Slack status messages if enabled."""
+        if self._config.slack_live_status:
+            self.live_status = SlackLiveStatus(
+                self._slack_target,
+                self.scheduler,
+                interval=self._config.slack_live_status_interval,
+                log=self.log,
+                allow_send=partial(self._allow_send, "slack"),
+                record_send=partial(self._record_send, "slack"),
+            )
+
+    def _init_registration_expiry(self) -> None:
+        """Periodically forget registered cells that never started."""
+        timeout = self._config.registration_timeout
+        if timeout > 0:
+            self.scheduler.call_later(
+                min(timeout, REGISTRATION_SWEEP_INTERVAL), self._expire_registrations
+            )
+
+    def _expire_registrations(self) -> None:
+        timeout = self._config.registration_timeout
+        try:
+            cutoff = time.monotonic() - timeout
+            expired = []
+            with self._timer_lock:
+                for cell_id, params in list(self.cell_ids.items()):
+                    if (
+                        params.start_time is None
+                        and params.registered_at is not None
+                        and params.registered_at < cutoff
+                    ):
+                        del self.cell_ids[cell_id]
+                        if params.timer:
+                            params.timer.cancel()
+                        expired.append(params)
+                expired_runs = self.runs.expire(cutoff) if self.runs is not None else []
+                for run in expired_runs:
+                    if run.params.timer:
+                        run.params.timer.cancel()
+            for params in expired:
+                self._forget_registration(params)
+            if expired or expired_runs:
+                self.log.info(
+                    "Forgot %d cell and %d run registrations not started after %.0fs",
+                    len(expired),
+                    len(expired_runs),
+                    timeout,
+                )
+        finally:
+            try:
+                self.scheduler.call_later(
+                    min(timeout, REGISTRATION_SWEEP_INTERVAL),
+                    self._expire_registrations,
+                )
+            except RuntimeError:
+                # Scheduler stopped, the server is shutting down.
+                pass
+
+    def _forget_registration(self, params: NotificationParams) -> None:
+        """Release what a registration removed without a notification holds."""
+        if self.live_status is not None and params.in_live_run:
+            self.live_status.cell_dropped(
+                _notebook_key(params),
+                params.cell_id,
+                destination=_live_destination(params),
+            )
+        self._untrack(params)
+
+    def _untrack(self, params: NotificationParams) -> None:
+        """Stop following the execute request of a dropped registration."""
+        if self.iopub is not None and params.kernel_id and params.msg_id:
+            self.iopub.untrack(params.kernel_id, params.msg_id)
+
+    def _init_recipients(self) -> None:
+        """Load the per-user recipients mapping and keep it up to date."""
+        source = self._config.recipients_source
+        if isinstance(source, str) and source:
+            try:
+                module_name, name = source.rsplit(".", 1)
+                source = getattr(import_module(module_name), name)
+            except (ValueError, ImportError, AttributeError) as exc:
+                self.log.error(f"Invalid recipients_source {source!r}: {exc}")
+                return
+        elif not source and self._config.recipients_file:
+            source = partial(load_recipients_file, self._config.recipients_file)
+        if not source:
+            return
+        if not callable(source):
+            self.log.error(f"recipients_source is not callable: {source!r}")
+            return
+
+        self.recipients = RecipientDirectory(
+            source, ttl=self._config.recipients_ttl, log=self.log
+        )
+        # Preloaded at startup so requests never wait on the source.
+        self.recipients.refresh()
+        if self._config.recipients_ttl > 0:
+            self.scheduler.call_later(
+                self._config.recipients_ttl, self._refresh_recipients
+            )
+
+    def _refresh_recipients(self) -> None:
+        try:
+            self.recipients.refresh()
+        finally:
+            try:
+                self.scheduler.call_later(
+                    self._config.recipients_ttl, self._refresh_recipients
+                )
+            except RuntimeError:
+                # Scheduler stopped, the server is shutting down.
+                pass
+
+    def resolve_recipient(
+        self, params: NotificationParams, username: Optional[str]
+    ) -> None:
+        """
+        Address the notification to the user who registered it.
+
+        Recipients sent by the client are discarded. Users missing from the
+        mapping fall back to the configured ``email`` and ``slack_user_id``.
+        """
+        params.recipient_email = params.recipient_slack_id = None
+        params.user = username
+        if self.recipients is None:
+            return
+        recipient = self.recipients.lookup(username)
+        if recipient is not None:
+            params.recipient_email = recipient.email
+            params.recipient_slack_id = recipient.slack_user_id
+
+    def mail_address(self, username: Optional[str]) -> Optional[str]:
+        """
+        The only address the kernels of a user may mail: theirs in the
+        recipients mapping, otherwise the configured ``email``.
+        """
+        if self.recipients is not None:
+            recipient = self.recipients.lookup(username)
+            if recipient is not None and recipient.email:
+                return recipient.email
+        with self._config_lock:
+            return self.email or None
+
+    def _init_errors(self) -> None:
+        """Keep the full text of condensed errors if a store size is set."""
+        if self._config.error_store_max_bytes > 0:
+            self.errors = ErrorStore(self._config.error_store_max_bytes)
+
+    def trigger_notification(
+        self,
+        params: NotificationParams,
+        username: Optional[str] = None,
+        timed_out: bool = False,
+    ) -> None:
+        """
+        Queue the notification of a cell the frontend reported as ended, or
+        as past its custom timeout.
+
+        Used when executions are not tracked by the server. The run time is
+        taken from the ``start_time`` sent by the frontend to now, for the
+        regression check and the duration statistics.
+        """
+        self.resolve_recipient(params, username)
+        self.condense_error(params)
+        params.timed_out = timed_out
+        end_time = datetime.now(timezone.utc).isoformat()
+        if params.mode == "regression" and not timed_out:
+            self._record_duration(
+                params, {"timestamp": end_time, "success": params.success}
+            )
+        self._dispatch([(params, end_time)])
+
+    def condense_error(self, params: NotificationParams) -> None:
+        """
+        Bound the size of ``params.error`` before it is queued or sent.
+
+        The error is cut to the largest ``message_max_bytes`` limit; when
+        lines are dropped and the error store is enabled, the full text is
+        stored and referenced from the condensed one.
+        """
+        if not params.error:
+            return
+        error = str(params.error)
+        budget = max(self._config.message_max_bytes.values(), default=65536)
+        condensed, dropped = condense(error, budget)
+        if dropped and self.errors is not None:
+            key = self.errors.put(error)
+            if key is not None:
+                condensed += f"\n[Full error: GET /api/jupyter-notify/errors/{key}]"
+        params.error = condensed
+
+    def _fit_message(self, message: str, backend: str) -> str:
+        """Condense a message over the size limit of a backend."""
+        budget = self._config.message_max_bytes.get(backend)
+        if budget is None or len(message) <= budget // 4:
+            return message
+        if len(message.encode("utf-8")) <= budget:
+            return message
+        return condense(message, budget)[0]
+
+    def _within_budget(self, message: str, backend: str) -> bool:
+        budget = self._config.message_max_bytes.get(backend)
+        return budget is None or len(message.encode("utf-8")) <= budget
+
+    def _fit_blocks(self, blocks: Optional[str]) -> Optional[List[Any]]:
+        """
+        Parse rendered Slack blocks; None when there are none or they are
+        over the size limit, for the text to be sent alone.
+        """
+        if blocks is None or not self._within_budget(blocks, "slack"):
+            return None
+        return json.loads(blocks)
+
+    def _init_resources(self) -> None:
+        """Sample kernel resource usage while cells with notifications run."""
+        if self._config.resource_sample_interval > 0:
+            self.resources = ResourceSampler(
+                self.scheduler,
+                interval=self._config.resource_sample_interval,
+                log=self.log,
+            )
+
+    def _kernel_pid(self, kernel_id: str) -> Optional[int]:
+        """Process id of a local kernel, None for remote or unknown kernels."""
+        try:
+            kernel = self.serverapp.kernel_manager.get_kernel(kernel_id)
+        except (AttributeError, KeyError):
+            return None
+        provisioner = getattr(kernel, "provisioner", None)
+        return getattr(provisioner, "pid", None)
 
     def _init_nbmodel_listener(self) -> None:
         """Initialize event listener if jupyter_server_nbmodel is available."""
@@ -57,111 +894,665 @@ class NotifyExtension(ExtensionApp):
             )
             self.is_listening = False
 
+    def _init_iopub_tracker(self) -> None:
+        """Track executions through kernel IOPub messages if nbmodel is absent."""
+        if self.is_listening or not self._config.iopub_tracking:
+            return
+        kernel_manager = getattr(self.serverapp, "kernel_manager", None)
+        if kernel_manager is None:
+            return
+        self.iopub = IOPubTracker(kernel_manager, self.execution_event, log=self.log)
+        try:
+            self.serverapp.event_logger.add_listener(
+                schema_id=KERNEL_ACTIONS_SCHEMA_ID,
+                listener=self.iopub.kernel_action_listener,
+            )
+        except (AttributeError, ValueError) as exc:
+            # Kernels are then watched from their first registration only.
+            self.log.debug(f"Kernel action events not available: {exc}")
+        self.log.debug("Tracking cell executions through kernel IOPub messages.")
+
     def initialize_handlers(self) -> None:
         """Register API handlers for notification endpoints."""
         self.cell_ids: Dict[str, NotificationParams] = {}
+        self.runs = RunTracker(on_emptied=self._run_emptied)
+        self.running = RunningIndex()
         self.handlers.extend(
             [
                 (r"/api/jupyter-notify/notify", NotifyHandler, {"extension_app": self}),
+                (
+                    r"/api/jupyter-notify/notify-run",
+                    NotifyRunHandler,
+                    {"extension_app": self},
+                ),
                 (
                     r"/api/jupyter-notify/notify-trigger",
                     NotifyTriggerHandler,
                     {"extension_app": self},
                 ),
+                (
+                    r"/api/jupyter-notify/history",
+                    NotifyHistoryHandler,
+                    {"extension_app": self},
+                ),
+                (
+                    r"/api/jupyter-notify/profile",
+                    NotifyProfileHandler,
+                    {"extension_app": self},
+                ),
+                (
+                    r"/api/jupyter-notify/errors/(?P<key>[0-9a-f]+)",
+                    NotifyErrorHandler,
+                    {"extension_app": self},
+                ),
+                (
+                    r"/api/jupyter-notify/running",
+                    NotifyRunningHandler,
+                    {"extension_app": self},
+                ),
+                (
+                    r"/api/jupyter-notify/mail",
+                    NotifyMailHandler,
+                    {"extension_app": self},
+                ),
             ]
         )
 
+    def register_cell(self, params: NotificationParams) -> None:
+        """Register a cell for notifications when it finishes executing."""
+        with self._timer_lock:
+            # A new registration replaces the timeout and heartbeats of the old.
+            previous = self.cell_ids.get(params.cell_id)
+            if previous is not None and previous.timer:
+                previous.timer.cancel()
+            params.registered_at = time.monotonic()
+            self.cell_ids[params.cell_id] = params
+        if previous is not None and previous.msg_id != params.msg_id:
+            self._untrack(previous)
+        if self.recorder is not None:
+            self.recorder.registration(params.cell_id, params.mode, params.threshold)
+        # If a timeout threshold is configured, schedule the timeout notification.
+        if params.mode == "custom-timeout":
+            self.schedule_timeout(params)
+        if (
+            self.live_status is not None
+            and params.slackEnabled
+            and params.mode in _LIVE_STATUS_MODES
+        ):
+            params.in_live_run = True
+            self.live_status.cell_registered(
+                _notebook_key(params),
+                params.notebook_name or "Notebook",
+                params.cell_id,
+                destination=_live_destination(params),
+            )
+        if self.iopub is not None and params.kernel_id and params.msg_id:
+            if not self.iopub.track(params.kernel_id, params.msg_id, params.cell_id):
+                self.log.warning(
+                    f"Cannot track cell {params.cell_id}: kernel "
+                    f"{params.kernel_id} not found"
+                )
+
+    def register_run(self, params: NotificationParams, cell_ids: List[str]) -> None:
+        """
+        Register a notebook run, notified once when all of ``cell_ids`` ended.
+
+        ``params.cell_id`` identifies the run. A failure ends the run, since
+        the cells queued after it do not execute.
+        """
+        with self._timer_lock:
+            previous = self.runs.get(params.cell_id)
+            if previous is not None and previous.params.timer:
+                previous.params.timer.cancel()
+        params.registered_at = time.monotonic()
+        params.run_total = len(self.runs.register(params, cell_ids).cells)
+        if self.recorder is not None:
+            self.recorder.registration(
+                params.cell_id, params.mode, params.threshold, cell_ids
+            )
+        if params.mode == "custom-timeout":
+            self.schedule_timeout(params)
+
     async def event_listener(self, logger: Any, schema_id: str, data: dict) -> None:
+        """Listener of the nbmodel cell execution events."""
+        self.execution_event(data)
+
+    def execution_event(self, data: dict) -> None:
         """
-        Handle cell execution events and send notifications upon completion.
+        Queue cell execution events for batched processing.
+
+        Events for cells that are not registered are dropped here, before any
+        formatting or parsing, so a run-all of untracked cells costs one dict
+        lookup per event, plus the profiler and recorder bookkeeping when enabled.
 
         Args:
-            logger: The event logger instance.
-            schema_id: The schema identifier for the event.
-            data: The event data containing details about the cell execution.
+            data: The event data containing details about the cell execution,
+                from nbmodel or the IOPub tracker.
         """
-        event_type = data.get("event_type")
+        if self.profiler is not None:
+            self.profiler.observe(data)
         cell_id = data.get("cell_id")
-
-        if event_type == "execution_start" and cell_id in self.cell_ids:
-            params = self.cell_ids[cell_id]
-            if params.mode == "default":
-                params.start_time = data.get("timestamp")
+        registered = cell_id in self.cell_ids or (
+            self.runs is not None and cell_id in self.runs
+        )
+        if self.recorder is not None:
+            self.recorder.event(data, registered)
+        if not registered:
             return
+        self._intake.submit(data)
 
-        if event_type != "execution_end" or cell_id not in self.cell_ids:
-            return
+    def _process_event_batch(self, batch: EventBatch) -> None:
+        """Apply a batch of events grouped by cell id and dispatch the results."""
+        ready: List[Tuple[NotificationParams, Optional[str]]] = []
+        for cell_id, events in batch.items():
+            for data in events:
+                for handle in (self._handle_cell_event, self._handle_run_event):
+                    notification = handle(cell_id, data)
+                    if notification is not None:
+                        ready.append(notification)
+        if ready:
+            self._dispatch(ready)
 
-        self.log.debug(f"Received execution end event: {data}")
-        params = self.cell_ids[cell_id]
+    def _handle_cell_event(
+        self, cell_id: str, data: dict
+    ) -> Optional[Tuple[NotificationParams, Optional[str]]]:
+        """
+        Update the registration for a single event.
 
-        # Skip if notification was already sent (e.g., by timeout)
-        if params.notification_sent:
-            self.log.debug(f"Notification already sent for cell_id {cell_id}, skipping")
+        Returns:
+            The parameters and end timestamp of a notification to send, if any.
+        """
+        params = self.cell_ids.get(cell_id)
+        if params is None:
+            return None
+
+        event_type = data.get("event_type")
+        if event_type == "execution_start":
+            # Kept as a string; only parsed once the cell finished.
+            params.start_time = data.get("timestamp")
+            self._index_running(cell_id, params, data)
+            if self.profiler is not None and params.notebook_path:
+                self.profiler.add_alias(params.notebook_path, data.get("document_id"))
+            if self.live_status is not None:
+                self.live_status.cell_started(
+                    _notebook_key(params),
+                    cell_id,
+                    destination=_live_destination(params),
+                )
+            if self.resources is not None and params.kernel_id:
+                pid = self._kernel_pid(params.kernel_id)
+                if pid:
+                    self.resources.start(cell_id, pid)
+            return None
+
+        if event_type != "execution_end":
+            return None
+
+        if self.running is not None:
+            self.running.finish(cell_id)
+        # Remove cell record, the notification is either sent now or was already sent.
+        with self._timer_lock:
+            del self.cell_ids[cell_id]
             if params.timer:
                 params.timer.cancel()
-            del self.cell_ids[cell_id]
-            return
+            already_sent = params.notification_sent
+            # Claimed here so that a timeout firing meanwhile does not send too.
+            params.notification_sent = True
+            if not already_sent:
+                params.timer = None
+
+        self._record_duration(params, data)
+        if self.live_status is not None and params.in_live_run:
+            if (
+                params.mode == "default"
+                and params.duration is not None
+                and params.duration < params.threshold
+            ):
+                # Not notified, so not counted in the run either.
+                params.in_live_run = False
+                self.live_status.cell_dropped(
+                    _notebook_key(params),
+                    cell_id,
+                    destination=_live_destination(params),
+                )
+            else:
+                self.live_status.cell_finished(
+                    _notebook_key(params),
+                    cell_id,
+                    bool(data.get("success")),
+                    _cell_label(params),
+                    destination=_live_destination(params),
+                )
+        if self.resources is not None:
+            self._record_resources(params, data)
+
+        # Skip if notification was already sent (e.g., by timeout)
+        if already_sent:
+            self.log.debug(
+                "Notification already sent for cell_id %s, skipping", cell_id
+            )
+            return None
 
-        if params.timer:
-            params.timer.cancel()
         params.success = data.get("success")
         params.error = data.get("kernel_error")
-        self.log.debug(f"Sending notification for cell_id {cell_id}: {params}")
-        self.send_notification(params, data.get("timestamp"))
-        # Remove cell record after notification is sent.
-        del self.cell_ids[cell_id]
+        self.condense_error(params)
+        return params, data.get("timestamp")
+
+    def _handle_run_event(
+        self, cell_id: str, data: dict
+    ) -> Optional[Tuple[NotificationParams, Optional[str]]]:
+        """
+        Count an event against the notebook run of the cell, if any.
+
+        Returns:
+            The parameters and end timestamp of the run notification, once
+            the run completed.
+        """
+        if self.runs is None:
+            return None
+        event_type = data.get("event_type")
+        if event_type == "execution_start":
+            run = self.runs.run_of(cell_id)
+            if run is not None:
+                if run.params.start_time is None:
+                    run.params.start_time = data.get("timestamp")
+                self._index_running(cell_id, run.params, data)
+            return None
+        if event_type != "execution_end":
+            return None
+
+        run = self.runs.run_of(cell_id)
+        if run is None:
+            return None
+        if self.running is not None:
+            self.running.finish(cell_id)
+        complete = self.runs.cell_finished(cell_id, bool(data.get("success")))
+        params = run.params
+        # Kept up to date for timeout notifications.
+        params.run_done = run.done
+        if complete is None or not self._close_run(params):
+            return None
+
+        params.success = run.failed_cell is None
+        if not params.success:
+            params.error = data.get("kernel_error")
+            self.condense_error(params)
+        return params, data.get("timestamp")
+
+    def _close_run(self, params: NotificationParams) -> bool:
+        """Stop the timers of a run that ended; whether it is still to be notified."""
+        with self._timer_lock:
+            if params.timer:
+                params.timer.cancel()
+            already_sent = params.notification_sent
+            params.notification_sent = True
+            if not already_sent:
+                params.timer = None
+        return not already_sent
+
+    def _run_emptied(self, run: TrackedRun) -> None:
+        """Send the summary of a run whose remaining cells all moved to later runs."""
+        params = run.params
+        if not self._close_run(params):
+            return
+        params.run_done = run.done
+        params.success = run.failed_cell is None
+        self._dispatch([(params, None)])
+
+    def _index_running(
+        self, cell_id: str, params: NotificationParams, data: dict
+    ) -> None:
+        """Add a cell that started to the index of running cells."""
+        if self.running is None:
+            return
+        try:
+            started = _parse_timestamp(data["timestamp"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            started = time.time()
+        self.running.start(
+            RunningCell(
+                cell_id=cell_id,
+                started=started,
+                notebook=_notebook_key(params),
+                user=params.user,
+                mode=params.mode,
+            )
+        )
+
+    def _record_duration(self, params: NotificationParams, data: dict) -> None:
+        """
+        Set the run time of a finished cell and add it to its statistics.
+
+        The p95 and mean of the previous runs are kept on ``params`` for the
+        regression check. Failed runs are not recorded, as an early error
+        would drag the baseline down.
+        """
+        end_time = data.get("timestamp")
+        if not params.start_time or not end_time:
+            return
+        try:
+            duration = (
+                _parse_timestamp(end_time) - _parse_timestamp(params.start_time)
+            ).total_seconds()
+        except ValueError as exc:
+            self.log.debug(f"Invalid execution timestamps: {exc}")
+            return
+        params.duration = duration
+        if self.durations is None:
+            return
+
+        notebook = _notebook_key(params)
+        stats = self.durations.get(notebook, params.cell_id)
+        if stats is not None and stats.count >= self._config.regression_min_samples:
+            params.baseline_p95 = stats.quantile.value()
+            params.baseline_mean = stats.ewma
+        if data.get("success"):
+            self.durations.add(notebook, params.cell_id, duration)
+
+    def _record_resources(self, params: NotificationParams, data: dict) -> None:
+        """Attach the kernel resource usage of the run and update the metrics."""
+        usage = self.resources.stop(params.cell_id)
+        if usage is None:
+            return
+        if params.duration is not None:
+            # The event timestamps are more accurate than our own clock.
+            usage.wall_time = params.duration
+        params.resources = usage
+        status = "success" if data.get("success") else "failed"
+        metrics.CELL_CPU_SECONDS.labels(status).observe(usage.cpu_seconds)
+        metrics.CELL_PEAK_RSS_BYTES.labels(status).observe(usage.peak_rss)
+        metrics.CELL_WALL_SECONDS.labels(status).observe(usage.wall_time)
+
+    def _dispatch(
+        self, notifications: List[Tuple[NotificationParams, Optional[str]]]
+    ) -> None:
+        """
+        Hand notifications to the worker pool, or send them inline.
+
+        Each notification is queued on its own in the class of its status:
+        failures, then timeouts, then successes.
+        """
+        if self._dispatch_executor is None:
+            self._send_notifications(notifications)
+            return
+        for notification in notifications:
+            params = notification[0]
+            if params.timed_out:
+                priority = TIMEOUT
+            else:
+                priority = SUCCESS if params.success else FAILURE
+            future = self._dispatch_executor.submit_with_priority(
+                priority, self._send_notifications, [notification]
+            )
+            with self._in_flight_lock:
+                self._in_flight[future] = [notification]
+            future.add_done_callback(self._forget_in_flight)
 
-    def send_slack_notification(self, message_content: str) -> None:
+    def _forget_in_flight(self, future: Future) -> None:
+        with self._in_flight_lock:
+            self._in_flight.pop(future, None)
+
+    def _send_notifications(
+        self, notifications: List[Tuple[NotificationParams, Optional[str]]]
+    ) -> None:
+        for params, end_time in notifications:
+            try:
+                self.log.debug("Sending notification for cell_id %s", params.cell_id)
+                self.send_notification(params, end_time)
+            except Exception as exc:
+                self.log.error(
+                    f"Failed to send notification for cell_id {params.cell_id}: {exc}"
+                )
+
+    def schedule_timeout(self, params: NotificationParams) -> None:
+        """Schedule the custom-timeout notification and any follow-up heartbeats."""
+        params.timer = self.scheduler.call_later(
+            params.threshold, self._on_timeout, params, priority=TIMEOUT
+        )
+
+    def _on_timeout(self, params: NotificationParams) -> None:
+        with self._timer_lock:
+            # The cell may have ended while this call was due.
+            if params.notification_sent:
+                return
+            params.notification_sent = True
+        self.send_notification(params)
+        if self._config.heartbeat_count > 0:
+            self._schedule_heartbeat(params, 1)
+
+    def _schedule_heartbeat(self, params: NotificationParams, index: int) -> None:
+        factor = max(self._config.heartbeat_factor, 1.0)
+        delay = params.threshold * (factor**index - factor ** (index - 1))
+        with self._timer_lock:
+            # The cell may have finished while the previous notification was sent.
+            if not self._is_registered(params):
+                return
+            params.timer = self.scheduler.call_later(
+                delay, self._send_heartbeat, params, index, priority=TIMEOUT
+            )
+
+    def _is_registered(self, params: NotificationParams) -> bool:
+        """Whether ``params`` is the current registration of its cell or run."""
+        if self.cell_ids.get(params.cell_id) is params:
+            return True
+        run = self.runs.get(params.cell_id) if self.runs is not None else None
+        return run is not None and run.params is params
+
+    def _send_heartbeat(self, params: NotificationParams, index: int) -> None:
+        """Send the ``index``-th 'still running' notification for a cell or run."""
+        if not self._is_registered(params):
+            return
+        elapsed = _elapsed_since(params.start_time)
+        if elapsed is None:
+            # Not started according to the events; time since the timeout.
+            elapsed = (
+                params.threshold * max(self._config.heartbeat_factor, 1.0) ** index
+            )
+        formatted_message = self._format_message(
+            params, "Running", f"Cell still running after {_format_duration(elapsed)}"
+        )
+        self._deliver(params, "Running", formatted_message)
+        if index < self._config.heartbeat_count:
+            self._schedule_heartbeat(params, index + 1)
+
+    def send_slack_notification(
+        self,
+        message_content: str,
+        slack_user_id: Optional[str] = None,
+        channel_name: Optional[str] = None,
+        blocks: Optional[List[Any]] = None,
+    ) -> bool:
         """
         Send a Slack notification if configuration and dependencies allow it.
 
         Args:
             message_content: The content to send in the Slack message.
+            slack_user_id: User to message directly instead of the configured one.
+            channel_name: Channel to post to, ahead of any direct message.
+            blocks: Block Kit blocks shown instead of the text, which remains
+                the fallback of notifications.
+
+        Returns:
+            Whether the message was posted.
         """
         self.log.debug("Attempting to send Slack notification.")
-        if not (self.slack_imported and self.slack_client):
+        slack_client, channel = self._slack_target(slack_user_id, channel_name)
+        if not slack_client:
             self.log.error("Slack library not imported or client not initialized.")
-            return
+            return False
+
+        if not self._allow_send("slack"):
+            return False
+        started = time.monotonic()
+        try:
+            if blocks is not None:
+                slack_client.chat_postMessage(
+                    channel=channel, text=message_content, blocks=blocks
+                )
+            else:
+                slack_client.chat_postMessage(channel=channel, text=message_content)
+        except Exception as exc:
+            self._record_send("slack", False, started)
+            self.log.error(f"Error sending Slack notification: {exc}")
+            return False
+        self._record_send("slack", True, started)
+        return True
+
+    def _allow_send(self, backend: str) -> bool:
+        """Whether the circuit breaker of a backend lets a send go ahead."""
+        breaker = self.breakers.get(backend) if self.breakers else None
+        if breaker is None or breaker.allow():
+            return True
+        metrics.BACKEND_REJECTED_SENDS.labels(backend=backend).inc()
+        self.log.debug("Circuit of %s open, notification not sent", backend)
+        return False
+
+    def _record_send(self, backend: str, success: bool, started: float) -> None:
+        breaker = self.breakers.get(backend) if self.breakers else None
+        if breaker is not None:
+            breaker.record(success, time.monotonic() - started)
+
+    def _slack_target(
+        self, slack_user_id: Optional[str] = None, channel_name: Optional[str] = None
+    ) -> Tuple[Any, Optional[str]]:
+        """
+        Return the Slack client and the channel to post to.
+
+        Args:
+            slack_user_id: User to message directly instead of the configured one.
+            channel_name: Channel to post to, ahead of any direct message.
+
+        Returns:
+            Tuple of (client, channel). The client is None if Slack is not set up.
+        """
+        with self._config_lock:
+            slack_client = self.slack_client if self.slack_imported else None
+            slack_user_id = slack_user_id or self.slack_user_id
+            channel = f"#{self.slack_channel_name}"
+            dm_channels = self._dm_channels
+        if not slack_client:
+            return None, None
+        if channel_name:
+            return slack_client, f"#{channel_name.lstrip('#')}"
 
-        channel = f"#{self.slack_channel_name}"
         # If a specific Slack user is set, try opening a DM channel.
-        if self.slack_user_id:
+        if slack_user_id:
+            dm_channel = dm_channels.get(slack_user_id)
+            if dm_channel is not None:
+                return slack_client, dm_channel
             try:
-                response = self.slack_client.conversations_open(
-                    users=[self.slack_user_id]
-                )
-                channel = response["channel"]["id"]
+                response = slack_client.conversations_open(users=[slack_user_id])
+                channel = dm_channels[slack_user_id] = response["channel"]["id"]
             except Exception as exc:
                 self.log.error(f"Failed to open DM conversation: {exc}")
+        return slack_client, channel
 
-        try:
-            self.slack_client.chat_postMessage(channel=channel, text=message_content)
-        except Exception as exc:
-            self.log.error(f"Error sending Slack notification: {exc}")
-
-    def send_email_notification(self, message_content: str) -> None:
+    def send_email_notification(
+        self,
+        message_content: str,
+        to: Optional[str] = None,
+        html: Optional[str] = None,
+    ) -> bool:
         """
         Send an email notification if email is configured.
 
+        The mail is built as the magics build theirs, with the HTML
+        alternative dropped, and a note added, past the ``email`` size limit.
+
         Args:
             message_content: The content to include in the email.
+            to: Address to send to instead of the configured one.
+            html: HTML alternative of the content.
+
+        Returns:
+            Whether the email was handed to the SMTP server.
         """
         self.log.debug("Attempting to send email notification.")
-        if not self.email:
+        with self._config_lock:
+            email = self.email
+            smtp_instance = self._config.smtp_instance
+        if not email:
             self.log.error("Email is not configured; skipping email notification.")
-            return
+            return False
 
-        email_message = EmailMessage()
-        email_message["Subject"] = "Jupyter Cell Execution Status"
-        email_message["From"] = self.email
-        email_message["To"] = self.email
-        email_message.set_content(message_content)
+        bundle = {"text/plain": message_content}
+        if html is not None:
+            bundle["text/html"] = html
+        email_message = build_rich_message(
+            "Jupyter Cell Execution Status",
+            email,
+            to or email,
+            bundle,
+            self._config.message_max_bytes.get("email", sys.maxsize),
+        )
+        return self._send_mail(smtp_instance, email_message)
 
+    def _send_mail(self, smtp_instance: Any, message: EmailMessage) -> bool:
+        """Send a mail through the shared SMTP session and its circuit breaker."""
+        if not self._allow_send("smtp"):
+            return False
+        started = time.monotonic()
         try:
-            self._config.smtp_instance.send_message(email_message)
+            with self._smtp_lock:
+                smtp_instance.send_message(message)
         except Exception as exc:
+            self._record_send("smtp", False, started)
             self.log.error(f"Error sending email notification: {exc}")
+            return False
+        self._record_send("smtp", True, started)
+        return True
+
+    def queue_mail(self, message: EmailMessage, success: bool = True) -> Optional[str]:
+        """
+        Send a mail of the kernel magics from the notification workers.
+
+        Mails are refused while the SMTP circuit breaker is open or
+        ``mail_queue_max`` mails are waiting, for the kernel to send them
+        itself rather than have them dropped or delayed here.
+
+        Args:
+            message: The mail, with its own subject and recipients.
+            success: False to send it ahead of success notifications.
+
+        Returns:
+            None once queued, otherwise why the mail was refused.
+        """
+        with self._config_lock:
+            smtp_instance = self._config.smtp_instance
+        if smtp_instance is None:
+            return "Email is not configured"
+        breaker = self.breakers.get("smtp") if self.breakers else None
+        if breaker is not None and breaker.refusing():
+            return "Email delivery is failing"
+        if self._dispatch_executor is None:
+            self._send_mail(smtp_instance, message)
+            return None
+        limit = self._config.mail_queue_max
+        with self._in_flight_lock:
+            if limit > 0 and self._mails_queued >= limit:
+                return "Mail queue is full"
+            self._mails_queued += 1
+        try:
+            future = self._dispatch_executor.submit_with_priority(
+                SUCCESS if success else FAILURE,
+                self._send_mail,
+                smtp_instance,
+                message,
+            )
+        except RuntimeError:
+            # Dispatcher shut down, the server is stopping.
+            with self._in_flight_lock:
+                self._mails_queued -= 1
+            return "Server is shutting down"
+        with self._in_flight_lock:
+            self._in_flight[future] = [QueuedMail(message, success)]
+        future.add_done_callback(self._forget_mail)
+        return None
+
+    def _forget_mail(self, future: Future) -> None:
+        with self._in_flight_lock:
+            self._in_flight.pop(future, None)
+            self._mails_queued -= 1
 
     def send_notification(
         self, params: NotificationParams, end_time: Optional[str] = None
@@ -172,11 +1563,12 @@ class NotifyExtension(ExtensionApp):
         Args:
             params: Notification parameters including mode, messages, and status.
         """
-        self.log.debug(f"Preparing to send notification with params: {params}")
+        self.log.debug("Preparing to send notification with params: %s", params)
 
         # Determine status and message based on cell execution
-        if params.timer and params.timer.is_alive():
-            params.timer.cancel()
+        if params.timed_out or (params.timer and params.timer.is_alive()):
+            if params.timer:
+                params.timer.cancel()
             status = "Timeout"
             message = "Cell execution timed out!"
         else:
@@ -186,40 +1578,189 @@ class NotifyExtension(ExtensionApp):
                 message += f"\nError:\n{params.error}"
 
         # Decide whether to send the notification based on mode
-        if params.mode == "never" or (params.mode == "on-error" and params.success):
+        regression = params.mode == "regression" and self._is_regression(params)
+        if (
+            params.mode == "never"
+            or (params.mode == "on-error" and params.success)
+            # Failures are reported in regression mode too, slow or not.
+            or (params.mode == "regression" and params.success and not regression)
+        ):
             self.log.debug(
                 "Notification mode conditions not met; skipping notification."
             )
             return
 
+        if regression:
+            if params.success:
+                status = "Regression"
+            message += (
+                f"\nCell took {_format_duration(params.duration)}, "
+                f"{params.duration / params.baseline_p95:.1f}x its p95 of "
+                f"{_format_duration(params.baseline_p95)} "
+                f"(average {_format_duration(params.baseline_mean)})"
+            )
+
         # Skip notification if execution time is below the threshold in default mode
         if params.mode == "default" and params.start_time and end_time:
-            start_time_dt = datetime.fromisoformat(params.start_time)
-            end_time_dt = datetime.fromisoformat(end_time)
+            start_time_dt = _parse_timestamp(params.start_time)
+            end_time_dt = _parse_timestamp(end_time)
 
             if (end_time_dt - start_time_dt) < timedelta(seconds=params.threshold):
                 return
 
-        # Build formatted message with status, cell info, and details
-        cell_info = (
-            f"Cell: {params.execution_count}"
-            if params.execution_count is not None
-            else f"Cell id: {params.cell_id}"
+        formatted_message = self._format_message(params, status, message)
+        self.log.debug("Formatted notification message: %s", formatted_message)
+
+        self._deliver(params, status, formatted_message)
+
+        # Mark notification as sent to prevent duplicates
+        params.notification_sent = True
+
+    def _is_regression(self, params: NotificationParams) -> bool:
+        """
+        Whether the run took longer than ``regression_factor`` times its p95.
+
+        Runs shorter than the cell threshold are never reported, so fast cells
+        do not alert on noise.
+        """
+        if params.duration is None or not params.baseline_p95:
+            return False
+        if params.threshold and params.duration < params.threshold:
+            return False
+        return params.duration > params.baseline_p95 * self._config.regression_factor
+
+    def _deliver(
+        self,
+        params: NotificationParams,
+        status: str,
+        formatted_message: RenderedMessage,
+    ) -> None:
+        """Send a formatted message through the enabled backends and record it."""
+        slack_delivered = email_delivered = None
+        slack_enabled, email_enabled = params.slackEnabled, params.emailEnabled
+        # Only passed when set, so overrides taking the message alone keep working.
+        slack_kwargs: Dict[str, Any] = {}
+        email_kwargs: Dict[str, Any] = {}
+        if params.recipient_slack_id:
+            slack_kwargs["slack_user_id"] = params.recipient_slack_id
+        if params.recipient_email:
+            email_kwargs["to"] = params.recipient_email
+
+        with self._config_lock:
+            router = self._config.router
+        route = (
+            router.route(_notebook_key(params), status, params.user)
+            if router is not None
+            else None
         )
-        message_parts = []
-        if params.notebook_name:
-            message_parts.append(params.notebook_name)
-        message_parts.extend(
-            [f"Execution Status: {status}", cell_info, f"Details: {message}"]
+        if route is not None:
+            # A matching rule replaces the destinations chosen for the cell.
+            slack_enabled, email_enabled = route.slack, bool(route.email)
+            slack_kwargs = {
+                key: value
+                for key, value in (
+                    ("channel_name", route.slack_channel),
+                    ("slack_user_id", route.slack_user_id),
+                )
+                if value
+            }
+            email_kwargs = {"to": route.email} if route.email else {}
+
+        # Completions are reported in the run status message instead, unless
+        # a rule sends them somewhere else.
+        live = (
+            params.in_live_run
+            and status not in ("Timeout", "Running")
+            and (slack_kwargs.get("slack_user_id"), slack_kwargs.get("channel_name"))
+            == _live_destination(params)
         )
+        if slack_enabled and not live:
+            blocks = self._fit_blocks(formatted_message.render("slack_blocks"))
+            if blocks is not None:
+                slack_kwargs["blocks"] = blocks
+            slack_delivered = bool(
+                self.send_slack_notification(
+                    self._fit_message(formatted_message.render("slack"), "slack"),
+                    **slack_kwargs,
+                )
+            )
+        if email_enabled:
+            html = formatted_message.render("email_html")
+            if html is not None and self._within_budget(html, "email"):
+                email_kwargs["html"] = html
+            email_delivered = bool(
+                self.send_email_notification(
+                    self._fit_message(formatted_message.render("email"), "email"),
+                    **email_kwargs,
+                )
+            )
 
-        formatted_message = "\n".join(message_parts)
-        self.log.debug(f"Formatted notification message: {formatted_message}")
+        if self.history is not None:
+            self.history.record(
+                status,
+                notebook=params.notebook_name,
+                notebook_path=params.notebook_path,
+                user=params.user,
+                cell_id=params.cell_id,
+                mode=params.mode,
+                message=formatted_message.text,
+                slack_delivered=slack_delivered,
+                email_delivered=email_delivered,
+            )
 
-        if params.slackEnabled:
-            self.send_slack_notification(formatted_message)
-        if params.emailEnabled:
-            self.send_email_notification(formatted_message)
+    def _format_message(
+        self, params: NotificationParams, status: str, message: str
+    ) -> RenderedMessage:
+        """
+        Prepare the message of a notification, rendered in each format on
+        first use and only once, whatever the number of backends.
+        """
 
-        # Mark notification as sent to prevent duplicates
-        params.notification_sent = True
+        def cell_info() -> str:
+            if params.run_total is not None:
+                return f"Cells run: {params.run_done}/{params.run_total}"
+            if params.execution_count is not None:
+                return f"Cell: {params.execution_count}"
+            return f"Cell id: {params.cell_id}"
+
+        def resources() -> Optional[str]:
+            usage = params.resources
+            if usage is None:
+                return None
+            return (
+                f"peak RSS {_format_bytes(usage.peak_rss)}, "
+                f"CPU {usage.cpu_seconds:.1f}s, "
+                f"wall {_format_duration(usage.wall_time)}"
+            )
+
+        message_fields = MessageFields(
+            {
+                "notebook": lambda: params.notebook_name,
+                "notebook_line": lambda: (
+                    f"{params.notebook_name}\n" if params.notebook_name else None
+                ),
+                "notebook_path": lambda: params.notebook_path,
+                "cell_id": lambda: params.cell_id,
+                "cell_info": cell_info,
+                "execution_count": lambda: params.execution_count,
+                "mode": lambda: params.mode,
+                "user": lambda: params.user,
+                "status": lambda: status,
+                "message": lambda: message,
+                "error": lambda: params.error,
+                "duration": lambda: (
+                    _format_duration(params.duration)
+                    if params.duration is not None
+                    else None
+                ),
+                "resources": resources,
+                "resources_line": lambda: (
+                    f"\nResources: {message_fields['resources']}"
+                    if params.resources is not None
+                    else None
+                ),
+            }
+        )
+        with self._config_lock:
+            templates = self._config.templates
+        return templates.message(params.mode, status, message_fields)
@@ -1,14 +1,21 @@
+import email
+import email.policy
+from email.utils import getaddresses
 import json
 import logging
-import threading
+import time
+import uuid
+from functools import partial
 from http import HTTPStatus
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional
 
 import tornado.web
+from tornado.ioloop import IOLoop
 from jupyter_server.base.handlers import JupyterHandler
 from jupyter_server.extension.handler import ExtensionHandlerMixin
 
 from .config import NotificationParams, notification_params_from_dict
+from .running import format_cursor, parse_cursor
 
 
 def setup_logger(name: str) -> logging.Logger:
@@ -22,6 +29,15 @@ def setup_logger(name: str) -> logging.Logger:
     return logger
 
 
+def current_username(user: Any) -> Optional[str]:
+    """Name of the authenticated user, whatever the identity provider returns."""
+    if isinstance(user, str):
+        return user
+    if isinstance(user, dict):
+        return user.get("username") or user.get("name")
+    return getattr(user, "username", None)
+
+
 class NotifyHandler(ExtensionHandlerMixin, JupyterHandler):
     """
     Handler to register cell IDs for notifications.
@@ -37,12 +53,36 @@ class NotifyHandler(ExtensionHandlerMixin, JupyterHandler):
         self.extension_app = extension_app
         super().initialize(*args, **kwargs)
 
+    def compute_etag(self) -> Optional[str]:
+        """
+        Tag the status by configuration generation and reload error, health
+        results and breaker states, everything the body is built from.
+        """
+        if self.request.method != "GET":
+            return super().compute_etag()
+        breakers = self.extension_app.breakers or {}
+        return 'W/"{}-{:x}-{}-{}"'.format(
+            self.extension_app.config_generation,
+            hash(self.extension_app.config_reload_error) & 0xFFFFFFFF,
+            self.extension_app.health.version,
+            sum(breaker.version for breaker in breakers.values()),
+        )
+
     @tornado.web.authenticated
     def get(self) -> None:
         """Check if the extension is listening for nbmodel events and verify configuration."""
+        # The status only changes with the configuration or the cached health
+        # probes, so answer conditional requests without building the body.
+        self.set_etag_header()
+        if self.check_etag_header():
+            self.set_status(HTTPStatus.NOT_MODIFIED)
+            self.finish()
+            return
+
         self.extension_app.log.debug(
             f"Checking nbmodel listener: {self.extension_app.is_listening}"
         )
+        health = self.extension_app.health
         slack_configured = bool(
             self.extension_app.slack_client
             and (
@@ -51,15 +91,27 @@ class NotifyHandler(ExtensionHandlerMixin, JupyterHandler):
             )
         )
         email_configured = bool(self.extension_app.email)
-        smtp_server_running = bool(self.extension_app._config.smtp_instance)
+        smtp_server_running = health.is_healthy("smtp")
+        if smtp_server_running is None:
+            # Not probed yet (or probes disabled), fall back to the configuration.
+            smtp_server_running = bool(self.extension_app._config.smtp_instance)
 
         self.set_status(HTTPStatus.OK)
         self.finish(
             {
                 "nbmodel_installed": self.extension_app.is_listening,
+                "iopub_tracking": self.extension_app.iopub is not None,
                 "slack_configured": slack_configured,
                 "email_configured": email_configured,
                 "smtp_server_running": smtp_server_running,
+                "config_generation": self.extension_app.config_generation,
+                "config_loaded_at": self.extension_app.config_loaded_at,
+                "config_reload_error": self.extension_app.config_reload_error,
+                "health": health.snapshot(),
+                "circuit": {
+                    name: breaker.snapshot()
+                    for name, breaker in (self.extension_app.breakers or {}).items()
+                },
             }
         )
 
@@ -76,15 +128,10 @@ class NotifyHandler(ExtensionHandlerMixin, JupyterHandler):
             f"Registering notification for cell_id: {params.cell_id}"
         )
 
-        # If a timeout threshold is configured, schedule a timer to trigger notification.
-        if params.mode == "custom-timeout":
-            timer = threading.Timer(
-                params.threshold, self.extension_app.send_notification, args=(params,)
-            )
-            params.timer = timer
-            timer.start()
-
-        self.extension_app.cell_ids[params.cell_id] = params
+        self.extension_app.resolve_recipient(
+            params, current_username(self.current_user)
+        )
+        self.extension_app.register_cell(params)
         self.set_status(HTTPStatus.OK)
         self.finish({"accepted": True})
 
@@ -107,12 +154,62 @@ class NotifyHandler(ExtensionHandlerMixin, JupyterHandler):
             return None, str(exc)
 
 
+class NotifyRunHandler(ExtensionHandlerMixin, JupyterHandler):
+    """
+    Handler to register a whole notebook run for one notification.
+
+    POST:
+        Registers the ``cell_ids`` scheduled together, with the notification
+        settings of ``NotifyHandler``. ``cell_id`` optionally names the run;
+        registering a run of the same name replaces it.
+    """
+
+    def initialize(self, extension_app: Any, *args: Any, **kwargs: Any) -> None:
+        self.extension_app = extension_app
+        super().initialize(*args, **kwargs)
+
+    @tornado.web.authenticated
+    async def post(self) -> None:
+        """Register a notebook run for a single completion notification."""
+        try:
+            data: Dict[str, Any] = json.loads(self.request.body)
+            cell_ids = data.pop("cell_ids", None)
+            if (
+                not isinstance(cell_ids, list)
+                or not cell_ids
+                or not all(isinstance(cell_id, str) for cell_id in cell_ids)
+            ):
+                raise ValueError("cell_ids must be a non-empty list of cell ids")
+            data.setdefault("cell_id", f"run-{uuid.uuid4().hex}")
+            params = notification_params_from_dict(data)
+        except json.JSONDecodeError:
+            error = "Invalid JSON in request"
+        except (AttributeError, TypeError, ValueError) as exc:
+            error = str(exc)
+        else:
+            error = ""
+        if error:
+            self.set_status(HTTPStatus.BAD_REQUEST)
+            self.finish({"error": error})
+            return
+
+        self.extension_app.log.debug(
+            f"Registering run {params.cell_id} of {len(cell_ids)} cells"
+        )
+        self.extension_app.resolve_recipient(
+            params, current_username(self.current_user)
+        )
+        self.extension_app.register_run(params, cell_ids)
+        self.set_status(HTTPStatus.OK)
+        self.finish({"accepted": True, "run_id": params.cell_id})
+
+
 class NotifyTriggerHandler(ExtensionHandlerMixin, JupyterHandler):
     """
     Handler to trigger a notification directly.
 
     POST:
-        Validates and sends a notification immediately.
+        Validates and queues a notification on the notification workers.
     """
 
     def initialize(self, extension_app: Any, *args: Any, **kwargs: Any) -> None:
@@ -122,36 +219,309 @@ class NotifyTriggerHandler(ExtensionHandlerMixin, JupyterHandler):
     @tornado.web.authenticated
     async def post(self) -> None:
         """Trigger a notification immediately based on the provided parameters."""
-        params, error = self._parse_request_body(self.request.body)
+        params, timed_out, error = self._parse_request_body(self.request.body)
         if error or not params:
             self.set_status(HTTPStatus.BAD_REQUEST)
             self.finish({"error": error})
             return
 
         # If timer is true, it is due to timout!
-        if params.timer:
-            # Starting a dummy timer as placeholder
-            params.timer = threading.Timer(10, lambda *args: None)
-            params.timer.start()
-
-        self.extension_app.send_notification(params)
+        self.extension_app.trigger_notification(
+            params, current_username(self.current_user), timed_out
+        )
         self.set_status(HTTPStatus.OK)
         self.finish({"done": True})
 
     def _parse_request_body(
         self, body: bytes
-    ) -> tuple[Optional[NotificationParams], str]:
+    ) -> tuple[Optional[NotificationParams], bool, str]:
         """
         Parse and validate the JSON body for notification trigger.
 
         Returns:
-            Tuple of (params, error). If successful, error is an empty string.
+            Tuple of (params, whether the cell timed out, error). If successful,
+            error is an empty string.
         """
         try:
             data: Dict[str, Any] = json.loads(body)
             params = notification_params_from_dict(data)
-            return params, ""
+            return params, bool(data.get("timer")), ""
         except json.JSONDecodeError:
-            return None, "Invalid JSON in request"
+            return None, False, "Invalid JSON in request"
         except ValueError as exc:
-            return None, str(exc)
+            return None, False, str(exc)
+
+
+class NotifyHistoryHandler(ExtensionHandlerMixin, JupyterHandler):
+    """
+    Handler to query the notification history.
+
+    GET:
+        Returns the notifications sent for the current user, newest first,
+        optionally filtered by the ``notebook`` name, ``notebook_path``,
+        ``cell_id``, ``status``, ``since`` and ``until`` (UNIX timestamps)
+        query arguments. Pages hold up to ``limit`` entries; pass
+        the ``next`` cursor of a response as ``before`` to get the next page.
+    """
+
+    MAX_LIMIT = 500
+
+    def initialize(self, extension_app: Any, *args: Any, **kwargs: Any) -> None:
+        self.extension_app = extension_app
+        super().initialize(*args, **kwargs)
+
+    @tornado.web.authenticated
+    async def get(self) -> None:
+        """Return a page of notification history."""
+        history = self.extension_app.history
+        if history is None:
+            self.set_status(HTTPStatus.NOT_FOUND)
+            self.finish({"error": "Notification history is not enabled"})
+            return
+
+        try:
+            limit = int(self.get_query_argument("limit", "50"))
+            before = self._optional_argument("before", int)
+            since = self._optional_argument("since", float)
+            until = self._optional_argument("until", float)
+        except ValueError:
+            self.set_status(HTTPStatus.BAD_REQUEST)
+            self.finish({"error": "Invalid query arguments"})
+            return
+        if limit < 1:
+            self.set_status(HTTPStatus.BAD_REQUEST)
+            self.finish({"error": "limit must be positive"})
+            return
+
+        user = current_username(self.current_user)
+        if not user:
+            # Without a name the entries of the caller cannot be told apart.
+            self.set_status(HTTPStatus.OK)
+            self.finish({"items": [], "next": None})
+            return
+
+        entries, cursor = await IOLoop.current().run_in_executor(
+            None,
+            partial(
+                history.query,
+                notebook=self.get_query_argument("notebook", None),
+                notebook_path=self.get_query_argument("notebook_path", None),
+                user=user,
+                cell_id=self.get_query_argument("cell_id", None),
+                status=self.get_query_argument("status", None),
+                since=since,
+                until=until,
+                before=before,
+                limit=min(limit, self.MAX_LIMIT),
+            ),
+        )
+        self.set_status(HTTPStatus.OK)
+        self.finish({"items": entries, "next": cursor})
+
+    def _optional_argument(self, name: str, cast: Callable[[str], Any]) -> Any:
+        value = self.get_query_argument(name, None)
+        return cast(value) if value not in (None, "") else None
+
+
+class NotifyProfileHandler(ExtensionHandlerMixin, JupyterHandler):
+    """
+    Handler serving the execution profile of a notebook.
+
+    GET:
+        Returns the cumulative execution time, the ``limit`` cells with the
+        most total time and the timeline of recent runs of the notebook given
+        by the ``notebook`` query argument, a path or nbmodel document id.
+        ``since`` (UNIX timestamp) restricts the timeline to later runs.
+    """
+
+    def initialize(self, extension_app: Any, *args: Any, **kwargs: Any) -> None:
+        self.extension_app = extension_app
+        super().initialize(*args, **kwargs)
+
+    @tornado.web.authenticated
+    def get(self) -> None:
+        """Return the profile of a notebook."""
+        profiler = self.extension_app.profiler
+        if profiler is None:
+            self.set_status(HTTPStatus.NOT_FOUND)
+            self.finish({"error": "Profiling is not enabled"})
+            return
+
+        notebook = self.get_query_argument("notebook", "")
+        if not notebook:
+            self.set_status(HTTPStatus.BAD_REQUEST)
+            self.finish({"error": "Missing notebook query argument"})
+            return
+        try:
+            limit = int(self.get_query_argument("limit", "20"))
+            since = self.get_query_argument("since", "")
+            since = float(since) if since else None
+        except ValueError:
+            self.set_status(HTTPStatus.BAD_REQUEST)
+            self.finish({"error": "Invalid query arguments"})
+            return
+
+        document_id = profiler.resolve(notebook) or self._document_id(notebook)
+        report = profiler.report(document_id, limit=limit, since=since)
+        if report is None:
+            self.set_status(HTTPStatus.NOT_FOUND)
+            self.finish({"error": f"No executions recorded for {notebook}"})
+            return
+        self.set_status(HTTPStatus.OK)
+        self.finish(report)
+
+    def _document_id(self, path: str) -> str:
+        """Collaboration document id of a notebook path, if file ids are tracked."""
+        file_id_manager = self.settings.get("file_id_manager")
+        if file_id_manager is None:
+            return path
+        file_id = file_id_manager.get_id(path)
+        return f"json:notebook:{file_id}" if file_id else path
+
+
+class NotifyErrorHandler(ExtensionHandlerMixin, JupyterHandler):
+    """
+    Handler serving the full text of errors condensed in notifications.
+
+    GET:
+        Returns the error stored under ``key`` as plain text.
+    """
+
+    def initialize(self, extension_app: Any, *args: Any, **kwargs: Any) -> None:
+        self.extension_app = extension_app
+        super().initialize(*args, **kwargs)
+
+    @tornado.web.authenticated
+    def get(self, key: str) -> None:
+        """Return a stored error."""
+        errors = self.extension_app.errors
+        text = errors.get(key) if errors is not None else None
+        if text is None:
+            self.set_status(HTTPStatus.NOT_FOUND)
+            self.finish({"error": "Unknown error key"})
+            return
+        self.set_status(HTTPStatus.OK)
+        self.set_header("Content-Type", "text/plain; charset=UTF-8")
+        self.finish(text)
+
+
+class NotifyMailHandler(ExtensionHandlerMixin, JupyterHandler):
+    """
+    Handler sending the mails of the kernel magics.
+
+    POST:
+        Queues the MIME message in the request body on the notification
+        workers, ahead of successes when ``status`` is ``failure``. The mail
+        is sent from the configured ``email`` to the address of the caller
+        only: 403 if it names other senders or recipients, or the caller has
+        no address, and 429 past the caller's rate limit. Answers 503 when
+        the server cannot send it soon, for the kernel to send it.
+    """
+
+    RECIPIENT_HEADERS = ("To", "Cc", "Bcc")
+
+    def initialize(self, extension_app: Any, *args: Any, **kwargs: Any) -> None:
+        self.extension_app = extension_app
+        super().initialize(*args, **kwargs)
+
+    @tornado.web.authenticated
+    def post(self) -> None:
+        """Queue a mail."""
+        status = self.get_argument("status", "success")
+        if status not in ("success", "failure"):
+            self.set_status(HTTPStatus.BAD_REQUEST)
+            self.finish({"error": "status must be 'success' or 'failure'"})
+            return
+        message = email.message_from_bytes(
+            self.request.body, policy=email.policy.default
+        )
+        user = current_username(self.current_user)
+        address = self.extension_app.mail_address(user)
+        if not address:
+            self.set_status(HTTPStatus.FORBIDDEN)
+            self.finish({"error": "No mail address for this user"})
+            return
+        sender = self.extension_app.email or address
+        for header in ("From",) + self.RECIPIENT_HEADERS:
+            permitted = {address.lower()}
+            if header == "From":
+                permitted.add(sender.lower())
+            values = [str(value) for value in message.get_all(header, [])]
+            if any(addr.lower() not in permitted for _, addr in getaddresses(values)):
+                self.set_status(HTTPStatus.FORBIDDEN)
+                self.finish({"error": f"Mails may only be sent to {address}"})
+                return
+        limiter = self.extension_app.mail_limiter
+        if limiter is not None and not limiter.allow(user):
+            self.set_status(HTTPStatus.TOO_MANY_REQUESTS)
+            self.finish({"error": "Too many mails, try again later"})
+            return
+
+        for header in ("From",) + self.RECIPIENT_HEADERS:
+            del message[header]
+        message["From"] = sender
+        message["To"] = address
+        error = self.extension_app.queue_mail(message, status == "success")
+        if error is not None:
+            # The kernel sends the mail itself instead.
+            self.set_status(HTTPStatus.SERVICE_UNAVAILABLE)
+            self.finish({"error": error})
+            return
+        self.set_status(HTTPStatus.ACCEPTED)
+        self.finish({"accepted": True})
+
+
+class NotifyRunningHandler(ExtensionHandlerMixin, JupyterHandler):
+    """
+    Handler listing the tracked cells executing now, longest running first.
+
+    GET:
+        Returns up to ``limit`` cells with their notebook, user, start time
+        and elapsed seconds, optionally filtered by ``user`` and ``notebook``,
+        and the ``total`` number matching. Pass the ``next`` cursor of a
+        response as ``after`` to get the next page.
+    """
+
+    MAX_LIMIT = 500
+
+    def initialize(self, extension_app: Any, *args: Any, **kwargs: Any) -> None:
+        self.extension_app = extension_app
+        super().initialize(*args, **kwargs)
+
+    @tornado.web.authenticated
+    def get(self) -> None:
+        """Return a page of running cells."""
+        running = self.extension_app.running
+        if running is None:
+            self.set_status(HTTPStatus.NOT_FOUND)
+            self.finish({"error": "Running cells are not tracked"})
+            return
+
+        try:
+            limit = int(self.get_query_argument("limit", "50"))
+            after = self.get_query_argument("after", "")
+            after = parse_cursor(after) if after else None
+        except ValueError:
+            self.set_status(HTTPStatus.BAD_REQUEST)
+            self.finish({"error": "Invalid query arguments"})
+            return
+        if limit < 1:
+            self.set_status(HTTPStatus.BAD_REQUEST)
+            self.finish({"error": "limit must be positive"})
+            return
+
+        cells, cursor, total = running.longest(
+            min(limit, self.MAX_LIMIT),
+            user=self.get_query_argument("user", None) or None,
+            notebook=self.get_query_argument("notebook", None) or None,
+            after=after,
+        )
+        now = time.time()
+        self.set_status(HTTPStatus.OK)
+        self.finish(
+            {
+                "items": [cell.to_dict(now) for cell in cells],
+                "total": total,
+                "next": format_cursor(cursor) if cursor is not None else None,
+            }
+        )
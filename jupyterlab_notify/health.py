@@ -0,0 +1,67 @@
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Optional
+
+
+@dataclass
+class ProbeResult:
+    """Outcome of the last health probe of a backend."""
+
+    ok: Optional[bool] = None
+    checked_at: Optional[float] = None
+    latency: Optional[float] = None
+    error: Optional[str] = None
+
+
+class HealthMonitor:
+    """
+    Run backend health probes and cache their results.
+
+    Probes are callables raising on failure; a probe returning ``None`` means
+    the backend is healthy. ``version`` changes with every recorded result,
+    as each carries its own check time and latency, so it can back an ETag;
+    between checks the results do not change.
+    """
+
+    def __init__(
+        self,
+        probes: Dict[str, Callable[[], Any]],
+        log: Optional[logging.Logger] = None,
+    ) -> None:
+        self.probes = probes
+        self.log = log or logging.getLogger(__name__)
+        self.results: Dict[str, ProbeResult] = {name: ProbeResult() for name in probes}
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def run(self) -> None:
+        """Run every probe once and record the results."""
+        for name, probe in self.probes.items():
+            started = time.monotonic()
+            try:
+                probe()
+                ok, error = True, None
+            except Exception as exc:
+                ok, error = False, str(exc)
+                self.log.debug(f"Health probe {name} failed: {exc}")
+            result = ProbeResult(
+                ok=ok,
+                checked_at=time.time(),
+                latency=time.monotonic() - started,
+                error=error,
+            )
+            with self._lock:
+                self.version += 1
+                self.results[name] = result
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return the cached results as plain dictionaries."""
+        with self._lock:
+            return {name: asdict(result) for name, result in self.results.items()}
+
+    def is_healthy(self, name: str) -> Optional[bool]:
+        """Cached health of a backend, or None if it was not checked yet."""
+        result = self.results.get(name)
+        return result.ok if result is not None else None
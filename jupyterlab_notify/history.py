@@ -0,0 +1,288 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    notebook TEXT,
+    notebook_path TEXT,
+    user TEXT,
+    cell_id TEXT,
+    mode TEXT,
+    status TEXT NOT NULL,
+    message TEXT,
+    slack_delivered INTEGER,
+    email_delivered INTEGER
+);
+"""
+
+# Columns added after the first release, for databases created before.
+_ADDED_COLUMNS = (("notebook_path", "TEXT"), ("user", "TEXT"))
+
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_notifications_created_at
+    ON notifications (created_at);
+CREATE INDEX IF NOT EXISTS idx_notifications_notebook
+    ON notifications (notebook, id);
+CREATE INDEX IF NOT EXISTS idx_notifications_notebook_path
+    ON notifications (notebook_path, id);
+CREATE INDEX IF NOT EXISTS idx_notifications_user
+    ON notifications (user, id);
+CREATE INDEX IF NOT EXISTS idx_notifications_cell_id
+    ON notifications (cell_id, id);
+CREATE INDEX IF NOT EXISTS idx_notifications_status
+    ON notifications (status, id);
+"""
+
+_COLUMNS = (
+    "created_at",
+    "notebook",
+    "notebook_path",
+    "user",
+    "cell_id",
+    "mode",
+    "status",
+    "message",
+    "slack_delivered",
+    "email_delivered",
+)
+
+_INSERT = "INSERT INTO notifications ({}) VALUES ({})".format(
+    ", ".join(_COLUMNS), ", ".join("?" for _ in _COLUMNS)
+)
+
+_STOP = object()
+
+
+class HistoryStore:
+    """
+    Append-only SQLite log of the notifications sent by the extension.
+
+    ``record`` only puts the entry on a queue; a background writer inserts
+    queued entries in batches, one transaction per batch, and periodically
+    applies the retention policy. Queries use keyset pagination on the row id
+    so deep pages stay cheap on large tables.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_age_days: int = 90,
+        max_rows: int = 1_000_000,
+        log: Optional[logging.Logger] = None,
+    ) -> None:
+        self.path = os.path.expanduser(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_age_days = max_age_days
+        self.max_rows = max_rows
+        self.log = log or logging.getLogger(__name__)
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._compact_every = 3600.0
+        self._last_compaction = 0.0
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connect()
+        connection.executescript(_SCHEMA)
+        existing = {
+            row[1] for row in connection.execute("PRAGMA table_info(notifications)")
+        }
+        for column, kind in _ADDED_COLUMNS:
+            if column not in existing:
+                connection.execute(
+                    f"ALTER TABLE notifications ADD COLUMN {column} {kind}"
+                )
+        connection.executescript(_INDEXES)
+        connection.close()
+
+        self._reader = self._connect()
+        self._reader_lock = threading.Lock()
+        self._writer = threading.Thread(
+            target=self._write_loop, name="notify-history", daemon=True
+        )
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        # WAL lets the API read while the writer appends.
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def record(
+        self,
+        status: str,
+        notebook: Optional[str] = None,
+        cell_id: Optional[str] = None,
+        mode: Optional[str] = None,
+        message: Optional[str] = None,
+        slack_delivered: Optional[bool] = None,
+        email_delivered: Optional[bool] = None,
+        notebook_path: Optional[str] = None,
+        user: Optional[str] = None,
+    ) -> None:
+        """Queue a history entry; never blocks on the database."""
+        self._queue.put(
+            (
+                time.time(),
+                notebook,
+                notebook_path,
+                user,
+                cell_id,
+                mode,
+                status,
+                message,
+                slack_delivered,
+                email_delivered,
+            )
+        )
+
+    def _write_loop(self) -> None:
+        connection = self._connect()
+        try:
+            stopping = False
+            while not stopping:
+                batch: List[Tuple[Any, ...]] = []
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = None
+                deadline = time.monotonic() + self.flush_interval
+                while item is not None:
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get(
+                            timeout=max(0.0, deadline - time.monotonic())
+                        )
+                    except queue.Empty:
+                        item = None
+                if batch:
+                    self._insert(connection, batch)
+                if time.monotonic() - self._last_compaction >= self._compact_every:
+                    self._compact(connection)
+        finally:
+            connection.close()
+
+    def _insert(
+        self, connection: sqlite3.Connection, batch: List[Tuple[Any, ...]]
+    ) -> None:
+        try:
+            with connection:
+                connection.executemany(_INSERT, batch)
+        except sqlite3.Error as exc:
+            self.log.error(f"Failed to write {len(batch)} history entries: {exc}")
+
+    def _compact(self, connection: sqlite3.Connection) -> None:
+        """Delete entries past the retention age or beyond the row limit."""
+        self._last_compaction = time.monotonic()
+        try:
+            with connection:
+                if self.max_age_days > 0:
+                    cutoff = time.time() - self.max_age_days * 86400
+                    connection.execute(
+                        "DELETE FROM notifications WHERE created_at < ?", (cutoff,)
+                    )
+                if self.max_rows > 0:
+                    # Row ids grow monotonically, keep the newest max_rows.
+                    connection.execute(
+                        "DELETE FROM notifications WHERE id <= "
+                        "(SELECT MAX(id) FROM notifications) - ?",
+                        (self.max_rows,),
+                    )
+        except sqlite3.Error as exc:
+            self.log.error(f"Failed to compact notification history: {exc}")
+
+    def query(
+        self,
+        notebook: Optional[str] = None,
+        cell_id: Optional[str] = None,
+        status: Optional[str] = None,
+        notebook_path: Optional[str] = None,
+        user: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        before: Optional[int] = None,
+        limit: int = 50,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Return history entries, newest first.
+
+        ``notebook`` matches the notebook name, ``notebook_path`` its path
+        from the server root; ``user`` the Jupyter user the entry was sent for.
+
+        Returns:
+            Tuple of (entries, cursor). Pass the cursor as ``before`` to get the
+            next page; it is None on the last page.
+        """
+        clauses = []
+        args: List[Any] = []
+        for column, value in (
+            ("notebook", notebook),
+            ("notebook_path", notebook_path),
+            ("user", user),
+            ("cell_id", cell_id),
+            ("status", status),
+        ):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                args.append(value)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            args.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            args.append(until)
+        if before is not None:
+            clauses.append("id < ?")
+            args.append(before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        # Fetch one extra row to know whether there is a next page.
+        sql = f"SELECT * FROM notifications {where} ORDER BY id DESC LIMIT ?"
+        args.append(limit + 1)
+
+        with self._reader_lock:
+            rows = self._reader.execute(sql, args).fetchall()
+
+        entries = [_row_to_dict(row) for row in rows[:limit]]
+        cursor = entries[-1]["id"] if len(rows) > limit else None
+        return entries, cursor
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Stop the writer after it wrote everything queued so far.
+
+        Returns:
+            Whether the writer finished within ``timeout``.
+        """
+        self._queue.put(_STOP)
+        self._writer.join(timeout)
+        return not self._writer.is_alive()
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        finished = self.flush(timeout)
+        with self._reader_lock:
+            self._reader.close()
+        return finished
+
+
+def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    entry = dict(row)
+    for key in ("slack_delivered", "email_delivered"):
+        if entry[key] is not None:
+            entry[key] = bool(entry[key])
+    return entry
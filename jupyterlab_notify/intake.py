@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+EventBatch = Dict[str, List[Dict[str, Any]]]
+
+
+def group_by_cell(events: List[Dict[str, Any]]) -> EventBatch:
+    """Group events by cell id, preserving arrival order within each cell."""
+    groups: EventBatch = {}
+    for data in events:
+        groups.setdefault(data.get("cell_id"), []).append(data)
+    return groups
+
+
+class EventIntake:
+    """
+    Buffer cell execution events and hand them to a processor in micro-batches.
+
+    ``submit`` is O(1) and never formats or parses the payload. A single drain
+    task per burst takes up to ``batch_size`` events at a time, groups them by
+    cell id and yields back to the IOLoop between batches.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[EventBatch], None],
+        batch_size: int = 256,
+        log: Optional[logging.Logger] = None,
+    ) -> None:
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._process_batch = process_batch
+        self._drain_task: Optional["asyncio.Future[None]"] = None
+        self.batch_size = max(1, batch_size)
+        self.log = log or logging.getLogger(__name__)
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def submit(self, data: Dict[str, Any]) -> None:
+        """Queue an event and make sure a drain task is scheduled."""
+        self._queue.append(data)
+        if self._drain_task is None or self._drain_task.done():
+            self._drain_task = asyncio.ensure_future(self._drain())
+
+    def _take(self) -> List[Dict[str, Any]]:
+        popleft = self._queue.popleft
+        return [popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+
+    def process_pending(self) -> None:
+        """Synchronously process everything that is currently queued."""
+        while self._queue:
+            self._run_batch(self._take())
+
+    def _run_batch(self, events: List[Dict[str, Any]]) -> None:
+        try:
+            self._process_batch(group_by_cell(events))
+        except Exception:
+            self.log.exception("Failed to process batch of %d events", len(events))
+
+    async def _drain(self) -> None:
+        while self._queue:
+            self._run_batch(self._take())
+            # Let other IOLoop callbacks run between batches.
+            await asyncio.sleep(0)
+
+    async def flush(self) -> None:
+        """Wait until all queued events have been processed."""
+        if self._drain_task is not None and not self._drain_task.done():
+            await self._drain_task
+        self.process_pending()
@@ -0,0 +1,299 @@
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import zmq
+
+KERNEL_ACTIONS_SCHEMA_ID = "https://events.jupyter.org/jupyter_server/kernel_actions/v1"
+
+DELIMITER = b"<IDS|MSG>"
+
+# IOPub messages needed to follow executions; ipykernel publishes them on
+# ``kernel.<ident>.<msg_type>`` topics.
+TRACKED_TYPES = ("execute_input", "error", "status")
+
+# Executions kept per kernel for registrations that arrive after their
+# execute_input, as the registration request races the execute request.
+MAX_UNCLAIMED = 128
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class _Execution:
+    __slots__ = ("cell_id", "started", "ended", "error")
+
+    def __init__(self, started: str, cell_id: Optional[str] = None) -> None:
+        self.cell_id = cell_id
+        self.started = started
+        self.ended: Optional[str] = None
+        self.error: Optional[str] = None
+
+
+class _KernelWatch:
+    __slots__ = ("stream", "narrowed", "pending", "executions")
+
+    def __init__(self, stream: Any) -> None:
+        self.stream = stream
+        self.narrowed = False
+        # Registered execute requests not seen yet: msg_id -> (cell_id, time).
+        self.pending: Dict[str, Tuple[str, str]] = {}
+        self.executions: "OrderedDict[str, _Execution]" = OrderedDict()
+
+
+class IOPubTracker:
+    """
+    Follow cell executions from the IOPub messages of the server's kernels.
+
+    Used when ``jupyter_server_nbmodel`` is not installed: the frontend
+    registers a cell with the ``msg_id`` of its execute request, and
+    ``execute_input`` and the following ``status: idle`` messages with that
+    parent become ``execution_start`` and ``execution_end`` events shaped
+    like nbmodel's, passed to ``on_event``.
+
+    Each kernel gets its own IOPub subscription. Once a message shows the
+    kernel's topic prefix, the subscription is narrowed to the three
+    message types needed, so the kernel itself drops stream and display
+    output for it; messages are otherwise told apart by their topic frame,
+    and only the parent header and the content of status and error
+    messages are parsed.
+    """
+
+    def __init__(
+        self,
+        kernel_manager: Any,
+        on_event: Callable[[Dict[str, Any]], None],
+        log: Optional[logging.Logger] = None,
+    ) -> None:
+        self.kernel_manager = kernel_manager
+        self.on_event = on_event
+        self.log = log or logging.getLogger(__name__)
+        self._kernels: Dict[str, _KernelWatch] = {}
+
+    def __contains__(self, kernel_id: str) -> bool:
+        return kernel_id in self._kernels
+
+    def watch(self, kernel_id: str) -> bool:
+        """Subscribe to the IOPub channel of a kernel; False if unknown."""
+        if kernel_id in self._kernels:
+            return True
+        try:
+            stream = self.kernel_manager.connect_iopub(kernel_id)
+        except (KeyError, RuntimeError, zmq.ZMQError) as exc:
+            self.log.debug("Cannot watch kernel %s: %s", kernel_id, exc)
+            return False
+        watch = _KernelWatch(stream)
+        stream.on_recv(lambda frames: self._on_message(kernel_id, watch, frames))
+        self._kernels[kernel_id] = watch
+        self.log.debug("Watching IOPub of kernel %s", kernel_id)
+        return True
+
+    def unwatch(self, kernel_id: str, reason: str = "Kernel shut down") -> None:
+        """Close the subscription of a kernel, failing its running cells."""
+        watch = self._kernels.pop(kernel_id, None)
+        if watch is None:
+            return
+        self._fail_all(watch, reason)
+        watch.stream.close()
+
+    def restarted(self, kernel_id: str) -> None:
+        """
+        Fail the cells running in a restarted kernel and subscribe again, as
+        the new kernel process may use new ports and topics.
+        """
+        if kernel_id in self._kernels:
+            self.unwatch(kernel_id, reason="Kernel restarted")
+            self.watch(kernel_id)
+
+    def track(self, kernel_id: str, msg_id: str, cell_id: str) -> bool:
+        """
+        Report the execution of an execute request as the events of a cell.
+
+        Returns:
+            False if the kernel cannot be watched.
+        """
+        if not self.watch(kernel_id):
+            return False
+        watch = self._kernels[kernel_id]
+        execution = watch.executions.get(msg_id)
+        if execution is None:
+            watch.pending[msg_id] = (cell_id, _now())
+            return True
+        # Registered after its execute_input was published.
+        execution.cell_id = cell_id
+        self._start(execution)
+        if execution.ended is not None:
+            del watch.executions[msg_id]
+            self._end(execution)
+        return True
+
+    def untrack(self, kernel_id: str, msg_id: str) -> None:
+        """Stop waiting for an execute request whose registration was dropped."""
+        watch = self._kernels.get(kernel_id)
+        if watch is not None:
+            watch.pending.pop(msg_id, None)
+
+    def close(self) -> None:
+        for watch in self._kernels.values():
+            watch.stream.close()
+        self._kernels.clear()
+
+    async def kernel_action_listener(
+        self, logger: Any, schema_id: str, data: dict
+    ) -> None:
+        """Follow kernels started, restarted and shut down by the server."""
+        kernel_id = data.get("kernel_id")
+        if not kernel_id or data.get("status") != "success":
+            return
+        action = data.get("action")
+        if action == "start":
+            self.watch(kernel_id)
+        elif action == "restart":
+            self.restarted(kernel_id)
+        elif action == "shutdown":
+            self.unwatch(kernel_id)
+
+    def _on_message(
+        self, kernel_id: str, watch: _KernelWatch, frames: List[bytes]
+    ) -> None:
+        try:
+            index = frames.index(DELIMITER)
+        except ValueError:
+            return
+        topic = frames[0] if index else b""
+        if topic.startswith(b"kernel."):
+            prefix, _, raw_type = topic.rpartition(b".")
+            msg_type = raw_type.decode("ascii", "replace")
+            if msg_type not in TRACKED_TYPES:
+                return
+            if not watch.narrowed:
+                self._narrow(watch, prefix + b".")
+        elif topic.startswith(b"stream."):
+            return
+        else:
+            # Kernels publishing without ipykernel's topics.
+            try:
+                msg_type = json.loads(frames[index + 2]).get("msg_type")
+            except (IndexError, ValueError, AttributeError):
+                return
+            if msg_type not in TRACKED_TYPES:
+                return
+
+        try:
+            parent = json.loads(frames[index + 3])
+            msg_id = parent.get("msg_id") if isinstance(parent, dict) else None
+            if msg_type == "status" and not msg_id:
+                # Status of the kernel itself, e.g. starting after a restart.
+                content = json.loads(frames[index + 5])
+                if content.get("execution_state") == "starting":
+                    self._fail_all(watch, "Kernel restarted")
+                return
+            if not msg_id:
+                return
+            if msg_type == "execute_input":
+                self._on_execute_input(watch, msg_id)
+                return
+            execution = watch.executions.get(msg_id)
+            if execution is None and msg_id not in watch.pending:
+                return
+            content = json.loads(frames[index + 5])
+        except (IndexError, ValueError, AttributeError) as exc:
+            self.log.debug("Invalid IOPub message from %s: %s", kernel_id, exc)
+            return
+
+        if msg_type == "error":
+            if execution is None:
+                execution = self._start_missed(watch, msg_id)
+            execution.error = f"{content.get('ename', '')}: {content.get('evalue', '')}"
+        elif content.get("execution_state") == "idle":
+            if execution is None:
+                execution = self._start_missed(watch, msg_id)
+            self._on_idle(watch, msg_id, execution)
+
+    def _narrow(self, watch: _KernelWatch, prefix: bytes) -> None:
+        socket = watch.stream.socket
+        try:
+            # Subscribe before dropping the catch-all, so nothing is lost.
+            for msg_type in TRACKED_TYPES:
+                socket.setsockopt(zmq.SUBSCRIBE, prefix + msg_type.encode())
+            socket.setsockopt(zmq.UNSUBSCRIBE, b"")
+        except zmq.ZMQError as exc:
+            self.log.debug("Cannot narrow IOPub subscription: %s", exc)
+        watch.narrowed = True
+
+    def _on_execute_input(self, watch: _KernelWatch, msg_id: str) -> None:
+        registered = watch.pending.pop(msg_id, None)
+        if registered is None:
+            watch.executions[msg_id] = _Execution(_now())
+            if len(watch.executions) > MAX_UNCLAIMED:
+                self._evict_unclaimed(watch)
+            return
+        execution = _Execution(_now(), cell_id=registered[0])
+        watch.executions[msg_id] = execution
+        self._start(execution)
+
+    def _start_missed(self, watch: _KernelWatch, msg_id: str) -> _Execution:
+        """
+        Start a registered execution whose execute_input was published
+        before the subscription was up, at the time of its registration.
+        """
+        cell_id, registered_at = watch.pending.pop(msg_id)
+        execution = _Execution(registered_at, cell_id=cell_id)
+        watch.executions[msg_id] = execution
+        self._start(execution)
+        return execution
+
+    def _on_idle(self, watch: _KernelWatch, msg_id: str, execution: _Execution) -> None:
+        execution.ended = _now()
+        if execution.cell_id is None:
+            # Kept for a registration still on its way.
+            return
+        del watch.executions[msg_id]
+        self._end(execution)
+
+    def _evict_unclaimed(self, watch: _KernelWatch) -> None:
+        for msg_id, execution in watch.executions.items():
+            if execution.cell_id is None:
+                del watch.executions[msg_id]
+                return
+
+    def _fail_all(self, watch: _KernelWatch, reason: str) -> None:
+        for cell_id, registered_at in watch.pending.values():
+            execution = _Execution(registered_at, cell_id=cell_id)
+            self._start(execution)
+            self._fail(execution, reason)
+        watch.pending.clear()
+        for execution in watch.executions.values():
+            if execution.cell_id is not None:
+                self._fail(execution, reason)
+        watch.executions.clear()
+
+    def _fail(self, execution: _Execution, reason: str) -> None:
+        execution.ended = _now()
+        execution.error = f"KernelError: {reason}"
+        self._end(execution)
+
+    def _start(self, execution: _Execution) -> None:
+        self.on_event(
+            {
+                "event_type": "execution_start",
+                "cell_id": execution.cell_id,
+                "document_id": None,
+                "timestamp": execution.started,
+            }
+        )
+
+    def _end(self, execution: _Execution) -> None:
+        self.on_event(
+            {
+                "event_type": "execution_end",
+                "cell_id": execution.cell_id,
+                "document_id": None,
+                "success": execution.error is None,
+                "kernel_error": execution.error,
+                "timestamp": execution.ended,
+            }
+        )
@@ -0,0 +1,257 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .scheduler import ScheduledCall, Scheduler
+
+# Slack user id and channel name of a message, both None for the configured
+# target, as taken by the extension's ``_slack_target``.
+Destination = Tuple[Optional[str], Optional[str]]
+SlackTarget = Callable[[Optional[str], Optional[str]], Tuple[Any, Optional[str]]]
+RunKey = Tuple[str, Destination]
+
+DEFAULT_DESTINATION: Destination = (None, None)
+
+
+def _elapsed(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes}m {secs}s"
+    if minutes:
+        return f"{minutes}m {secs}s"
+    return f"{secs}s"
+
+
+class NotebookRun:
+    """Progress of the cells of one notebook queued for execution together."""
+
+    __slots__ = (
+        "name",
+        "started",
+        "queued",
+        "running",
+        "done",
+        "failed",
+        "channel",
+        "ts",
+        "last_sent",
+        "update",
+    )
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.started = time.monotonic()
+        self.queued: Set[str] = set()
+        self.running: Set[str] = set()
+        self.done = 0
+        self.failed: List[str] = []
+        self.channel: Optional[str] = None
+        self.ts: Optional[str] = None
+        self.last_sent = 0.0
+        self.update: Optional[ScheduledCall] = None
+
+    @property
+    def finished(self) -> bool:
+        # After a failure, cells that do not start are skipped, as with
+        # JupyterLab's run-all stopping at the first error.
+        return not self.running and (not self.queued or bool(self.failed))
+
+    def render(self) -> str:
+        total = self.done + len(self.failed) + len(self.running) + len(self.queued)
+        elapsed = _elapsed(time.monotonic() - self.started)
+        if self.finished:
+            icon = ":x:" if self.failed else ":white_check_mark:"
+            lines = [f"{icon} *{self.name}* finished in {elapsed}"]
+        else:
+            lines = [f":hourglass_flowing_sand: *{self.name}* running for {elapsed}"]
+        pending = "skipped" if self.finished else "queued"
+        lines.append(
+            f"Done: {self.done + len(self.failed)}/{total}, "
+            f"failed: {len(self.failed)}, running: {len(self.running)}, "
+            f"{pending}: {len(self.queued)}"
+        )
+        if self.failed:
+            lines.append("Failed: " + ", ".join(self.failed[:10]))
+            if len(self.failed) > 10:
+                lines[-1] += f" and {len(self.failed) - 10} more"
+        return "\n".join(lines)
+
+
+class SlackLiveStatus:
+    """
+    Keep one Slack message per notebook run up to date.
+
+    A run starts when a cell of a notebook is registered while none of its
+    cells are pending, and ends when all of them finished, or when none is
+    running after a failure. Cells notified to different destinations, e.g.
+    those of different users, are separate runs. The message is
+    posted on the first change and then edited with ``chat.update``, at most
+    once per ``interval`` seconds whatever the number of cells. When the run
+    ends a summary is posted as a new message, so that it notifies.
+
+    State changes are made on the IOLoop; Slack calls run on the scheduler,
+    only when ``allow_send`` lets them, and their outcome is passed to
+    ``record_send`` with the time they started.
+    """
+
+    def __init__(
+        self,
+        target: SlackTarget,
+        scheduler: Scheduler,
+        interval: float = 5.0,
+        log: Optional[logging.Logger] = None,
+        allow_send: Optional[Callable[[], bool]] = None,
+        record_send: Optional[Callable[[bool, float], None]] = None,
+    ) -> None:
+        self.target = target
+        self.scheduler = scheduler
+        self.interval = interval
+        self.log = log or logging.getLogger(__name__)
+        self.allow_send = allow_send
+        self.record_send = record_send
+        self.runs: Dict[RunKey, NotebookRun] = {}
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+
+    def cell_registered(
+        self,
+        notebook: str,
+        name: str,
+        cell_id: str,
+        destination: Destination = DEFAULT_DESTINATION,
+    ) -> None:
+        key = (notebook, destination)
+        with self._lock:
+            run = self.runs.get(key)
+            if run is None:
+                run = self.runs[key] = NotebookRun(name)
+            run.queued.add(cell_id)
+            self._schedule(key, run)
+
+    def cell_started(
+        self,
+        notebook: str,
+        cell_id: str,
+        destination: Destination = DEFAULT_DESTINATION,
+    ) -> None:
+        key = (notebook, destination)
+        with self._lock:
+            run = self.runs.get(key)
+            if run is None or cell_id not in run.queued:
+                return
+            run.queued.discard(cell_id)
+            run.running.add(cell_id)
+            self._schedule(key, run)
+
+    def cell_finished(
+        self,
+        notebook: str,
+        cell_id: str,
+        success: bool,
+        label: str,
+        destination: Destination = DEFAULT_DESTINATION,
+    ) -> None:
+        key = (notebook, destination)
+        with self._lock:
+            run = self.runs.get(key)
+            if run is None or not (cell_id in run.running or cell_id in run.queued):
+                return
+            run.running.discard(cell_id)
+            run.queued.discard(cell_id)
+            if success:
+                run.done += 1
+            else:
+                run.failed.append(label)
+            self._schedule(key, run)
+
+    def cell_dropped(
+        self,
+        notebook: str,
+        cell_id: str,
+        destination: Destination = DEFAULT_DESTINATION,
+    ) -> None:
+        """
+        Forget a cell that will not be reported, e.g. one that finished under
+        its threshold or whose registration expired before it started.
+        """
+        key = (notebook, destination)
+        with self._lock:
+            run = self.runs.get(key)
+            if run is None or not (cell_id in run.running or cell_id in run.queued):
+                return
+            run.running.discard(cell_id)
+            run.queued.discard(cell_id)
+            if run.ts is None and run.finished and not (run.done or run.failed):
+                # Nothing was posted nor is left to report.
+                if run.update is not None:
+                    run.update.cancel()
+                del self.runs[key]
+                return
+            self._schedule(key, run)
+
+    def close(self) -> None:
+        """Forget every run, with their planned updates; used at shutdown."""
+        with self._lock:
+            for run in self.runs.values():
+                if run.update is not None:
+                    run.update.cancel()
+            self.runs.clear()
+
+    def _schedule(self, key: RunKey, run: NotebookRun) -> None:
+        """Plan an update of the run message, unless one is already planned."""
+        if run.update is not None:
+            return
+        delay = max(0.0, run.last_sent + self.interval - time.monotonic())
+        try:
+            run.update = self.scheduler.call_later(delay, self._send, key, run)
+        except RuntimeError:
+            # Scheduler stopped, the server is shutting down.
+            pass
+
+    def _send(self, key: RunKey, run: NotebookRun) -> None:
+        # One Slack call at a time, so a message is posted before it is edited.
+        with self._send_lock:
+            with self._lock:
+                run.update = None
+                text = run.render()
+                finished = run.finished
+                if finished and self.runs.get(key) is run:
+                    # Cells registered from now on start a new run.
+                    del self.runs[key]
+                run.last_sent = time.monotonic()
+
+            client, channel = self.target(*key[1])
+            if client is None:
+                return
+            if self.allow_send is not None and not self.allow_send():
+                # The circuit is open; the update is tried again later, with
+                # the state of the run by then.
+                with self._lock:
+                    self._schedule(key, run)
+                return
+            started = time.monotonic()
+            try:
+                if run.ts is None:
+                    # A run finished by its first message needs no summary.
+                    response = client.chat_postMessage(channel=channel, text=text)
+                    run.channel, run.ts = response["channel"], response["ts"]
+                else:
+                    client.chat_update(channel=run.channel, ts=run.ts, text=text)
+                    if finished:
+                        client.chat_postMessage(
+                            channel=run.channel,
+                            text=text,
+                            thread_ts=run.ts,
+                            reply_broadcast=True,
+                        )
+            except Exception as exc:
+                self._record(False, started)
+                self.log.error(f"Failed to update Slack run status: {exc}")
+                return
+            self._record(True, started)
+
+    def _record(self, success: bool, started: float) -> None:
+        if self.record_send is not None:
+            self.record_send(success, started)
@@ -1,16 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor
 from email.message import EmailMessage
 from enum import Enum
 from getpass import getuser
 from importlib import import_module
 import inspect
 import time
-from traitlets import Any, Unicode
+from traitlets import Any, Bool, Int, Unicode
 import uuid
 
 from IPython import get_ipython
+from IPython.core.error import UsageError
 from IPython.core.magic import Magics, cell_magic, line_magic, magics_class
 from IPython.core.magic_arguments import argument, magic_arguments, parse_argstring
-from IPython.display import display
+from IPython.display import display, update_display
+
+from .mail import build_rich_message
+from .server_mail import ServerMail
 
 
 _DEFAULT_SUCCESS_MESSAGE = "Cell execution completed successfully"
@@ -38,27 +43,57 @@ class _Notification(object):
     def message_type(self, msg_type):
         self._message_type = _NotificationType(msg_type)
 
-    def __init__(self, message_type, title=None):
+    def __init__(self, message_type, title=None, transient=False):
         """
         Used to send notifications to the client using custom mimetypes
         """
         self.message_type = message_type
         self.title = title
+        self.transient = transient
 
     def _repr_mimebundle_(self, **kwargs):
-        return {
-            self.NOTIFICATION_MIMETYPE: {
-                "type": self.message_type.value,
-                "payload": {"title": self.title},
-                "id": str(uuid.uuid4()),
-            }
+        data = {
+            "type": self.message_type.value,
+            "payload": {"title": self.title},
+            "id": str(uuid.uuid4()),
         }
+        if self.transient:
+            data["transient"] = True
+        return {self.NOTIFICATION_MIMETYPE: data}
 
 
 class SMTPConfigurationError(Exception):
     pass
 
 
+def _transform_notify_cell(lines):
+    """
+    Input transformer running ``%%notify`` cells as regular top-level cells.
+
+    The magic line is replaced by a call arming a one-shot notification for
+    the current execution, instead of letting IPython nest ``run_cell`` inside
+    the cell magic. The body is then compiled and run like any other cell,
+    including top-level ``await``, and the result is reported from the
+    ``post_run_cell`` event.
+    """
+    args = _notify_cell_args(lines[0]) if lines else None
+    if args is None:
+        return lines
+    arm = f"get_ipython().run_line_magic({_ARM_MAGIC!r}, {args!r})\n"
+    return [arm] + lines[1:]
+
+
+def _notify_cell_args(line):
+    """Return the arguments of a ``%%notify`` magic line, or None for other lines."""
+    if not line.startswith("%%notify"):
+        return None
+    magic, _, args = line.rstrip("\n").partition(" ")
+    return args.strip() if magic == "%%notify" else None
+
+
+_ARM_MAGIC = "_notify_cell"
+
+
 @magics_class
 class NotifyCellCompletionMagics(Magics):
     smtp_class: str = Unicode(
@@ -71,12 +106,88 @@ class NotifyCellCompletionMagics(Magics):
         config=True,
         help="Arguments to pass to the SMTP class constructor, as a string",
     )
+    server_mail: bool = Bool(
+        True,
+        config=True,
+        help=(
+            "Send mails through the notification extension of the Jupyter "
+            "server running the kernel, which shares one SMTP session between "
+            "kernels; the SMTP settings above are only used when it cannot"
+        ),
+    )
+    transient: bool = Bool(
+        False,
+        config=True,
+        help=(
+            "Deliver notifications without creating notebook outputs, "
+            "so that they are never saved in the notebook"
+        ),
+    )
+
+    rich_mail: bool = Bool(
+        False,
+        config=True,
+        help=(
+            "Render the rich output of successful cells in notification mails: "
+            "text, HTML and PNG images inline"
+        ),
+    )
+    mail_max_bytes: int = Int(
+        10 * 2**20,
+        config=True,
+        help=(
+            "Maximum encoded size of the outputs in a rich notification mail; "
+            "larger images are downscaled if Pillow is installed, or omitted"
+        ),
+    )
 
     def __init__(self, shell):
         super(NotifyCellCompletionMagics, self).__init__(shell)
         self.smtp_instance = None
-        self._setup_smtp_instance()
-        display(_Notification(_NotificationType.INIT))
+        self._mail_executor = None
+        self._server_mail = None
+        if self.server_mail:
+            self._server_mail = ServerMail.discover()
+        # Kernels of a server send through it; a session is opened on fallback.
+        if self._server_mail is None:
+            self._setup_smtp_instance()
+        # The notifications of a cell share one display which is updated in
+        # place, so the notebook does not grow with each of them. A display
+        # only lives as long as the output of the cell that created it, so
+        # each cell creates its own; transient updates never need one.
+        self._transient_display_id = f"jupyterlab-notify-{uuid.uuid4()}"
+        self._display_id = None
+        self._display_notification(_NotificationType.INIT)
+
+        self._cell_args = None
+        self._parsed_cell_args = {}
+        self._notified_result = None
+        if shell is not None and hasattr(shell, "input_transformers_cleanup"):
+            if _transform_notify_cell not in shell.input_transformers_cleanup:
+                shell.input_transformers_cleanup.append(_transform_notify_cell)
+        if shell is not None and hasattr(shell, "events"):
+            shell.events.register("pre_run_cell", self._pre_run_notify)
+            shell.events.register("post_run_cell", self._post_notify_cell)
+
+    def _display_notification(self, message_type, title=None):
+        # Publish the bundle as is rather than running every display formatter.
+        bundle = _Notification(
+            message_type, title, transient=self.transient
+        )._repr_mimebundle_()
+        if self.transient:
+            # In transient mode the display id is never created, so no output
+            # is added; the frontend picks the update up from the IOPub stream.
+            update_display(bundle, raw=True, display_id=self._transient_display_id)
+        elif self._display_id is None:
+            self._display_id = f"jupyterlab-notify-{uuid.uuid4()}"
+            display(bundle, raw=True, display_id=self._display_id)
+        else:
+            update_display(bundle, raw=True, display_id=self._display_id)
+
+    def _pre_run_notify(self, info):
+        # The display of an earlier cell may have been cleared, re-run or lost
+        # with a page reload, in which case updates to it would be dropped.
+        self._display_id = None
 
     def _setup_smtp_instance(self):
         try:
@@ -184,13 +295,62 @@ class NotifyCellCompletionMagics(Magics):
         Cell magic that notifies either via desktop notification or email
 
         """
-        args = parse_argstring(self.notify_all, line)
+        # Cells starting with %%notify are normally rewritten by
+        # _transform_notify_cell and never reach this method; it only runs
+        # when the magic is invoked explicitly, e.g. with run_cell_magic.
+        args = parse_argstring(self.notify, line)
         ip = get_ipython()
         exec_result = ip.run_cell(cell)
         self.handle_result(exec_result, args.mail, args.success, args.failure)
 
+    @line_magic(_ARM_MAGIC)
+    def _notify_cell(self, line):
+        """Arm a notification for the cell currently executing (see ``%%notify``)."""
+        self._cell_args = self._notify_arguments(line)
+
+    def _notify_arguments(self, line):
+        # Parsing with argparse dominates the cost of tight cells, cache it.
+        args = self._parsed_cell_args.get(line)
+        if args is None:
+            if len(self._parsed_cell_args) >= 128:
+                self._parsed_cell_args.clear()
+            args = self._parsed_cell_args[line] = parse_argstring(self.notify, line)
+        return args
+
+    def _post_notify_cell(self, exec_result):
+        args, self._cell_args = self._cell_args, None
+        if args is None:
+            # A %%notify cell which does not compile never arms its
+            # notification, so it is found from the source of the cell.
+            if exec_result is None or exec_result.error_before_exec is None:
+                return
+            raw_cell = getattr(exec_result.info, "raw_cell", None) or ""
+            line = _notify_cell_args(raw_cell.split("\n", 1)[0])
+            if line is None:
+                return
+            try:
+                args = self._notify_arguments(line)
+            except UsageError:
+                return
+        self._notified_result = exec_result
+        self.handle_result(exec_result, args.mail, args.success, args.failure)
+
     def handle_result(self, exec_result, should_mail, success_msg, failure_msg):
         title = success_msg if exec_result.success else failure_msg
+        if should_mail and self.rich_mail and exec_result.success:
+            result = exec_result.result
+            # Formatting runs user code and stays on this thread; encoding and
+            # sending the mail do not hold up the next cell.
+            bundle = (
+                get_ipython().display_formatter.format(result)[0]
+                if result is not None
+                else {}
+            )
+            if self._mail_executor is None:
+                self._mail_executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="notify-mail"
+                )
+            return self._mail_executor.submit(self._send_rich_mail, title, bundle)
         if should_mail:
 
             message = EmailMessage()
@@ -226,9 +386,28 @@ class NotifyCellCompletionMagics(Magics):
             # related args from the user to open a session with the target
             # SMTP server (in NotifyCellCompletionMagics initializer) / provide
             # hooks for users to plugin their implementations of mail
-            self.smtp_instance.send_message(message)
+            self._send_mail(message, exec_result.success)
         else:
-            display(_Notification(_NotificationType.NOTIFY, title))
+            self._display_notification(_NotificationType.NOTIFY, title)
+
+    def _send_rich_mail(self, title, bundle):
+        message = build_rich_message(
+            title, getuser(), getuser(), bundle, self.mail_max_bytes
+        )
+        try:
+            self._send_mail(message, True)
+        except Exception as e:
+            print(f"Failed to send notification mail: {str(e)}")
+
+    def _send_mail(self, message, success):
+        """Send a mail through the server, or the kernel's own SMTP session."""
+        if self._server_mail is not None and self._server_mail.send(message, success):
+            return
+        if self.smtp_instance is None:
+            self._setup_smtp_instance()
+            if self.smtp_instance is None:
+                return
+        self.smtp_instance.send_message(message)
 
     @magic_arguments()
     @argument(
@@ -315,6 +494,9 @@ class NotifyCellCompletionMagics(Magics):
         # Do not run the hook for the cell where the magic is registered
         if not hasattr(self, "run_start_time"):
             return
+        # %%notify cells are already reported by _post_notify_cell
+        if self._cell_args is not None or exec_result is self._notified_result:
+            return
 
         sec_elapsed = time.time() - self.run_start_time
         # Notify either if the threshold is breached or the execution failed
@@ -0,0 +1,137 @@
+import base64
+import html
+import io
+from email.message import EmailMessage
+from typing import Any, Dict, List, Optional
+
+# Characters per line of base64 bodies, as written by the email package.
+_BASE64_LINE = 76
+
+
+def encoded_size(size: int) -> int:
+    """Size of ``size`` bytes once base64 encoded in CRLF terminated lines."""
+    encoded = 4 * ((size + 2) // 3)
+    return encoded + 2 * ((encoded + _BASE64_LINE - 1) // _BASE64_LINE)
+
+
+def _format_size(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            break
+        size /= 1024
+    else:
+        unit = "GiB"
+    return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+
+
+def _png_bytes(value: Any) -> bytes:
+    # Formatters return raw bytes, but _repr_png_ may hand out base64 text.
+    if isinstance(value, str):
+        return base64.b64decode(value)
+    return bytes(value)
+
+
+def downscale_png(data: bytes, max_size: int) -> Optional[bytes]:
+    """
+    Shrink a PNG image to at most ``max_size`` bytes.
+
+    Returns:
+        The smaller image, or None if Pillow is not installed or the image
+        cannot be made small enough.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+            size = len(data)
+            for _ in range(4):
+                # PNG size grows roughly with the pixel count.
+                ratio = 0.9 * (max_size / size) ** 0.5
+                width = max(1, int(image.width * ratio))
+                height = max(1, int(image.height * ratio))
+                out = io.BytesIO()
+                image.resize((width, height)).save(out, format="PNG", optimize=True)
+                size = out.tell()
+                if size <= max_size:
+                    return out.getvalue()
+    except (OSError, ValueError):
+        return None
+    return None
+
+
+def build_rich_message(
+    subject: str,
+    sender: str,
+    to: str,
+    bundle: Dict[str, Any],
+    max_bytes: int,
+) -> EmailMessage:
+    """
+    Build a multipart email from the mime bundle of a cell result.
+
+    The ``text/plain`` output is the plain text part; ``text/html`` and
+    ``image/png`` outputs make the HTML part, with the image attached inline.
+    Parts are added while their encoded size fits in ``max_bytes``: sizes are
+    computed before encoding, so nothing is encoded to be dropped. An image
+    over the limit is downscaled when Pillow is available, otherwise
+    omitted with a note.
+    """
+    message = EmailMessage()
+    message["Subject"] = subject
+    message["From"] = sender
+    message["To"] = to
+
+    budget = max_bytes
+    notes: List[str] = []
+
+    text = str(bundle.get("text/plain", ""))
+    text_size = len(text.encode("utf-8"))
+    if text_size > budget:
+        text = text.encode("utf-8")[: max(0, budget - 64)].decode("utf-8", "ignore")
+        notes.append(f"Text output truncated from {_format_size(text_size)}.")
+    budget -= len(text.encode("utf-8"))
+
+    html_body = bundle.get("text/html")
+    if html_body is not None:
+        html_size = encoded_size(len(str(html_body).encode("utf-8")))
+        if html_size > budget:
+            notes.append(f"HTML output of {_format_size(html_size)} omitted.")
+            html_body = None
+        else:
+            budget -= html_size
+
+    png = bundle.get("image/png")
+    if png is not None:
+        png = _png_bytes(png)
+        png_size = encoded_size(len(png))
+        if png_size > budget:
+            # Raw size of an image that encodes to the remaining budget.
+            scaled = downscale_png(png, max(0, budget * 3 // 4 - 1024))
+            if scaled is None:
+                notes.append(
+                    f"Image of {_format_size(png_size)} omitted, over the "
+                    f"{_format_size(max_bytes)} mail size limit."
+                )
+            else:
+                notes.append(f"Image downscaled from {_format_size(png_size)}.")
+            png = scaled
+
+    if notes:
+        text = "\n\n".join([text, *notes]) if text else "\n".join(notes)
+    message.set_content(text)
+    if html_body is None and png is None:
+        return message
+
+    parts = [str(html_body)] if html_body is not None else []
+    parts.extend(f"<p>{html.escape(note)}</p>" for note in notes)
+    if png is not None:
+        parts.append('<img src="cid:cell-output" alt="Cell output">')
+    message.add_alternative("\n".join(parts), subtype="html")
+    if png is not None:
+        message.get_payload()[1].add_related(
+            png, "image", "png", cid="<cell-output>", disposition="inline"
+        )
+    return message
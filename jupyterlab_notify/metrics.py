@@ -0,0 +1,41 @@
+"""
+Prometheus metrics of the notify extension.
+
+They are registered in the default registry and served by the Jupyter
+server ``/metrics`` endpoint along with the server's own metrics.
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+CELL_CPU_SECONDS = Histogram(
+    "jupyter_notify_cell_cpu_seconds",
+    "Kernel CPU time used by cells with notifications",
+    ["status"],
+    buckets=(0.1, 1, 5, 15, 60, 300, 900, 3600, 4 * 3600, float("inf")),
+)
+
+CELL_PEAK_RSS_BYTES = Histogram(
+    "jupyter_notify_cell_peak_rss_bytes",
+    "Sampled peak resident memory of the kernel while cells with notifications ran",
+    ["status"],
+    buckets=tuple(2**exponent for exponent in range(26, 38)) + (float("inf"),),
+)
+
+CELL_WALL_SECONDS = Histogram(
+    "jupyter_notify_cell_wall_seconds",
+    "Execution time of cells with notifications",
+    ["status"],
+    buckets=(0.1, 1, 5, 15, 60, 300, 900, 3600, 4 * 3600, float("inf")),
+)
+
+BACKEND_CIRCUIT_STATE = Gauge(
+    "jupyter_notify_backend_circuit_state",
+    "Circuit breaker state of a notification backend: 0 closed, 1 half-open, 2 open",
+    ["backend"],
+)
+
+BACKEND_REJECTED_SENDS = Counter(
+    "jupyter_notify_backend_rejected_sends_total",
+    "Notifications not sent because the backend circuit breaker was open",
+    ["backend"],
+)
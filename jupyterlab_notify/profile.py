@@ -0,0 +1,167 @@
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# (cell_id, start, end, success), times as UNIX timestamps.
+CellRun = Tuple[str, float, float, Optional[bool]]
+
+
+def _timestamp(value: str) -> float:
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value).timestamp()
+
+
+class NotebookTimeline:
+    """Recent cell runs of one notebook and per-cell totals."""
+
+    __slots__ = ("runs", "running", "totals", "max_cells")
+
+    def __init__(self, max_runs: int, max_cells: int) -> None:
+        self.runs: Deque[CellRun] = deque(maxlen=max_runs)
+        # Start timestamps are kept as received and parsed on execution_end.
+        self.running: Dict[str, str] = {}
+        # cell_id -> [runs, total seconds, max seconds]
+        self.totals: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.max_cells = max_cells
+
+    def start(self, cell_id: str, timestamp: str) -> None:
+        self.running[cell_id] = timestamp
+        if len(self.running) > self.max_cells:
+            # End events can be lost, e.g. when the kernel dies.
+            del self.running[next(iter(self.running))]
+
+    def end(self, cell_id: str, timestamp: str, success: Optional[bool]) -> None:
+        started = self.running.pop(cell_id, None)
+        if started is None:
+            return
+        try:
+            start, end = _timestamp(started), _timestamp(timestamp)
+        except ValueError:
+            return
+        duration = end - start
+        self.runs.append((cell_id, start, end, success))
+
+        totals = self.totals.get(cell_id)
+        if totals is None:
+            totals = self.totals[cell_id] = [0, 0.0, 0.0]
+            if len(self.totals) > self.max_cells:
+                self.totals.popitem(last=False)
+        else:
+            self.totals.move_to_end(cell_id)
+        totals[0] += 1
+        totals[1] += duration
+        totals[2] = max(totals[2], duration)
+
+
+class ExecutionProfiler:
+    """
+    Execution timelines of every cell run, grouped by notebook.
+
+    Notebooks are identified by the nbmodel document id; paths can be mapped
+    to document ids with ``add_alias``. Memory is bounded: at most
+    ``max_notebooks`` notebooks, least recently active dropped first, each
+    keeping its last ``max_runs`` runs.
+    """
+
+    def __init__(
+        self, max_notebooks: int = 64, max_runs: int = 2000, max_cells: int = 2000
+    ) -> None:
+        self.max_notebooks = max_notebooks
+        self.max_runs = max_runs
+        self.max_cells = max_cells
+        self._timelines: "OrderedDict[str, NotebookTimeline]" = OrderedDict()
+        self._aliases: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._timelines)
+
+    def observe(self, data: Dict[str, Any]) -> None:
+        """Record a nbmodel ``cell_execution`` event."""
+        document_id = data.get("document_id")
+        cell_id = data.get("cell_id")
+        timestamp = data.get("timestamp")
+        if not document_id or not cell_id or not timestamp:
+            return
+
+        timeline = self._timelines.get(document_id)
+        if timeline is None:
+            timeline = self._timelines[document_id] = NotebookTimeline(
+                self.max_runs, self.max_cells
+            )
+            if len(self._timelines) > self.max_notebooks:
+                evicted, _ = self._timelines.popitem(last=False)
+                self._aliases = {
+                    path: doc for path, doc in self._aliases.items() if doc != evicted
+                }
+        else:
+            self._timelines.move_to_end(document_id)
+
+        event_type = data.get("event_type")
+        if event_type == "execution_start":
+            timeline.start(cell_id, timestamp)
+        elif event_type == "execution_end":
+            timeline.end(cell_id, timestamp, data.get("success"))
+
+    def add_alias(self, path: str, document_id: str) -> None:
+        """Make the timeline of ``document_id`` available under ``path``."""
+        if document_id in self._timelines:
+            self._aliases[path] = document_id
+
+    def resolve(self, notebook: str) -> Optional[str]:
+        """Document id of a notebook given its document id or path."""
+        if notebook in self._timelines:
+            return notebook
+        return self._aliases.get(notebook)
+
+    def report(
+        self, document_id: str, limit: int = 20, since: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Summarize the runs of a notebook.
+
+        Returns:
+            The cumulative execution time, the ``limit`` cells with the most
+            total time, the cells currently running and the timeline of runs
+            ending after ``since``, oldest first. None for unknown notebooks.
+        """
+        timeline = self._timelines.get(document_id)
+        if timeline is None:
+            return None
+
+        slowest = sorted(
+            timeline.totals.items(), key=lambda item: item[1][1], reverse=True
+        )[:limit]
+        runs = [
+            {
+                "cell_id": cell_id,
+                "start": start,
+                "end": end,
+                "duration": end - start,
+                "success": success,
+            }
+            for cell_id, start, end, success in timeline.runs
+            if since is None or end > since
+        ]
+        running = []
+        for cell_id, started in timeline.running.items():
+            try:
+                running.append({"cell_id": cell_id, "start": _timestamp(started)})
+            except ValueError:
+                continue
+        return {
+            "document_id": document_id,
+            "cumulative_time": sum(t[1] for t in timeline.totals.values()),
+            "slowest": [
+                {
+                    "cell_id": cell_id,
+                    "runs": int(count),
+                    "total": total,
+                    "max": longest,
+                    "mean": total / count,
+                }
+                for cell_id, (count, total, longest) in slowest
+            ],
+            "running": running,
+            "timeline": runs,
+        }
@@ -0,0 +1,43 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+
+class RateLimiter:
+    """
+    Token buckets of the kernel mails of each user.
+
+    A user may send ``burst`` mails at once, then ``rate`` mails per minute.
+    Buckets of users not seen lately are dropped past ``max_keys`` users;
+    they are full again by the time they are needed.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        max_keys: int = 4096,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = rate / 60.0
+        self.burst = max(1, burst)
+        self.max_keys = max_keys
+        self.clock = clock
+        # Tokens left and time of the last update, per user.
+        self._buckets: "OrderedDict[Optional[str], Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key: Optional[str]) -> bool:
+        """Take a token from the bucket of ``key``; False if it is empty."""
+        now = self.clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed
@@ -0,0 +1,88 @@
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Mapping, Optional
+
+RecipientSource = Callable[[], Mapping[str, Mapping[str, Any]]]
+
+
+@dataclass(frozen=True)
+class Recipient:
+    """Where the notifications of a Jupyter user are delivered."""
+
+    email: Optional[str] = None
+    slack_user_id: Optional[str] = None
+
+
+def load_recipients_file(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Read a JSON file mapping user names to recipients, e.g.
+    ``{"alice": {"email": "alice@example.com", "slack_user_id": "U123"}}``.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} does not contain a JSON object")
+    return data
+
+
+class RecipientDirectory:
+    """
+    In-memory map of Jupyter user names to recipients.
+
+    The whole map is loaded from ``source`` at once and swapped in a single
+    assignment, so lookups are a dict access and never wait on the source.
+    ``refresh`` reloads it when it is older than ``ttl`` seconds; if the
+    source fails, the previous map is kept.
+    """
+
+    def __init__(
+        self,
+        source: RecipientSource,
+        ttl: float = 300.0,
+        log: Optional[logging.Logger] = None,
+    ) -> None:
+        self.source = source
+        self.ttl = ttl
+        self.log = log or logging.getLogger(__name__)
+        self._recipients: Dict[str, Recipient] = {}
+        self.loaded_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._recipients)
+
+    @property
+    def expired(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at >= self.ttl
+
+    def lookup(self, username: Optional[str]) -> Optional[Recipient]:
+        if not username:
+            return None
+        return self._recipients.get(username)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Reload the map from the source if it expired.
+
+        Returns:
+            Whether the map was reloaded.
+        """
+        if not force and not self.expired:
+            return False
+        try:
+            entries = self.source()
+            recipients = {
+                str(username): Recipient(
+                    email=entry.get("email") or None,
+                    slack_user_id=entry.get("slack_user_id") or None,
+                )
+                for username, entry in entries.items()
+            }
+        except Exception as exc:
+            self.log.error(f"Failed to load notification recipients: {exc}")
+            return False
+        self._recipients = recipients
+        self.loaded_at = time.monotonic()
+        self.log.debug("Loaded %d notification recipients", len(recipients))
+        return True
@@ -0,0 +1,312 @@
+"""
+Replay a recorded event trace against the notify extension.
+
+Traces are written by the server when ``NotificationConfig.event_trace_path``
+is set. Registrations and cell execution events are fed to an in-process
+``NotifyExtension`` with their recorded timing, optionally accelerated, with
+SMTP and Slack replaced by stubs. Reports the dispatch latency from
+``execution_end`` to delivery, the number of registered cells over time, and
+notifications dropped, duplicated or sent when the mode says they should not.
+
+Usage:
+    jupyter notify-replay TRACE [--speed 10] [--backend-latency 0]
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from traitlets.config import Config
+
+from .config import NotificationParams
+from .extension import NBMODEL_SCHEMA_ID, NotifyExtension
+from .templates import RenderedMessage
+from .trace import read_trace
+
+
+class StubSMTP:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def connect(self, *args):
+        pass
+
+    def send_message(self, message):
+        time.sleep(self.latency)
+
+
+class StubSlack:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def conversations_open(self, users):
+        return {"channel": {"id": "D0"}}
+
+    def chat_postMessage(self, channel, text):
+        time.sleep(self.latency)
+        return {"channel": channel, "ts": "0"}
+
+
+class ReplayExtension(NotifyExtension):
+    """Extension noting when each notification reaches the backends."""
+
+    def _deliver(
+        self,
+        params: NotificationParams,
+        status: str,
+        formatted_message: RenderedMessage,
+    ) -> None:
+        super()._deliver(params, status, formatted_message)
+        self.deliveries.append((params, status, time.perf_counter()))
+
+
+def _make_extension(backend_latency: float) -> ReplayExtension:
+    extension = ReplayExtension()
+    extension.update_config(
+        Config(
+            {
+                "NotificationConfig": {
+                    "smtp_class": f"{__name__}.StubSMTP",
+                    "smtp_args": [backend_latency],
+                    "slack_token": "xoxb-replay",
+                    "health_check_interval": 0,
+                    "config_reload_interval": 0,
+                    "resource_sample_interval": 0,
+                }
+            }
+        )
+    )
+    extension._init_config()
+    extension._init_dispatch()
+    extension.slack_client = StubSlack(backend_latency)
+    extension.slack_imported = True
+    extension.is_listening = True
+    extension.initialize_handlers()
+    extension.deliveries = []
+    return extension
+
+
+def _expected(entry: Dict[str, Any]) -> Optional[bool]:
+    """Whether a finished registration should have been notified, if known."""
+    mode = entry["params"].mode
+    if mode == "custom-timeout":
+        return True
+    if mode == "never":
+        return False
+    if mode == "on-error":
+        return not entry["success"]
+    if mode == "default":
+        duration = entry["duration"]
+        return duration is not None and duration >= entry["params"].threshold
+    # Regression mode depends on the duration history, not replayed; other
+    # modes are not known to the frontend.
+    return None
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def replay(
+    records: Sequence[Dict[str, Any]],
+    speed: float = 1.0,
+    backend_latency: float = 0.0,
+    samples: int = 10,
+) -> Dict[str, Any]:
+    """
+    Feed trace records to a fresh extension and measure the outcome.
+
+    Times are divided by ``speed``, thresholds included, so that modes
+    compare durations the way they did when recorded.
+    """
+    extension = _make_extension(backend_latency)
+    base = datetime.now(timezone.utc)
+    registrations: Dict[int, Dict[str, Any]] = {}
+    current: Dict[str, Dict[str, Any]] = {}
+    started: Dict[str, float] = {}
+    registry: List[Dict[str, float]] = []
+    duration = records[-1]["t"] / speed if records else 0.0
+
+    async def sample() -> None:
+        interval = max(duration / samples, 0.01)
+        while True:
+            registry.append(
+                {
+                    "t": round((time.perf_counter() - t0) * speed, 3),
+                    "cells": len(extension.cell_ids),
+                    "runs": len(extension.runs),
+                    "timers": len(extension.scheduler),
+                }
+            )
+            await asyncio.sleep(interval)
+
+    def register(record: Dict[str, Any]) -> NotificationParams:
+        params = NotificationParams(
+            cell_id=record["c"],
+            # The mode of the frontend when the trace does not say.
+            mode=record.get("m") or "default",
+            slackEnabled=True,
+            emailEnabled=False,
+            successMessage="Success",
+            failureMessage="Failure",
+            threshold=(record.get("th") or 0) / speed,
+            notebook_name="replay.ipynb",
+        )
+        entry = {
+            "params": params,
+            "pending": len(set(record.get("cs", ()))) or 1,
+            "ended": None,
+            "success": None,
+            "duration": None,
+        }
+        registrations[id(params)] = entry
+        return params
+
+    t0 = time.perf_counter()
+    sampler = asyncio.ensure_future(sample())
+    for record in records:
+        delay = record["t"] / speed - (time.perf_counter() - t0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        kind, cell_id = record["k"], record.get("c")
+        if kind == "reg":
+            params = register(record)
+            current[cell_id] = registrations[id(params)]
+            extension.register_cell(params)
+        elif kind == "run":
+            params = register(record)
+            for cell in record.get("cs", []):
+                current[cell] = registrations[id(params)]
+            extension.register_run(params, record.get("cs", []))
+        elif kind in ("start", "end"):
+            timestamp = base + timedelta(seconds=record["t"] / speed)
+            if kind == "start":
+                started[cell_id] = record["t"] / speed
+            else:
+                entry = current.pop(cell_id, None)
+                if entry is not None and entry["ended"] is None:
+                    entry["pending"] -= 1
+                    entry["success"] = bool(record.get("ok"))
+                    if cell_id in started:
+                        # For runs, the duration of their last cell.
+                        entry["duration"] = record["t"] / speed - started[cell_id]
+                    if entry["pending"] == 0 or not entry["success"]:
+                        entry["ended"] = time.perf_counter()
+            await extension.event_listener(
+                None,
+                NBMODEL_SCHEMA_ID,
+                {
+                    "event_type": f"execution_{kind}",
+                    "cell_id": cell_id,
+                    "document_id": record.get("d"),
+                    "success": record.get("ok"),
+                    "kernel_error": "Error: replayed" if record.get("err") else None,
+                    "timestamp": timestamp.isoformat().replace("+00:00", "Z"),
+                },
+            )
+    elapsed = time.perf_counter() - t0
+
+    await extension._intake.flush()
+    extension.scheduler.stop()
+    await asyncio.get_running_loop().run_in_executor(
+        None, extension._dispatch_executor.shutdown
+    )
+    sampler.cancel()
+
+    delivered: Dict[int, List[Any]] = {}
+    for params, status, sent in extension.deliveries:
+        if status != "Running":
+            delivered.setdefault(id(params), []).append((status, sent))
+
+    latencies = []
+    dropped = duplicated = unexpected = 0
+    for key, entry in registrations.items():
+        sent = delivered.get(key, [])
+        if len(sent) > 1:
+            duplicated += 1
+        if entry["ended"] is None:
+            continue
+        expected = _expected(entry)
+        if expected and not sent:
+            dropped += 1
+        elif expected is False and sent:
+            unexpected += 1
+        latencies.extend(
+            at - entry["ended"] for status, at in sent if status != "Timeout"
+        )
+    latencies.sort()
+    return {
+        "records": len(records),
+        "registrations": len(registrations),
+        "elapsed": elapsed,
+        "notifications": len(extension.deliveries),
+        "latency": {
+            name: _percentile(latencies, q) if latencies else None
+            for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("max", 1))
+        },
+        "dropped": dropped,
+        "duplicated": duplicated,
+        "unexpected": unexpected,
+        "registry": registry,
+    }
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(
+        f"{report['records']} records, {report['registrations']} registrations "
+        f"replayed in {report['elapsed']:.2f}s"
+    )
+    print(f"notifications sent: {report['notifications']}")
+    latency = report["latency"]
+    if latency["p50"] is not None:
+        print(
+            "dispatch latency ms: "
+            + ", ".join(f"{name} {value * 1000:.1f}" for name, value in latency.items())
+        )
+    print(
+        f"dropped: {report['dropped']}, duplicated: {report['duplicated']}, "
+        f"unexpected: {report['unexpected']}"
+    )
+    print(f"{'trace s':>10}{'cells':>8}{'runs':>8}{'timers':>8}")
+    for row in report["registry"]:
+        print(f"{row['t']:>10.1f}{row['cells']:>8}{row['runs']:>8}{row['timers']:>8}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="jupyter notify-replay", description=__doc__.strip().splitlines()[0]
+    )
+    parser.add_argument("trace", help="JSON lines trace recorded by the server")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Replay speed, e.g. 10 replays 10 times faster than recorded",
+    )
+    parser.add_argument(
+        "--backend-latency",
+        type=float,
+        default=0.0,
+        help="Seconds each stubbed SMTP or Slack call takes",
+    )
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=10,
+        help="Number of samples of the registry size over the replay",
+    )
+    args = parser.parse_args(argv)
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+    records = list(read_trace(args.trace))
+    _print_report(
+        asyncio.run(
+            replay(records, args.speed, args.backend_latency, max(1, args.samples))
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
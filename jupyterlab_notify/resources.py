@@ -0,0 +1,143 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from .scheduler import Scheduler
+
+try:
+    _CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    # Not a POSIX system; /proc is not available either.
+    _CLOCK_TICKS = _PAGE_SIZE = 0
+
+
+def read_process_usage(pid: int) -> Optional[Tuple[float, int]]:
+    """
+    Read the CPU time and resident memory of a process from ``/proc``.
+
+    Returns:
+        Tuple of (user + system CPU seconds, RSS in bytes), or None if the
+        process does not exist or ``/proc`` is not available.
+    """
+    if not _CLOCK_TICKS:
+        return None
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+        with open(f"/proc/{pid}/statm", "rb") as f:
+            statm = f.read()
+    except OSError:
+        return None
+    # The command name may contain spaces; fields are counted after it.
+    fields = stat[stat.rindex(b")") + 2 :].split()
+    cpu = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    rss = int(statm.split()[1]) * _PAGE_SIZE
+    return cpu, rss
+
+
+@dataclass
+class ResourceUsage:
+    """Resources used by a kernel while a cell ran."""
+
+    cpu_seconds: float
+    peak_rss: int
+    wall_time: float
+
+
+class _Watch:
+    __slots__ = ("pid", "cpu_start", "started", "peak_rss")
+
+    def __init__(self, pid: int, cpu_start: float, rss: int) -> None:
+        self.pid = pid
+        self.cpu_start = cpu_start
+        self.started = time.monotonic()
+        self.peak_rss = rss
+
+
+class ResourceSampler:
+    """
+    Track the CPU time and peak RSS of kernels while cells run.
+
+    One periodic task samples every watched kernel process once per
+    ``interval``, however many cells are running, and only while at least
+    one cell is watched. Peak RSS is therefore a sampled peak; short spikes
+    between samples can be missed.
+    """
+
+    def __init__(
+        self,
+        scheduler: Scheduler,
+        interval: float = 1.0,
+        log: Optional[logging.Logger] = None,
+    ) -> None:
+        self.scheduler = scheduler
+        self.interval = interval
+        self.log = log or logging.getLogger(__name__)
+        self._watches: Dict[str, _Watch] = {}
+        self._lock = threading.Lock()
+        self._sampling = False
+
+    def __len__(self) -> int:
+        return len(self._watches)
+
+    def start(self, key: str, pid: int) -> bool:
+        """
+        Start tracking the kernel process ``pid`` on behalf of ``key``.
+
+        Returns:
+            Whether the process could be read.
+        """
+        usage = read_process_usage(pid)
+        if usage is None:
+            return False
+        with self._lock:
+            self._watches[key] = _Watch(pid, *usage)
+            if not self._sampling:
+                try:
+                    self.scheduler.call_later(self.interval, self._sample)
+                    self._sampling = True
+                except RuntimeError:
+                    # Scheduler stopped; the CPU time is still measured at the end.
+                    pass
+        return True
+
+    def stop(self, key: str) -> Optional[ResourceUsage]:
+        """Stop tracking ``key`` and return what the kernel used meanwhile."""
+        with self._lock:
+            watch = self._watches.pop(key, None)
+        if watch is None:
+            return None
+        wall_time = time.monotonic() - watch.started
+        usage = read_process_usage(watch.pid)
+        if usage is None:
+            # The kernel exited; report what was sampled.
+            return ResourceUsage(0.0, watch.peak_rss, wall_time)
+        cpu, rss = usage
+        return ResourceUsage(
+            max(0.0, cpu - watch.cpu_start), max(rss, watch.peak_rss), wall_time
+        )
+
+    def _sample(self) -> None:
+        with self._lock:
+            pids = {watch.pid for watch in self._watches.values()}
+        samples = {pid: read_process_usage(pid) for pid in pids}
+        with self._lock:
+            for key, watch in list(self._watches.items()):
+                usage = samples.get(watch.pid)
+                if usage is None:
+                    # The kernel is gone, its cells will not report an end.
+                    del self._watches[key]
+                elif usage[1] > watch.peak_rss:
+                    watch.peak_rss = usage[1]
+            if not self._watches:
+                self._sampling = False
+                return
+        try:
+            self.scheduler.call_later(self.interval, self._sample)
+        except RuntimeError:
+            # Scheduler stopped, the server is shutting down.
+            pass
@@ -0,0 +1,193 @@
+import re
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Pattern,
+    Tuple,
+)
+
+_WILDCARDS = re.compile(r"[*?]")
+_STATUSES = frozenset({"success", "failed", "timeout", "running", "regression"})
+
+
+class RoutingRuleError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Route:
+    """Destinations of the notifications matched by a rule."""
+
+    slack_channel: Optional[str] = None
+    slack_user_id: Optional[str] = None
+    email: Optional[str] = None
+
+    @property
+    def slack(self) -> bool:
+        return bool(self.slack_channel or self.slack_user_id)
+
+
+def glob_to_regex(pattern: str) -> Pattern[str]:
+    """
+    Compile a path glob: ``*`` and ``?`` match within a path segment, ``**``
+    matches any number of segments.
+    """
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return re.compile("".join(parts) + r"\Z")
+
+
+def _names(value: Any, field: str) -> Optional[FrozenSet[str]]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, (list, tuple)) or not all(
+        isinstance(item, str) for item in value
+    ):
+        raise RoutingRuleError(f"{field} must be a string or a list of strings")
+    return frozenset(value)
+
+
+class _Rule:
+    __slots__ = ("index", "pattern", "statuses", "users", "route")
+
+    def __init__(self, index: int, rule: Mapping[str, Any]) -> None:
+        unknown = set(rule) - {
+            "notebook",
+            "status",
+            "user",
+            "slack_channel",
+            "slack_user_id",
+            "email",
+        }
+        if unknown:
+            raise RoutingRuleError(f"unknown keys {', '.join(sorted(unknown))}")
+        notebook = rule.get("notebook", "**")
+        if not isinstance(notebook, str):
+            raise RoutingRuleError("notebook must be a path glob")
+        self.index = index
+        self.pattern = glob_to_regex(notebook.lstrip("/"))
+        statuses = _names(rule.get("status"), "status")
+        if statuses is not None:
+            statuses = frozenset(status.lower() for status in statuses)
+            if not statuses <= _STATUSES:
+                raise RoutingRuleError(
+                    f"unknown status {', '.join(sorted(statuses - _STATUSES))}"
+                )
+        self.statuses = statuses
+        self.users = _names(rule.get("user"), "user")
+        self.route = Route(
+            slack_channel=rule.get("slack_channel") or None,
+            slack_user_id=rule.get("slack_user_id") or None,
+            email=rule.get("email") or None,
+        )
+        if not (self.route.slack or self.route.email):
+            raise RoutingRuleError(
+                "a rule needs a slack_channel, slack_user_id or email destination"
+            )
+
+    def keys(self) -> List[Tuple[Optional[str], Optional[str]]]:
+        """The (status, user) buckets of the rule, None matching any."""
+        statuses = sorted(self.statuses) if self.statuses is not None else [None]
+        users = sorted(self.users) if self.users is not None else [None]
+        return [(status, user) for status in statuses for user in users]
+
+
+class _Node:
+    __slots__ = ("children", "buckets")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_Node"] = {}
+        # Rules by (status, user), each list in configuration order.
+        self.buckets: Dict[Tuple[Optional[str], Optional[str]], List[_Rule]] = {}
+
+
+class Router:
+    """
+    Routing rules compiled into a trie of their literal leading path segments.
+
+    A rule such as ``projects/etl/**`` is stored under ``projects`` →
+    ``etl``, so routing a notebook only tests the rules whose literal prefix
+    it shares. Within a node, rules are indexed by the statuses and users
+    they name, with None for any: rules without a literal prefix, e.g.
+    status or user rules, are only tested for the notifications of their
+    status and user. Routing costs one lookup per path segment and four per
+    node, then a pattern match per rule of those buckets until one matches;
+    only rules of a node whose globs overlap are tested one after the other.
+    The first matching rule, in configuration order, wins.
+    """
+
+    def __init__(self, rules: Iterable[Mapping[str, Any]]) -> None:
+        self._root = _Node()
+        self._count = 0
+        for index, rule in enumerate(rules):
+            if not isinstance(rule, Mapping):
+                raise RoutingRuleError(f"routing rule {index} is not a mapping")
+            try:
+                compiled = _Rule(index, rule)
+            except RoutingRuleError as exc:
+                raise RoutingRuleError(f"routing rule {index}: {exc}") from None
+            node = self._root
+            segments = rule.get("notebook", "**").lstrip("/").split("/")
+            # The last segment names the file; it stays in the pattern.
+            for segment in segments[:-1]:
+                if _WILDCARDS.search(segment):
+                    break
+                node = node.children.setdefault(segment, _Node())
+            for key in compiled.keys():
+                node.buckets.setdefault(key, []).append(compiled)
+            self._count += 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def route(
+        self, path: str, status: str, user: Optional[str] = None
+    ) -> Optional[Route]:
+        """Destinations of a notification, None if no rule matches."""
+        path = path.lstrip("/")
+        status = status.lower()
+        best: Optional[_Rule] = None
+        node: Optional[_Node] = self._root
+        segments = path.split("/")[:-1]
+        keys = [(status, user), (status, None), (None, user), (None, None)]
+        if user is None:
+            keys = keys[1::2]
+        depth = 0
+        while node is not None:
+            for key in keys:
+                for rule in node.buckets.get(key, ()):
+                    if best is not None and rule.index > best.index:
+                        # Rules of a bucket are kept in configuration order.
+                        break
+                    if rule.pattern.match(path) is not None:
+                        best = rule
+                        break
+            if depth == len(segments):
+                break
+            node = node.children.get(segments[depth])
+            depth += 1
+        return best.route if best is not None else None
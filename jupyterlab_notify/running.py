@@ -0,0 +1,149 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# Sort key of a running cell: start time, then cell id for equal starts.
+Key = Tuple[float, str]
+
+
+@dataclass(frozen=True)
+class RunningCell:
+    cell_id: str
+    started: float
+    notebook: str
+    user: Optional[str] = None
+    mode: Optional[str] = None
+
+    @property
+    def key(self) -> Key:
+        return (self.started, self.cell_id)
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "cell_id": self.cell_id,
+            "notebook": self.notebook,
+            "user": self.user,
+            "mode": self.mode,
+            "started": self.started,
+            "elapsed": round(max(0.0, now - self.started), 3),
+        }
+
+
+def format_cursor(key: Key) -> str:
+    return f"{key[0]!r}:{key[1]}"
+
+
+def parse_cursor(cursor: str) -> Key:
+    started, _, cell_id = cursor.partition(":")
+    return (float(started), cell_id)
+
+
+class RunningIndex:
+    """
+    Tracked cells currently executing, sorted by start time.
+
+    The cells are kept in a list sorted by start, and in one such list per
+    user and per notebook, so the longest running cells, overall or of a
+    user or notebook, are read as a slice from the start of a list: a page
+    of ``k`` cells costs O(log n + k), whatever the number running. Starts
+    and ends update the lists by bisection.
+    """
+
+    def __init__(self) -> None:
+        self._cells: Dict[str, RunningCell] = {}
+        self._order: List[Key] = []
+        self._by_user: Dict[str, List[Key]] = {}
+        self._by_notebook: Dict[str, List[Key]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def __contains__(self, cell_id: str) -> bool:
+        return cell_id in self._cells
+
+    def start(self, cell: RunningCell) -> None:
+        """Add a cell that started executing, replacing a previous start."""
+        with self._lock:
+            self._remove(cell.cell_id)
+            self._cells[cell.cell_id] = cell
+            for keys in self._lists(cell, create=True):
+                insort(keys, cell.key)
+
+    def finish(self, cell_id: str) -> Optional[RunningCell]:
+        """Remove a cell that ended; returns it if it was running."""
+        with self._lock:
+            return self._remove(cell_id)
+
+    def longest(
+        self,
+        limit: int,
+        user: Optional[str] = None,
+        notebook: Optional[str] = None,
+        after: Optional[Key] = None,
+    ) -> Tuple[List[RunningCell], Optional[Key], int]:
+        """
+        Return the longest running cells, oldest start first.
+
+        Args:
+            limit: Maximum number of cells returned.
+            user: Only cells of this user.
+            notebook: Only cells of this notebook.
+            after: Key of the last cell of the previous page.
+
+        Returns:
+            Tuple of (cells, key to pass as ``after`` for the next page or
+            None on the last page, number of matching cells).
+        """
+        with self._lock:
+            if user is not None and notebook is not None:
+                # Walk the shorter list, filtering on the other attribute.
+                by_user = self._by_user.get(user, [])
+                by_notebook = self._by_notebook.get(notebook, [])
+                keys = by_user if len(by_user) <= len(by_notebook) else by_notebook
+                keys = [
+                    key
+                    for key in keys
+                    if self._cells[key[1]].user == user
+                    and self._cells[key[1]].notebook == notebook
+                ]
+            elif user is not None:
+                keys = self._by_user.get(user, [])
+            elif notebook is not None:
+                keys = self._by_notebook.get(notebook, [])
+            else:
+                keys = self._order
+            start = bisect_right(keys, after) if after is not None else 0
+            page = keys[start : start + limit]
+            cells = [self._cells[cell_id] for _, cell_id in page]
+            more = start + limit < len(keys)
+            return cells, (page[-1] if more and page else None), len(keys)
+
+    def _lists(self, cell: RunningCell, create: bool = False) -> List[List[Key]]:
+        lists = [self._order]
+        for index, value in (
+            (self._by_user, cell.user),
+            (self._by_notebook, cell.notebook),
+        ):
+            if value is None:
+                continue
+            keys = index.setdefault(value, []) if create else index.get(value)
+            if keys is not None:
+                lists.append(keys)
+        return lists
+
+    def _remove(self, cell_id: str) -> Optional[RunningCell]:
+        cell = self._cells.pop(cell_id, None)
+        if cell is None:
+            return None
+        for keys in self._lists(cell):
+            position = bisect_left(keys, cell.key)
+            if position < len(keys) and keys[position] == cell.key:
+                del keys[position]
+        # Drop emptied secondary lists, users and notebooks come and go.
+        if cell.user is not None and not self._by_user.get(cell.user, True):
+            del self._by_user[cell.user]
+        if not self._by_notebook.get(cell.notebook, True):
+            del self._by_notebook[cell.notebook]
+        return cell
@@ -0,0 +1,119 @@
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .config import NotificationParams
+
+
+class TrackedRun:
+    """Counters of a notebook run registered as a whole."""
+
+    __slots__ = ("params", "cells", "total", "outstanding", "done", "failed_cell")
+
+    def __init__(self, params: NotificationParams, cells: Tuple[str, ...]) -> None:
+        self.params = params
+        # Only used to clean up the index when the run ends early.
+        self.cells = cells
+        self.total = len(cells)
+        self.outstanding = self.total
+        self.done = 0
+        self.failed_cell: Optional[str] = None
+
+    @property
+    def complete(self) -> bool:
+        # Execution stops at the first error, the remaining cells never end.
+        return self.outstanding == 0 or self.failed_cell is not None
+
+
+class RunTracker:
+    """
+    Index of the cells of registered notebook runs.
+
+    Each cell id maps to its run, so an ``execution_end`` event costs one
+    dict lookup and a counter update, whatever the size of the run. A cell
+    belongs to the latest run it was registered in; registering it again
+    takes it out of its previous run, and ``on_emptied`` is called with a
+    run once all of its remaining cells were taken this way.
+    """
+
+    def __init__(
+        self, on_emptied: Optional[Callable[[TrackedRun], None]] = None
+    ) -> None:
+        self._cells: Dict[str, TrackedRun] = {}
+        self._runs: Dict[str, TrackedRun] = {}
+        self._on_emptied = on_emptied
+
+    def __contains__(self, cell_id: object) -> bool:
+        return cell_id in self._cells
+
+    def __len__(self) -> int:
+        return len(self._runs)
+
+    def register(
+        self, params: NotificationParams, cell_ids: Iterable[str]
+    ) -> TrackedRun:
+        """Start tracking a run of ``cell_ids``, identified by ``params.cell_id``."""
+        self.discard(params.cell_id)
+        cells = tuple(dict.fromkeys(cell_ids))
+        for cell_id in cells:
+            previous = self._cells.get(cell_id)
+            if previous is not None:
+                self._remove_cell(previous)
+        run = self._runs[params.cell_id] = TrackedRun(params, cells)
+        self._cells.update(dict.fromkeys(cells, run))
+        return run
+
+    def get(self, run_id: str) -> Optional[TrackedRun]:
+        return self._runs.get(run_id)
+
+    def run_of(self, cell_id: str) -> Optional[TrackedRun]:
+        return self._cells.get(cell_id)
+
+    def cell_finished(self, cell_id: str, success: bool) -> Optional[TrackedRun]:
+        """
+        Count a finished cell.
+
+        Returns:
+            The run if this cell completed it, after which it is no longer
+            tracked.
+        """
+        run = self._cells.pop(cell_id, None)
+        if run is None:
+            return None
+        run.outstanding -= 1
+        if success:
+            run.done += 1
+        elif run.failed_cell is None:
+            run.failed_cell = cell_id
+        if not run.complete:
+            return None
+        self.discard(run.params.cell_id)
+        return run
+
+    def discard(self, run_id: str) -> Optional[TrackedRun]:
+        """Stop tracking a run and its remaining cells."""
+        run = self._runs.pop(run_id, None)
+        if run is not None and run.outstanding:
+            for cell_id in run.cells:
+                if self._cells.get(cell_id) is run:
+                    del self._cells[cell_id]
+        return run
+
+    def expire(self, cutoff: float) -> List[TrackedRun]:
+        """Stop tracking the runs registered before ``cutoff`` that never started."""
+        expired = [
+            run
+            for run in self._runs.values()
+            if run.params.start_time is None
+            and run.params.registered_at is not None
+            and run.params.registered_at < cutoff
+        ]
+        for run in expired:
+            self.discard(run.params.cell_id)
+        return expired
+
+    def _remove_cell(self, run: TrackedRun) -> None:
+        run.outstanding -= 1
+        if run.outstanding == 0 and self._runs.get(run.params.cell_id) is run:
+            # All of its cells moved to later runs.
+            del self._runs[run.params.cell_id]
+            if self._on_emptied is not None:
+                self._on_emptied(run)
@@ -0,0 +1,175 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, List, Optional, Tuple
+
+_PENDING = 0
+_RUNNING = 1
+_DONE = 2
+_CANCELLED = 3
+
+
+class ScheduledCall:
+    """
+    Handle for a callback registered with a ``Scheduler``.
+
+    Mirrors the parts of ``threading.Timer`` used by the extension:
+    ``cancel()`` and ``is_alive()``, the latter staying true while the
+    callback runs.
+    """
+
+    __slots__ = ("deadline", "callback", "args", "priority", "_state", "_scheduler")
+
+    def __init__(
+        self,
+        scheduler: "Scheduler",
+        deadline: float,
+        callback: Callable[..., Any],
+        args: Tuple[Any, ...],
+        priority: Optional[int] = None,
+    ) -> None:
+        self._scheduler = scheduler
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.priority = priority
+        self._state = _PENDING
+
+    def cancel(self) -> None:
+        """Cancel the call if it has not started yet; O(1)."""
+        self._scheduler._cancel(self)
+
+    def is_alive(self) -> bool:
+        return self._state in (_PENDING, _RUNNING)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._state == _CANCELLED
+
+    def _run(self, log: logging.Logger) -> None:
+        try:
+            self.callback(*self.args)
+        except Exception:
+            log.exception("Scheduled callback %r failed", self.callback)
+        finally:
+            self._state = _DONE
+
+
+class Scheduler:
+    """
+    A single thread driving every delayed callback of the extension.
+
+    Calls are kept in a heap ordered by deadline. Cancellation only flags the
+    entry and the heap is compacted once cancelled entries dominate it. Due
+    callbacks run on ``executor`` when one is given, so a slow callback does
+    not delay the others; a call given a ``priority`` is submitted in that
+    class when the executor is a ``PriorityDispatcher``.
+    """
+
+    def __init__(
+        self,
+        executor: Optional[Executor] = None,
+        log: Optional[logging.Logger] = None,
+    ) -> None:
+        self.executor = executor
+        self.log = log or logging.getLogger(__name__)
+        self._heap: List[Tuple[float, int, ScheduledCall]] = []
+        self._counter = itertools.count()
+        self._cancelled = 0
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def __len__(self) -> int:
+        """Number of pending (not cancelled) calls."""
+        with self._condition:
+            return len(self._heap) - self._cancelled
+
+    def call_later(
+        self,
+        delay: float,
+        callback: Callable[..., Any],
+        *args: Any,
+        priority: Optional[int] = None,
+    ) -> ScheduledCall:
+        """Run ``callback(*args)`` after ``delay`` seconds."""
+        call = ScheduledCall(
+            self, time.monotonic() + max(0.0, delay), callback, args, priority
+        )
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("Scheduler has been stopped")
+            heapq.heappush(self._heap, (call.deadline, next(self._counter), call))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="notify-scheduler", daemon=True
+                )
+                self._thread.start()
+            elif self._heap[0][2] is call:
+                self._condition.notify()
+        return call
+
+    def stop(self) -> List[ScheduledCall]:
+        """Stop the scheduler thread and cancel every pending call.
+
+        Returns:
+            The calls that were cancelled.
+        """
+        with self._condition:
+            self._stopped = True
+            pending = [call for _, _, call in self._heap if not call.cancelled]
+            for call in pending:
+                call._state = _CANCELLED
+            self._heap.clear()
+            self._cancelled = 0
+            self._condition.notify()
+        return pending
+
+    def _cancel(self, call: ScheduledCall) -> None:
+        with self._condition:
+            if call._state != _PENDING:
+                return
+            call._state = _CANCELLED
+            self._cancelled += 1
+            if self._cancelled > 64 and self._cancelled * 2 > len(self._heap):
+                self._heap = [e for e in self._heap if not e[2].cancelled]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    while self._heap and self._heap[0][2].cancelled:
+                        heapq.heappop(self._heap)
+                        self._cancelled -= 1
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    timeout = self._heap[0][0] - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._condition.wait(timeout)
+                if self._stopped:
+                    return
+                _, _, call = heapq.heappop(self._heap)
+                call._state = _RUNNING
+
+            if self.executor is None:
+                call._run(self.log)
+            else:
+                try:
+                    if call.priority is not None and hasattr(
+                        self.executor, "submit_with_priority"
+                    ):
+                        self.executor.submit_with_priority(
+                            call.priority, call._run, self.log
+                        )
+                    else:
+                        self.executor.submit(call._run, self.log)
+                except RuntimeError:
+                    # Executor shut down; run inline rather than dropping the call.
+                    call._run(self.log)
@@ -0,0 +1,147 @@
+import email
+import http.client
+import json
+import os
+import socket
+from email.message import EmailMessage
+from email.policy import default as default_policy
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+MAIL_PATH = "api/jupyter-notify/mail"
+
+# Answers meaning the server will not take mails at all: no extension, or
+# a token not accepted. Other failures may be temporary.
+_REFUSED = (
+    http.client.NOT_FOUND,
+    http.client.UNAUTHORIZED,
+    http.client.FORBIDDEN,
+)
+
+
+def _connection_file() -> Optional[str]:
+    """Connection file of the running kernel, None outside of a kernel."""
+    try:
+        from ipykernel.connect import get_connection_file
+
+        return get_connection_file()
+    except (ImportError, RuntimeError, OSError):
+        return None
+
+
+def find_server(
+    connection_file: Optional[str] = None, pid: Optional[int] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Find the Jupyter server that started this kernel.
+
+    The server writes its URL, token and Unix socket to ``jpserver-<pid>.json``
+    in the runtime directory, where kernel connection files are written
+    too; the file of the kernel's parent process is looked up next to the
+    connection file of the kernel, then in the default runtime directory.
+
+    Returns:
+        The server info, or None if the kernel was not started by a server.
+    """
+    pid = os.getppid() if pid is None else pid
+    connection_file = connection_file or _connection_file()
+    directories: List[str] = []
+    if connection_file:
+        directories.append(os.path.dirname(os.path.abspath(connection_file)))
+    try:
+        from jupyter_core.paths import jupyter_runtime_dir
+
+        directories.append(jupyter_runtime_dir())
+    except ImportError:
+        pass
+
+    for directory in directories:
+        try:
+            with open(os.path.join(directory, f"jpserver-{pid}.json")) as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if isinstance(info, dict) and info.get("pid") == pid and info.get("url"):
+            return info
+    return None
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class ServerMail:
+    """
+    Hand mails of a kernel to the notification extension of its server.
+
+    The server queues them on its notification workers and sends them
+    through its own SMTP session, so kernels do not each keep a connection
+    to the mail relay. The server addresses the mails to the user of the
+    kernel, so their sender and recipients are not sent. ``send`` returns
+    False when the server cannot take a mail, for the caller to send it
+    itself; once the server refused mails, e.g. because the extension is not
+    enabled, it is not asked again.
+    """
+
+    def __init__(self, info: Dict[str, Any], timeout: float = 10.0) -> None:
+        self.info = info
+        self.timeout = timeout
+        self.refused = False
+        base_url = info.get("base_url") or "/"
+        self.path = f"{base_url.rstrip('/')}/{MAIL_PATH}"
+
+    @classmethod
+    def discover(cls, timeout: float = 10.0) -> Optional["ServerMail"]:
+        info = find_server()
+        return cls(info, timeout) if info is not None else None
+
+    def send(self, message: EmailMessage, success: bool = True) -> bool:
+        """Queue a mail on the server; False if it was not accepted."""
+        if self.refused:
+            return False
+        status = "success" if success else "failure"
+        headers = {"Content-Type": "message/rfc822"}
+        if self.info.get("token"):
+            headers["Authorization"] = f"token {self.info['token']}"
+        mail = email.message_from_bytes(message.as_bytes(), policy=default_policy)
+        for header in ("From", "To", "Cc", "Bcc"):
+            del mail[header]
+        connection = self._connect()
+        try:
+            connection.request(
+                "POST",
+                f"{self.path}?status={status}",
+                body=mail.as_bytes(),
+                headers=headers,
+            )
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            return False
+        finally:
+            connection.close()
+        if response.status in _REFUSED:
+            self.refused = True
+        return response.status == http.client.ACCEPTED
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.info.get("sock"):
+            return _UnixHTTPConnection(self.info["sock"], self.timeout)
+        url = urlsplit(self.info["url"])
+        if url.scheme == "https":
+            return http.client.HTTPSConnection(
+                url.hostname, url.port, timeout=self.timeout
+            )
+        return http.client.HTTPConnection(url.hostname, url.port, timeout=self.timeout)
@@ -0,0 +1,235 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class P2Quantile:
+    """
+    Streaming estimate of a single quantile with the P² algorithm.
+
+    Keeps five markers whatever the number of observations (Jain & Chlamtac,
+    "The P² algorithm for dynamic calculation of quantiles and histograms
+    without storing observations", 1985).
+    """
+
+    __slots__ = ("p", "count", "heights", "positions", "desired")
+
+    def __init__(self, p: float) -> None:
+        self.p = p
+        self.count = 0
+        self.heights: List[float] = []
+        self.positions = [1.0, 2.0, 3.0, 4.0, 5.0]
+        self.desired = [1.0, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5.0]
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        heights = self.heights
+        if self.count <= 5:
+            heights.append(x)
+            heights.sort()
+            return
+
+        if x < heights[0]:
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = bisect_right(heights, x) - 1
+
+        positions = self.positions
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        p = self.p
+        for i, increment in enumerate((0.0, p / 2, p, (1 + p) / 2, 1.0)):
+            self.desired[i] += increment
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (
+                d <= -1 and positions[i - 1] - positions[i] < -1
+            ):
+                step = 1 if d > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = self._linear(i, step)
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i: int, d: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def _linear(self, i: int, d: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+
+    def value(self) -> Optional[float]:
+        """Current estimate, or None without observations."""
+        if not self.count:
+            return None
+        if self.count <= 5:
+            # Too few samples for the markers; use the nearest rank.
+            return self.heights[round(self.p * (self.count - 1))]
+        return self.heights[2]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "heights": list(self.heights),
+            "positions": list(self.positions),
+            "desired": list(self.desired),
+        }
+
+    @classmethod
+    def from_dict(cls, p: float, data: Dict[str, Any]) -> "P2Quantile":
+        sketch = cls(p)
+        sketch.count = int(data["count"])
+        sketch.heights = [float(h) for h in data["heights"]]
+        if sketch.count > 5:
+            sketch.positions = [float(n) for n in data["positions"]]
+            sketch.desired = [float(n) for n in data["desired"]]
+        return sketch
+
+
+class DurationStats:
+    """Run time summary of one cell: sample count, EWMA and a quantile sketch."""
+
+    __slots__ = ("count", "ewma", "quantile")
+
+    def __init__(self, quantile: P2Quantile) -> None:
+        self.count = 0
+        self.ewma: Optional[float] = None
+        self.quantile = quantile
+
+    def add(self, duration: float, alpha: float) -> None:
+        self.count += 1
+        self.ewma = (
+            duration
+            if self.ewma is None
+            else alpha * duration + (1 - alpha) * self.ewma
+        )
+        self.quantile.add(duration)
+
+
+class DurationHistory:
+    """
+    Per-cell execution time statistics keyed by notebook path and cell id.
+
+    Each cell costs a fixed amount of memory, and at most ``max_cells`` cells
+    are kept, least recently run first out. When ``path`` is set the
+    statistics are loaded from and saved to that JSON file.
+    """
+
+    def __init__(
+        self,
+        path: str = "",
+        quantile: float = 0.95,
+        alpha: float = 0.2,
+        max_cells: int = 10_000,
+        log: Optional[logging.Logger] = None,
+    ) -> None:
+        self.path = os.path.expanduser(path) if path else ""
+        self.quantile = quantile
+        self.alpha = alpha
+        self.max_cells = max_cells
+        self.log = log or logging.getLogger(__name__)
+        self._cells: "OrderedDict[Tuple[str, str], DurationStats]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        if self.path:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def get(self, notebook: str, cell_id: str) -> Optional[DurationStats]:
+        return self._cells.get((notebook, cell_id))
+
+    def add(self, notebook: str, cell_id: str, duration: float) -> DurationStats:
+        """Record one run of a cell."""
+        key = (notebook, cell_id)
+        with self._lock:
+            stats = self._cells.get(key)
+            if stats is None:
+                stats = self._cells[key] = DurationStats(P2Quantile(self.quantile))
+                if len(self._cells) > self.max_cells:
+                    self._cells.popitem(last=False)
+            else:
+                self._cells.move_to_end(key)
+            stats.add(duration, self.alpha)
+            self._dirty = True
+        return stats
+
+    def load(self) -> None:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as exc:
+            self.log.error(f"Failed to load cell duration history: {exc}")
+            return
+
+        cells: "OrderedDict[Tuple[str, str], DurationStats]" = OrderedDict()
+        for entry in data.get("cells", []):
+            try:
+                stats = DurationStats(
+                    P2Quantile.from_dict(self.quantile, entry["quantile"])
+                )
+                stats.count = int(entry["count"])
+                stats.ewma = entry["ewma"]
+                cells[(entry["notebook"], entry["cell_id"])] = stats
+            except (KeyError, TypeError, ValueError):
+                continue
+        while len(cells) > self.max_cells:
+            cells.popitem(last=False)
+        with self._lock:
+            self._cells = cells
+
+    def save(self) -> bool:
+        """
+        Write the statistics to ``path`` if they changed since the last save.
+
+        Returns:
+            Whether the file was written.
+        """
+        if not self.path:
+            return False
+        with self._lock:
+            if not self._dirty:
+                return False
+            cells = [
+                {
+                    "notebook": notebook,
+                    "cell_id": cell_id,
+                    "count": stats.count,
+                    "ewma": stats.ewma,
+                    "quantile": stats.quantile.to_dict(),
+                }
+                for (notebook, cell_id), stats in self._cells.items()
+            ]
+            self._dirty = False
+
+        directory = os.path.dirname(self.path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"version": 1, "cells": cells}, f)
+            # Atomic on POSIX and Windows; readers never see a partial file.
+            os.replace(tmp_path, self.path)
+        except OSError as exc:
+            self.log.error(f"Failed to save cell duration history: {exc}")
+            self._dirty = True
+            return False
+        return True
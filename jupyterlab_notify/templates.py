@@ -0,0 +1,221 @@
+import html
+import json
+from string import Template
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+# Message formats: plain text, used by the history, Slack mrkdwn text and
+# Block Kit blocks, the plain text and HTML parts of emails.
+FORMATS = ("text", "slack", "slack_blocks", "email", "email_html")
+
+# Formats rendering with another one's template when they have none.
+_FALLBACKS = {"slack": "text", "email": "text"}
+
+DEFAULT_TEXT = (
+    "${notebook_line}Execution Status: ${status}\n"
+    "${cell_info}\n"
+    "Details: ${message}${resources_line}"
+)
+
+FIELDS = frozenset(
+    {
+        "notebook",
+        "notebook_line",
+        "notebook_path",
+        "cell_id",
+        "cell_info",
+        "execution_count",
+        "mode",
+        "user",
+        "status",
+        "message",
+        "error",
+        "duration",
+        "resources",
+        "resources_line",
+    }
+)
+
+
+class TemplateError(ValueError):
+    pass
+
+
+def _escape_slack(value: str) -> str:
+    # The only characters with a meaning in mrkdwn text.
+    return value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _escape_json(value: str) -> str:
+    return json.dumps(_escape_slack(value))[1:-1]
+
+
+_ESCAPES: Dict[str, Optional[Callable[[str], str]]] = {
+    "text": None,
+    "slack": _escape_slack,
+    "slack_blocks": _escape_json,
+    "email": None,
+    "email_html": html.escape,
+}
+
+
+class CompiledTemplate:
+    """
+    A ``string.Template`` split once into its literal text and fields.
+
+    Rendering fills the field slots of a copy of the parts and joins them,
+    with no parsing or intermediate strings; field values are escaped for
+    the format of the template.
+    """
+
+    __slots__ = ("source", "escape", "_parts", "_fields")
+
+    def __init__(
+        self, source: str, escape: Optional[Callable[[str], str]] = None
+    ) -> None:
+        self.source = source
+        self.escape = escape
+        parts: List[str] = []
+        slots: List[Tuple[int, str]] = []
+        position = 0
+        for match in Template.pattern.finditer(source):
+            parts.append(source[position : match.start()])
+            position = match.end()
+            if match.group("escaped") is not None:
+                parts.append("$")
+                continue
+            name = match.group("named") or match.group("braced")
+            if name is None:
+                raise TemplateError(f"invalid placeholder at offset {match.start()}")
+            if name not in FIELDS:
+                raise TemplateError(f"unknown field ${name}")
+            slots.append((len(parts), name))
+            parts.append("")
+        parts.append(source[position:])
+        self._parts = parts
+        self._fields = slots
+
+    @property
+    def fields(self) -> List[str]:
+        return [name for _, name in self._fields]
+
+    def render(self, values: Mapping[str, str]) -> str:
+        parts = self._parts.copy()
+        escape = self.escape
+        for index, name in self._fields:
+            value = values[name]
+            parts[index] = escape(value) if escape is not None else value
+        return "".join(parts)
+
+
+class MessageFields(dict):
+    """
+    Field values of one notification, computed on first use.
+
+    ``providers`` maps field names to callables returning their value; a
+    value is computed once, however many templates use it.
+    """
+
+    def __init__(self, providers: Mapping[str, Callable[[], Any]]) -> None:
+        super().__init__()
+        self._providers = providers
+
+    def __missing__(self, name: str) -> str:
+        provider = self._providers.get(name)
+        value = provider() if provider is not None else None
+        value = self[name] = "" if value is None else str(value)
+        return value
+
+
+class TemplateSet:
+    """
+    Message templates compiled at configuration load.
+
+    Keys are ``format``, ``format:mode`` or ``format:mode:status``, where
+    ``*`` matches any mode or status. The most specific template wins:
+    mode and status, mode, status, then the format alone.
+    """
+
+    def __init__(self, templates: Optional[Mapping[str, str]] = None) -> None:
+        self._templates: Dict[Tuple[str, str, str], CompiledTemplate] = {
+            ("text", "*", "*"): CompiledTemplate(DEFAULT_TEXT),
+        }
+        for key, source in (templates or {}).items():
+            if not isinstance(source, str):
+                raise TemplateError(f"template {key}: not a string")
+            fmt, mode, status = (key.split(":") + ["*", "*"])[:3]
+            if fmt not in FORMATS or key.count(":") > 2:
+                raise TemplateError(
+                    f"template {key}: expected format[:mode[:status]] with a "
+                    f"format among {', '.join(FORMATS)}"
+                )
+            try:
+                template = CompiledTemplate(source, _ESCAPES[fmt])
+                if fmt == "slack_blocks":
+                    _check_blocks(template)
+            except TemplateError as exc:
+                raise TemplateError(f"template {key}: {exc}") from None
+            self._templates[(fmt, mode or "*", status.lower() or "*")] = template
+
+    def lookup(self, fmt: str, mode: str, status: str) -> Optional[CompiledTemplate]:
+        status = status.lower()
+        templates = self._templates
+        for key in ((fmt, mode, status), (fmt, mode, "*"), (fmt, "*", status)):
+            template = templates.get(key)
+            if template is not None:
+                return template
+        template = templates.get((fmt, "*", "*"))
+        if template is None and fmt in _FALLBACKS:
+            return self.lookup(_FALLBACKS[fmt], mode, status)
+        return template
+
+    def message(
+        self, mode: str, status: str, fields: MessageFields
+    ) -> "RenderedMessage":
+        return RenderedMessage(self, mode, status, fields)
+
+
+def _check_blocks(template: CompiledTemplate) -> None:
+    """Render with placeholder values and check the result is a block list."""
+    sample = {name: f'"{name}" <&>\n' for name in FIELDS}
+    try:
+        blocks = json.loads(template.render(sample))
+    except ValueError as exc:
+        raise TemplateError(f"not a JSON list of blocks: {exc}") from None
+    if not isinstance(blocks, list):
+        raise TemplateError("not a JSON list of blocks")
+
+
+class RenderedMessage:
+    """
+    The messages of one notification in every format, rendered on demand.
+
+    Each template is rendered at most once, so sending to several
+    destinations, or falling back from ``slack`` to ``text``, reuses the
+    same string.
+    """
+
+    def __init__(
+        self, templates: TemplateSet, mode: str, status: str, fields: MessageFields
+    ) -> None:
+        self.templates = templates
+        self.mode = mode
+        self.status = status
+        self.fields = fields
+        self._rendered: Dict[int, str] = {}
+
+    def render(self, fmt: str) -> Optional[str]:
+        """The message in a format, None if no template applies."""
+        template = self.templates.lookup(fmt, self.mode, self.status)
+        if template is None:
+            return None
+        rendered = self._rendered.get(id(template))
+        if rendered is None:
+            rendered = self._rendered[id(template)] = template.render(self.fields)
+        return rendered
+
+    @property
+    def text(self) -> str:
+        return self.render("text") or ""
+
+    def __str__(self) -> str:
+        return self.text
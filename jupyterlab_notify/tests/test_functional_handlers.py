@@ -1,10 +1,17 @@
 import json
 import logging
+from email.message import EmailMessage
 from unittest.mock import MagicMock
 from tornado.web import Application
 from tornado.testing import AsyncHTTPTestCase
 from jupyter_server.auth import IdentityProvider
 from jupyterlab_notify import handlers
+from jupyterlab_notify.breaker import CircuitBreaker
+from jupyterlab_notify.errors import ErrorStore
+from jupyterlab_notify.health import HealthMonitor
+from jupyterlab_notify.profile import ExecutionProfiler
+from jupyterlab_notify.ratelimit import RateLimiter
+from jupyterlab_notify.running import RunningCell, RunningIndex
 from jupyter_server.base.handlers import JupyterHandler
 
 
@@ -35,13 +42,53 @@ class DummyExtensionApp:
         self.slack_user_id = "U12345678"
         self.slack_channel_name = "general"
         self.cell_ids = {}
+        self.runs = {}
         self._config = DummyConfig()
+        self.config_generation = 0
+        self.config_loaded_at = 0.0
+        self.config_reload_error = None
+        self.health = HealthMonitor({"smtp": lambda: None})
+        self.history = None
+        self.profiler = None
+        self.iopub = None
+        self.breakers = {}
+        self.running = None
+        self.mails = []
+        self.mail_limiter = None
         # Add a dummy logger
         self.log = logging.getLogger("DummyExtensionApp")
         self.log.setLevel(logging.DEBUG)
 
+    def resolve_recipient(self, params, username):
+        params.recipient_email = self.mail_address(username)
+
+    def mail_address(self, username):
+        return f"{username}@example.com" if username else None
+
+    def condense_error(self, params):
+        pass
+
+    def register_cell(self, params):
+        self.cell_ids[params.cell_id] = params
+
+    def register_run(self, params, cell_ids):
+        self.runs[params.cell_id] = (params, cell_ids)
+
     def send_notification(self, params):
         self.notification_sent = True
+        self.sent_params = params
+
+    def trigger_notification(self, params, username, timed_out=False):
+        params.timed_out = timed_out
+        self.resolve_recipient(params, username)
+        self.condense_error(params)
+        self.send_notification(params)
+
+    def queue_mail(self, message, success=True):
+        if not self._config.smtp_instance:
+            return "Email is not configured"
+        self.mails.append((message, success))
+        return None
 
 
 class TestNotifyHandler(AsyncHTTPTestCase):
@@ -66,8 +113,85 @@ class TestNotifyHandler(AsyncHTTPTestCase):
         self.assertEqual(response.code, 200)
         data = json.loads(response.body)
         self.assertTrue(data.get("nbmodel_installed"))
+        self.assertFalse(data.get("iopub_tracking"))
         self.assertTrue(data.get("slack_configured"))
         self.assertTrue(data.get("email_configured"))
+        self.assertTrue(data.get("smtp_server_running"))
+
+    def test_get_reports_cached_health(self):
+        self.dummy_app.health.probes["smtp"] = MagicMock(
+            side_effect=ConnectionRefusedError("Connection refused")
+        )
+        self.dummy_app.health.run()
+        response = self.fetch("/api/jupyter-notify/notify", method="GET")
+        data = json.loads(response.body)
+        self.assertFalse(data.get("smtp_server_running"))
+        self.assertEqual(data["health"]["smtp"]["error"], "Connection refused")
+        self.assertIsNotNone(data["health"]["smtp"]["checked_at"])
+
+    def test_get_reports_circuit_state(self):
+        breaker = CircuitBreaker("slack")
+        self.dummy_app.breakers = {"slack": breaker}
+        response = self.fetch("/api/jupyter-notify/notify", method="GET")
+        etag = response.headers["Etag"]
+        self.assertEqual(
+            json.loads(response.body)["circuit"]["slack"]["state"], "closed"
+        )
+
+        for _ in range(5):
+            breaker.record(False)
+        response = self.fetch(
+            "/api/jupyter-notify/notify",
+            method="GET",
+            headers={"If-None-Match": etag},
+        )
+        self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body)["circuit"]["slack"]["state"], "open")
+
+    def test_get_not_modified(self):
+        response = self.fetch("/api/jupyter-notify/notify", method="GET")
+        etag = response.headers["Etag"]
+        response = self.fetch(
+            "/api/jupyter-notify/notify",
+            method="GET",
+            headers={"If-None-Match": etag},
+        )
+        self.assertEqual(response.code, 304)
+
+        # A change of health state invalidates the tag.
+        self.dummy_app.health.probes["smtp"] = MagicMock(side_effect=OSError("down"))
+        self.dummy_app.health.run()
+        response = self.fetch(
+            "/api/jupyter-notify/notify",
+            method="GET",
+            headers={"If-None-Match": etag},
+        )
+        self.assertEqual(response.code, 200)
+
+    def test_new_health_check_invalidates_the_tag(self):
+        self.dummy_app.health.run()
+        response = self.fetch("/api/jupyter-notify/notify", method="GET")
+        etag = response.headers["Etag"]
+        checked_at = json.loads(response.body)["health"]["smtp"]["checked_at"]
+
+        # Same state, but a new check time and latency.
+        self.dummy_app.health.run()
+        response = self.fetch(
+            "/api/jupyter-notify/notify",
+            method="GET",
+            headers={"If-None-Match": etag},
+        )
+        self.assertEqual(response.code, 200)
+        body = json.loads(response.body)
+        self.assertGreaterEqual(body["health"]["smtp"]["checked_at"], checked_at)
+
+        self.dummy_app.config_reload_error = "invalid JSON"
+        response = self.fetch(
+            "/api/jupyter-notify/notify",
+            method="GET",
+            headers={"If-None-Match": response.headers["Etag"]},
+        )
+        self.assertEqual(response.code, 200)
 
     def test_post_valid(self):
         payload = {
@@ -86,6 +210,51 @@ class TestNotifyHandler(AsyncHTTPTestCase):
         data = json.loads(response.body)
         self.assertTrue(data.get("accepted"))
         self.assertIn("cell42", self.dummy_app.cell_ids)
+        self.assertEqual(
+            self.dummy_app.cell_ids["cell42"].recipient_email, "test-user@example.com"
+        )
+
+
+class TestNotifyRunHandler(AsyncHTTPTestCase):
+    def get_app(self):
+        self.dummy_app = DummyExtensionApp()
+        return Application(
+            [
+                (
+                    r"/api/jupyter-notify/notify-run",
+                    handlers.NotifyRunHandler,
+                    {"extension_app": self.dummy_app, "name": "test"},
+                ),
+            ],
+            identity_provider=DummyIdentityProvider(),
+        )
+
+    def _post(self, payload):
+        return self.fetch(
+            "/api/jupyter-notify/notify-run", method="POST", body=json.dumps(payload)
+        )
+
+    def test_post_run(self):
+        payload = {
+            "cell_ids": ["cell1", "cell2"],
+            "mode": "always",
+            "slackEnabled": True,
+            "emailEnabled": False,
+            "successMessage": "Done",
+            "failureMessage": "Error",
+            "threshold": 0,
+        }
+        response = self._post(payload)
+        self.assertEqual(response.code, 200)
+        run_id = json.loads(response.body)["run_id"]
+        params, cell_ids = self.dummy_app.runs[run_id]
+        self.assertEqual(cell_ids, ["cell1", "cell2"])
+        self.assertEqual(params.mode, "always")
+
+    def test_post_run_requires_cell_ids(self):
+        response = self._post({"cell_ids": [], "mode": "always"})
+        self.assertEqual(response.code, 400)
+        self.assertIn("cell_ids", json.loads(response.body)["error"])
 
 
 class TestNotifyTriggerHandler(AsyncHTTPTestCase):
@@ -127,3 +296,329 @@ class TestNotifyTriggerHandler(AsyncHTTPTestCase):
             hasattr(self.dummy_app, "notification_sent")
             and self.dummy_app.notification_sent
         )
+
+    def test_server_fields_are_ignored(self):
+        payload = {
+            "cell_id": "cell99",
+            "mode": "regression",
+            "slackEnabled": True,
+            "emailEnabled": False,
+            "successMessage": "Ok",
+            "failureMessage": "Not Ok",
+            "threshold": 1,
+            "success": True,
+            "resources": {},
+            "duration": 1000.0,
+            "baseline_p95": 1.0,
+            "baseline_mean": 1.0,
+            "in_live_run": True,
+            "run_total": 3,
+            "run_done": 2,
+            "notification_sent": True,
+            "recipient_email": "attacker@example.com",
+            "user": "someone-else",
+        }
+        response = self.fetch(
+            "/api/jupyter-notify/notify-trigger",
+            method="POST",
+            body=json.dumps(payload),
+        )
+        self.assertEqual(response.code, 200)
+        params = self.dummy_app.sent_params
+        self.assertIsNone(params.resources)
+        self.assertIsNone(params.duration)
+        self.assertIsNone(params.baseline_p95)
+        self.assertIsNone(params.baseline_mean)
+        self.assertFalse(params.in_live_run)
+        self.assertIsNone(params.run_total)
+        self.assertEqual(params.run_done, 0)
+        self.assertFalse(params.notification_sent)
+        self.assertEqual(params.recipient_email, "test-user@example.com")
+        self.assertIsNone(params.user)
+
+    def test_invalid_bodies(self):
+        for body in ("[]", json.dumps({"cell_id": "cell99"})):
+            response = self.fetch(
+                "/api/jupyter-notify/notify-trigger", method="POST", body=body
+            )
+            self.assertEqual(response.code, 400)
+
+
+class TestNotifyHistoryHandler(AsyncHTTPTestCase):
+    def get_app(self):
+        self.dummy_app = DummyExtensionApp()
+        settings = {
+            "identity_provider": DummyIdentityProvider(),
+        }
+        return Application(
+            [
+                (
+                    r"/api/jupyter-notify/history",
+                    handlers.NotifyHistoryHandler,
+                    {"extension_app": self.dummy_app, "name": "test"},
+                ),
+            ],
+            **settings,
+        )
+
+    def test_history_disabled(self):
+        response = self.fetch("/api/jupyter-notify/history", method="GET")
+        self.assertEqual(response.code, 404)
+
+    def test_history_query(self):
+        self.dummy_app.history = MagicMock()
+        self.dummy_app.history.query.return_value = ([{"id": 7}], 7)
+        response = self.fetch(
+            "/api/jupyter-notify/history?notebook=a.ipynb&limit=1000&since=10",
+            method="GET",
+        )
+        self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body), {"items": [{"id": 7}], "next": 7})
+        kwargs = self.dummy_app.history.query.call_args.kwargs
+        self.assertEqual(kwargs["notebook"], "a.ipynb")
+        self.assertEqual(kwargs["user"], "test-user")
+        self.assertEqual(kwargs["limit"], handlers.NotifyHistoryHandler.MAX_LIMIT)
+        self.assertEqual(kwargs["since"], 10.0)
+
+    def test_history_invalid_arguments(self):
+        self.dummy_app.history = MagicMock()
+        response = self.fetch("/api/jupyter-notify/history?before=abc", method="GET")
+        self.assertEqual(response.code, 400)
+
+    def test_history_without_user_name_is_empty(self):
+        self.dummy_app.history = MagicMock()
+
+        async def get_user(handler):
+            return {"display_name": "Anonymous"}
+
+        self._app.settings["identity_provider"].get_user = get_user
+        response = self.fetch("/api/jupyter-notify/history", method="GET")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(json.loads(response.body), {"items": [], "next": None})
+        self.dummy_app.history.query.assert_not_called()
+
+
+class TestNotifyProfileHandler(AsyncHTTPTestCase):
+    def get_app(self):
+        self.dummy_app = DummyExtensionApp()
+        settings = {
+            "identity_provider": DummyIdentityProvider(),
+        }
+        return Application(
+            [
+                (
+                    r"/api/jupyter-notify/profile",
+                    handlers.NotifyProfileHandler,
+                    {"extension_app": self.dummy_app, "name": "test"},
+                ),
+            ],
+            **settings,
+        )
+
+    def test_profile_disabled(self):
+        response = self.fetch("/api/jupyter-notify/profile?notebook=a.ipynb")
+        self.assertEqual(response.code, 404)
+
+    def test_profile_by_path(self):
+        profiler = self.dummy_app.profiler = ExecutionProfiler()
+        for event_type, cell_id, timestamp in [
+            ("execution_start", "cell1", "2025-03-21T12:00:00Z"),
+            ("execution_end", "cell1", "2025-03-21T12:00:04Z"),
+            ("execution_start", "cell2", "2025-03-21T12:00:04Z"),
+            ("execution_end", "cell2", "2025-03-21T12:00:14Z"),
+            ("execution_start", "cell1", "2025-03-21T12:00:14Z"),
+            ("execution_end", "cell1", "2025-03-21T12:00:16Z"),
+            ("execution_start", "cell3", "2025-03-21T12:00:16Z"),
+        ]:
+            profiler.observe(
+                {
+                    "event_type": event_type,
+                    "cell_id": cell_id,
+                    "document_id": "json:notebook:1",
+                    "success": True,
+                    "timestamp": timestamp,
+                }
+            )
+        profiler.add_alias("work/a.ipynb", "json:notebook:1")
+
+        response = self.fetch("/api/jupyter-notify/profile?notebook=work/a.ipynb")
+        self.assertEqual(response.code, 200)
+        data = json.loads(response.body)
+        self.assertEqual(data["document_id"], "json:notebook:1")
+        self.assertEqual(data["cumulative_time"], 16.0)
+        self.assertEqual(
+            [(c["cell_id"], c["runs"], c["total"]) for c in data["slowest"]],
+            [("cell2", 1, 10.0), ("cell1", 2, 6.0)],
+        )
+        self.assertEqual(
+            [(r["cell_id"], r["duration"]) for r in data["timeline"]],
+            [("cell1", 4.0), ("cell2", 10.0), ("cell1", 2.0)],
+        )
+        self.assertEqual([r["cell_id"] for r in data["running"]], ["cell3"])
+
+        response = self.fetch("/api/jupyter-notify/profile?notebook=b.ipynb")
+        self.assertEqual(response.code, 404)
+        response = self.fetch("/api/jupyter-notify/profile")
+        self.assertEqual(response.code, 400)
+
+
+class TestNotifyErrorHandler(AsyncHTTPTestCase):
+    def get_app(self):
+        self.dummy_app = DummyExtensionApp()
+        self.dummy_app.errors = ErrorStore(2**20)
+        return Application(
+            [
+                (
+                    r"/api/jupyter-notify/errors/(?P<key>[0-9a-f]+)",
+                    handlers.NotifyErrorHandler,
+                    {"extension_app": self.dummy_app, "name": "test"},
+                ),
+            ],
+            identity_provider=DummyIdentityProvider(),
+        )
+
+    def test_get_stored_error(self):
+        key = self.dummy_app.errors.put("Traceback\nValueError: bad")
+        response = self.fetch(f"/api/jupyter-notify/errors/{key}")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body.decode(), "Traceback\nValueError: bad")
+        self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+
+    def test_unknown_error(self):
+        response = self.fetch("/api/jupyter-notify/errors/0123abcd")
+        self.assertEqual(response.code, 404)
+
+
+class TestNotifyRunningHandler(AsyncHTTPTestCase):
+    def get_app(self):
+        self.dummy_app = DummyExtensionApp()
+        self.dummy_app.running = RunningIndex()
+        return Application(
+            [
+                (
+                    r"/api/jupyter-notify/running",
+                    handlers.NotifyRunningHandler,
+                    {"extension_app": self.dummy_app, "name": "test"},
+                ),
+            ],
+            identity_provider=DummyIdentityProvider(),
+        )
+
+    def test_pages_longest_running_first(self):
+        for i in range(5):
+            self.dummy_app.running.start(
+                RunningCell(f"cell{i}", started=100.0 - i, notebook="nb.ipynb")
+            )
+        response = self.fetch("/api/jupyter-notify/running?limit=3")
+        self.assertEqual(response.code, 200)
+        data = json.loads(response.body)
+        self.assertEqual(
+            [item["cell_id"] for item in data["items"]], ["cell4", "cell3", "cell2"]
+        )
+        self.assertEqual(data["total"], 5)
+        self.assertGreater(data["items"][0]["elapsed"], data["items"][1]["elapsed"])
+
+        response = self.fetch(
+            f"/api/jupyter-notify/running?limit=3&after={data['next']}"
+        )
+        data = json.loads(response.body)
+        self.assertEqual(
+            [item["cell_id"] for item in data["items"]], ["cell1", "cell0"]
+        )
+        self.assertIsNone(data["next"])
+
+    def test_invalid_cursor(self):
+        response = self.fetch("/api/jupyter-notify/running?after=abc")
+        self.assertEqual(response.code, 400)
+
+
+class TestNotifyMailHandler(AsyncHTTPTestCase):
+    def get_app(self):
+        self.dummy_app = DummyExtensionApp()
+        return Application(
+            [
+                (
+                    r"/api/jupyter-notify/mail",
+                    handlers.NotifyMailHandler,
+                    {"extension_app": self.dummy_app, "name": "test"},
+                ),
+            ],
+            identity_provider=DummyIdentityProvider(),
+        )
+
+    def _mail(self, to="test-user@example.com"):
+        message = EmailMessage()
+        message["Subject"] = "Cell execution failed"
+        if to:
+            message["To"] = to
+        message.set_content("ZeroDivisionError: division by zero")
+        return message.as_bytes()
+
+    def test_queues_mail(self):
+        response = self.fetch(
+            "/api/jupyter-notify/mail?status=failure", method="POST", body=self._mail()
+        )
+        self.assertEqual(response.code, 202)
+        message, success = self.dummy_app.mails[0]
+        self.assertFalse(success)
+        self.assertEqual(message["To"], "test-user@example.com")
+        self.assertEqual(message["From"], "test@example.com")
+        self.assertIn("ZeroDivisionError", message.get_content())
+
+    def test_mails_without_recipients_go_to_the_caller(self):
+        response = self.fetch(
+            "/api/jupyter-notify/mail", method="POST", body=self._mail(to=None)
+        )
+        self.assertEqual(response.code, 202)
+        self.assertEqual(self.dummy_app.mails[0][0]["To"], "test-user@example.com")
+
+    def test_rejects_invalid_mails(self):
+        response = self.fetch(
+            "/api/jupyter-notify/mail?status=bad", method="POST", body=self._mail()
+        )
+        self.assertEqual(response.code, 400)
+        self.assertEqual(self.dummy_app.mails, [])
+
+    def test_rejects_mails_to_other_addresses(self):
+        for to in ("ann@example.com", "test-user@example.com, ann@example.com"):
+            response = self.fetch(
+                "/api/jupyter-notify/mail", method="POST", body=self._mail(to=to)
+            )
+            self.assertEqual(response.code, 403)
+        message = EmailMessage()
+        message["From"] = "ceo@example.com"
+        message.set_content("Wire the money")
+        response = self.fetch(
+            "/api/jupyter-notify/mail", method="POST", body=message.as_bytes()
+        )
+        self.assertEqual(response.code, 403)
+        self.assertEqual(self.dummy_app.mails, [])
+
+    def test_rejects_users_without_address(self):
+        async def get_user(handler):
+            return {"display_name": "Anonymous"}
+
+        self._app.settings["identity_provider"].get_user = get_user
+        response = self.fetch(
+            "/api/jupyter-notify/mail", method="POST", body=self._mail(to=None)
+        )
+        self.assertEqual(response.code, 403)
+
+    def test_rate_limits_each_user(self):
+        self.dummy_app.mail_limiter = RateLimiter(60.0, 2, clock=lambda: 0.0)
+        codes = [
+            self.fetch(
+                "/api/jupyter-notify/mail", method="POST", body=self._mail()
+            ).code
+            for _ in range(3)
+        ]
+        self.assertEqual(codes, [202, 202, 429])
+        self.assertEqual(len(self.dummy_app.mails), 2)
+
+    def test_unavailable_without_smtp(self):
+        self.dummy_app._config.smtp_instance = None
+        response = self.fetch(
+            "/api/jupyter-notify/mail", method="POST", body=self._mail()
+        )
+        self.assertEqual(response.code, 503)
+        self.assertEqual(json.loads(response.body)["error"], "Email is not configured")
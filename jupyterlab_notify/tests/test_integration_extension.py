@@ -65,3 +65,26 @@ def test_end_to_end_notification(notify_extension):
         users=[notify_extension._config.slack_user_id]
     )
     notify_extension.slack_client.chat_postMessage.assert_called_once()
+
+
+def test_sent_notification_is_recorded_in_history(notify_extension):
+    notify_extension.history = MagicMock()
+    params = NotificationParams(
+        cell_id="cell_history",
+        mode="always",
+        slackEnabled=True,
+        emailEnabled=False,
+        successMessage="Done",
+        failureMessage="Failed",
+        threshold=5,
+        success=True,
+        notebook_name="analysis.ipynb",
+    )
+    notify_extension.send_notification(params)
+
+    notify_extension.history.record.assert_called_once()
+    args, kwargs = notify_extension.history.record.call_args
+    assert args == ("Success",)
+    assert kwargs["notebook"] == "analysis.ipynb"
+    assert kwargs["slack_delivered"] is True
+    assert kwargs["email_delivered"] is None
@@ -0,0 +1,92 @@
+from jupyterlab_notify.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _breaker(**kwargs):
+    clock = Clock()
+    changes = []
+    breaker = CircuitBreaker(
+        "smtp",
+        on_change=lambda name, state: changes.append(state),
+        clock=clock,
+        **kwargs,
+    )
+    return breaker, clock, changes
+
+
+def test_opens_on_failure_rate_and_fails_fast():
+    breaker, clock, changes = _breaker(failure_rate=0.5, window=10)
+    for success in (True, False, True, False):
+        assert breaker.allow()
+        breaker.record(success)
+    assert breaker.state == CLOSED  # Too few sends to judge.
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+    assert changes == [OPEN]
+
+
+def test_slow_sends_count_as_failures():
+    breaker, clock, changes = _breaker(slow_call=5.0)
+    for _ in range(5):
+        breaker.record(True, latency=30.0)
+    assert breaker.state == OPEN
+
+
+def test_single_probe_after_cooldown():
+    breaker, clock, changes = _breaker(open_seconds=30.0)
+    for _ in range(5):
+        breaker.record(False)
+    clock.now = 29.0
+    assert not breaker.allow()
+
+    clock.now = 30.0
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Other sends wait for the probe.
+    assert not breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN
+
+    breaker.half_open()
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+    assert changes == [OPEN, HALF_OPEN, OPEN, HALF_OPEN, CLOSED]
+
+
+def test_snapshot_only_changes_with_version():
+    breaker, clock, changes = _breaker()
+    assert breaker.snapshot() == {"state": CLOSED, "opened_at": None}
+    for _ in range(5):
+        breaker.record(False)
+    snapshot = breaker.snapshot()
+    assert snapshot["state"] == OPEN
+    assert snapshot["opened_at"] is not None
+    version = breaker.version
+    breaker.allow()
+    assert breaker.snapshot() == snapshot
+    assert breaker.version == version
+
+
+def test_refusing_checks_without_counting():
+    breaker, clock, changes = _breaker(open_seconds=30.0)
+    assert not breaker.refusing()
+    for _ in range(5):
+        breaker.record(False)
+    assert breaker.refusing()
+    assert breaker.rejected == 0
+    # Past the cooldown a probe may go, and only one at a time.
+    clock.now = 31.0
+    assert not breaker.refusing()
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN and breaker.refusing()
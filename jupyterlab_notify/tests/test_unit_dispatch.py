@@ -0,0 +1,75 @@
+import threading
+import time
+from jupyterlab_notify.dispatch import FAILURE, SUCCESS, TIMEOUT, PriorityDispatcher
+
+
+def _blocked(dispatcher, priority=FAILURE):
+    """Occupy a worker until the returned event is set."""
+    started, release = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    dispatcher.submit_with_priority(priority, block)
+    assert started.wait(5)
+    return release
+
+
+def test_failures_run_before_successes():
+    dispatcher = PriorityDispatcher(max_workers=1, aging=60)
+    release = _blocked(dispatcher)
+    order = []
+    for index in range(3):
+        dispatcher.submit_with_priority(SUCCESS, order.append, f"success{index}")
+    dispatcher.submit_with_priority(TIMEOUT, order.append, "timeout")
+    dispatcher.submit_with_priority(FAILURE, order.append, "failure")
+    assert dispatcher.queued() == {
+        "failure": 1,
+        "timeout": 1,
+        "success": 3,
+        "housekeeping": 0,
+    }
+
+    release.set()
+    dispatcher.shutdown(wait=True)
+    assert order == ["failure", "timeout", "success0", "success1", "success2"]
+
+
+def test_aged_successes_are_not_starved():
+    dispatcher = PriorityDispatcher(max_workers=1, aging=0.05)
+    release = _blocked(dispatcher)
+    order = []
+    dispatcher.submit_with_priority(SUCCESS, order.append, "old success")
+    time.sleep(0.2)
+    dispatcher.submit_with_priority(FAILURE, order.append, "new failure")
+
+    release.set()
+    dispatcher.shutdown(wait=True)
+    assert order == ["old success", "new failure"]
+
+
+def test_success_budget_keeps_a_worker_for_alerts():
+    dispatcher = PriorityDispatcher(max_workers=2, budgets={SUCCESS: 1})
+    release = _blocked(dispatcher, SUCCESS)
+    dispatcher.submit_with_priority(SUCCESS, lambda: None)
+
+    # The second worker is not used for successes but runs the failure.
+    failure = dispatcher.submit_with_priority(FAILURE, lambda: "sent")
+    assert failure.result(timeout=5) == "sent"
+    assert dispatcher.queued()["success"] == 1
+
+    release.set()
+    dispatcher.shutdown(wait=True)
+    assert dispatcher.queued()["success"] == 0
+
+
+def test_cancelled_futures_are_skipped():
+    dispatcher = PriorityDispatcher(max_workers=1)
+    release = _blocked(dispatcher)
+    ran = []
+    future = dispatcher.submit(ran.append, 1)
+    assert future.cancel()
+    release.set()
+    dispatcher.shutdown(wait=True)
+    assert ran == []
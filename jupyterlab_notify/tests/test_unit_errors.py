@@ -0,0 +1,49 @@
+from jupyterlab_notify.errors import ErrorStore, collapse_repeats, condense, strip_ansi
+
+
+def test_strip_ansi():
+    assert strip_ansi("\x1b[0;31mValueError\x1b[0m: bad") == "ValueError: bad"
+    assert strip_ansi("\x1b]8;;file:///a.py\x07a.py\x1b]8;;\x07") == "a.py"
+
+
+def test_collapse_repeated_frames():
+    frames = ['  File "a.py", line 3, in f', "    return f(n)"]
+    lines = ["Traceback:", *frames * 500, "RecursionError: too deep"]
+    assert collapse_repeats(lines) == [
+        "Traceback:",
+        *frames,
+        "[Previous 2 lines repeated 499 more times]",
+        "RecursionError: too deep",
+    ]
+    # Two identical lines are shorter than the count.
+    assert collapse_repeats(["a", "a", "b"]) == ["a", "a", "b"]
+
+
+def test_condense_keeps_head_and_exception_line():
+    text = "\n".join(f"frame {i}" for i in range(10_000)) + "\nKeyError: 'x'"
+    condensed, dropped = condense(text, 1000)
+    assert dropped
+    assert len(condensed.encode()) <= 1000
+    assert condensed.startswith("frame 0\n")
+    assert condensed.endswith("KeyError: 'x'")
+    assert "lines omitted" in condensed
+
+    assert condense("short", 1000) == ("short", False)
+
+
+def test_condense_clips_a_huge_exception_line():
+    condensed, dropped = condense("ValueError: " + "x" * 100_000 + " end", 500)
+    assert dropped
+    assert len(condensed.encode()) <= 500
+    assert condensed.startswith("ValueError: ")
+    assert condensed.endswith(" end")
+
+
+def test_error_store_evicts_oldest():
+    store = ErrorStore(max_bytes=200)
+    first = store.put("a" * 1000)
+    assert store.get(first) == "a" * 1000
+    keys = [store.put(str(i) * 50 + "x" * i) for i in range(20)]
+    assert store.size <= 200
+    assert store.get(first) is None
+    assert store.get(keys[-1]) == "19" * 50 + "x" * 19
@@ -0,0 +1,98 @@
+import sqlite3
+import time
+import pytest
+from jupyterlab_notify.history import HistoryStore
+
+
+@pytest.fixture
+def history(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite"), flush_interval=0.01)
+    yield store
+    store.close(timeout=5)
+
+
+def _written(store):
+    """Wait for the writer to drain the queue by stopping it."""
+    assert store.flush(timeout=5)
+
+
+def test_record_and_paginate(history):
+    for index in range(5):
+        history.record(
+            "Success" if index % 2 else "Failed",
+            notebook="analysis.ipynb",
+            cell_id=f"cell{index}",
+            mode="default",
+            message=f"message {index}",
+            slack_delivered=True,
+            email_delivered=None,
+        )
+    history.record("Success", notebook="other.ipynb", cell_id="cell9")
+    _written(history)
+
+    entries, cursor = history.query(notebook="analysis.ipynb", limit=2)
+    assert [entry["cell_id"] for entry in entries] == ["cell4", "cell3"]
+    assert entries[0]["slack_delivered"] is True
+    assert entries[0]["email_delivered"] is None
+
+    entries, cursor = history.query(notebook="analysis.ipynb", limit=2, before=cursor)
+    assert [entry["cell_id"] for entry in entries] == ["cell2", "cell1"]
+    entries, cursor = history.query(notebook="analysis.ipynb", limit=2, before=cursor)
+    assert [entry["cell_id"] for entry in entries] == ["cell0"]
+    assert cursor is None
+
+    entries, _ = history.query(status="Failed")
+    assert {entry["cell_id"] for entry in entries} == {"cell0", "cell2", "cell4"}
+
+
+def test_retention_keeps_newest_rows(tmp_path):
+    path = str(tmp_path / "history.sqlite")
+    store = HistoryStore(path, flush_interval=0.01, max_rows=3)
+    for index in range(10):
+        store.record("Success", cell_id=f"cell{index}")
+    _written(store)
+    store._compact(sqlite3.connect(path))
+
+    entries, _ = store.query()
+    assert [entry["cell_id"] for entry in entries] == ["cell9", "cell8", "cell7"]
+    store.close()
+
+
+def test_filter_by_notebook_path_and_user(history):
+    history.record("Success", notebook="a.ipynb", notebook_path="x/a.ipynb", user="ann")
+    history.record("Success", notebook="a.ipynb", notebook_path="y/a.ipynb", user="bob")
+    _written(history)
+
+    entries, _ = history.query(notebook="a.ipynb")
+    assert len(entries) == 2
+    entries, _ = history.query(notebook_path="x/a.ipynb")
+    assert [entry["user"] for entry in entries] == ["ann"]
+    entries, _ = history.query(user="bob")
+    assert [entry["notebook_path"] for entry in entries] == ["y/a.ipynb"]
+
+
+def test_columns_added_to_existing_databases(tmp_path):
+    path = str(tmp_path / "history.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE notifications (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "created_at REAL NOT NULL, notebook TEXT, cell_id TEXT, mode TEXT, "
+        "status TEXT NOT NULL, message TEXT, slack_delivered INTEGER, "
+        "email_delivered INTEGER)"
+    )
+    connection.execute(
+        "INSERT INTO notifications (created_at, status) VALUES (?, 'Success')",
+        (time.time(),),
+    )
+    connection.commit()
+    connection.close()
+
+    store = HistoryStore(path, flush_interval=0.01)
+    store.record("Failed", notebook_path="a.ipynb", user="ann")
+    _written(store)
+    entries, _ = store.query()
+    assert [(entry["status"], entry["user"]) for entry in entries] == [
+        ("Failed", "ann"),
+        ("Success", None),
+    ]
+    store.close()
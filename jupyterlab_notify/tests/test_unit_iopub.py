@@ -0,0 +1,162 @@
+import json
+
+import zmq
+
+from jupyterlab_notify.iopub import DELIMITER, IOPubTracker
+
+
+class FakeSocket:
+    def __init__(self):
+        self.subscriptions = {b""}
+
+    def setsockopt(self, option, value):
+        if option == zmq.SUBSCRIBE:
+            self.subscriptions.add(value)
+        elif option == zmq.UNSUBSCRIBE:
+            self.subscriptions.discard(value)
+
+
+class FakeStream:
+    def __init__(self):
+        self.socket = FakeSocket()
+        self.callback = None
+        self.closed = False
+
+    def on_recv(self, callback):
+        self.callback = callback
+
+    def close(self):
+        self.closed = True
+
+
+class FakeKernelManager:
+    def __init__(self):
+        self.streams = {}
+
+    def connect_iopub(self, kernel_id):
+        if kernel_id != "k1":
+            raise KeyError(kernel_id)
+        self.streams[kernel_id] = stream = FakeStream()
+        return stream
+
+
+def _frames(msg_type, parent_id, content, topic=None):
+    if topic is None:
+        topic = f"kernel.abc.{msg_type}".encode()
+    return [
+        topic,
+        DELIMITER,
+        b"signature",
+        json.dumps({"msg_type": msg_type}).encode(),
+        json.dumps({"msg_id": parent_id} if parent_id else {}).encode(),
+        b"{}",
+        json.dumps(content).encode(),
+    ]
+
+
+def _tracker():
+    events = []
+    manager = FakeKernelManager()
+    tracker = IOPubTracker(manager, events.append)
+    return tracker, manager, events
+
+
+def _send(manager, *frames):
+    for message in frames:
+        manager.streams["k1"].callback(message)
+
+
+def test_registered_execution_becomes_start_and_end_events():
+    tracker, manager, events = _tracker()
+    assert tracker.track("k1", "m1", "cell1")
+    _send(
+        manager,
+        _frames("status", "m1", {"execution_state": "busy"}),
+        _frames("execute_input", "m1", {"code": "1"}),
+        _frames("status", "m1", {"execution_state": "idle"}),
+    )
+    assert [(e["event_type"], e["cell_id"]) for e in events] == [
+        ("execution_start", "cell1"),
+        ("execution_end", "cell1"),
+    ]
+    assert events[1]["success"] is True
+    assert events[1]["kernel_error"] is None
+
+
+def test_error_fails_the_execution():
+    tracker, manager, events = _tracker()
+    tracker.track("k1", "m1", "cell1")
+    _send(
+        manager,
+        _frames("execute_input", "m1", {}),
+        _frames("error", "m1", {"ename": "ValueError", "evalue": "bad"}),
+        _frames("status", "m1", {"execution_state": "idle"}),
+    )
+    assert events[-1]["success"] is False
+    assert events[-1]["kernel_error"] == "ValueError: bad"
+
+
+def test_registration_after_the_execution_ended():
+    tracker, manager, events = _tracker()
+    tracker.watch("k1")
+    _send(
+        manager,
+        _frames("execute_input", "other", {}),
+        _frames("execute_input", "m1", {}),
+        _frames("status", "m1", {"execution_state": "idle"}),
+    )
+    assert events == []
+    tracker.track("k1", "m1", "cell1")
+    assert [e["event_type"] for e in events] == ["execution_start", "execution_end"]
+
+
+def test_subscription_narrowed_to_tracked_messages():
+    tracker, manager, events = _tracker()
+    tracker.track("k1", "m1", "cell1")
+    # Output is skipped from the topic alone, without parsing.
+    manager.streams["k1"].callback([b"stream.stdout", DELIMITER, b"", b"?", b"?"])
+    assert manager.streams["k1"].socket.subscriptions == {b""}
+
+    _send(manager, _frames("execute_input", "m1", {}))
+    assert manager.streams["k1"].socket.subscriptions == {
+        b"kernel.abc.execute_input",
+        b"kernel.abc.error",
+        b"kernel.abc.status",
+    }
+
+
+def test_kernel_restart_fails_running_cells():
+    tracker, manager, events = _tracker()
+    tracker.track("k1", "m1", "cell1")
+    tracker.track("k1", "m2", "cell2")
+    _send(manager, _frames("execute_input", "m1", {}))
+    old_stream = manager.streams["k1"]
+
+    tracker.restarted("k1")
+
+    assert old_stream.closed
+    assert manager.streams["k1"] is not old_stream
+    ends = [e for e in events if e["event_type"] == "execution_end"]
+    assert {e["cell_id"] for e in ends} == {"cell1", "cell2"}
+    assert all(e["kernel_error"] == "KernelError: Kernel restarted" for e in ends)
+
+
+def test_unknown_kernel_is_not_tracked():
+    tracker, manager, events = _tracker()
+    assert not tracker.track("missing", "m1", "cell1")
+    assert "missing" not in tracker
+
+
+def test_untracked_executions_are_forgotten():
+    tracker, manager, events = _tracker()
+    tracker.track("k1", "m1", "cell1")
+    tracker.track("k1", "m2", "cell2")
+    tracker.untrack("k1", "m1")
+    tracker.untrack("k2", "m2")
+    assert list(tracker._kernels["k1"].pending) == ["m2"]
+
+    _send(manager, _frames("status", "m1", {"execution_state": "idle"}))
+    assert events == []
+    tracker.restarted("k1")
+    assert {e["cell_id"] for e in events} == {"cell2"}
+    assert tracker._kernels["k1"].pending == {}
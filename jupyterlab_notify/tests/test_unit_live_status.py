@@ -0,0 +1,136 @@
+from unittest.mock import MagicMock
+from jupyterlab_notify.live_status import SlackLiveStatus
+from jupyterlab_notify.scheduler import Scheduler
+
+
+class InlineScheduler(Scheduler):
+    """Queue calls and run them when told to, ignoring the delays."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def call_later(self, delay, callback, *args):
+        self.calls.append((delay, callback, args))
+        return MagicMock()
+
+    def run_pending(self):
+        calls, self.calls = self.calls, []
+        for _, callback, args in calls:
+            callback(*args)
+        return [delay for delay, _, _ in calls]
+
+
+def _live_status():
+    client = MagicMock()
+    client.chat_postMessage.return_value = {"channel": "C1", "ts": "1.0"}
+    scheduler = InlineScheduler()
+    status = SlackLiveStatus(
+        lambda slack_user_id, channel_name: (client, slack_user_id or "#general"),
+        scheduler,
+        interval=5.0,
+    )
+    return status, client, scheduler
+
+
+def test_run_posts_once_then_updates_in_place():
+    status, client, scheduler = _live_status()
+    for index in range(50):
+        status.cell_registered("nb.ipynb", "nb.ipynb", f"cell{index}")
+    # One update is planned however many cells changed.
+    assert scheduler.run_pending() == [0.0]
+    client.chat_postMessage.assert_called_once()
+    assert "queued: 50" in client.chat_postMessage.call_args.kwargs["text"]
+
+    for index in range(50):
+        status.cell_started("nb.ipynb", f"cell{index}")
+        status.cell_finished("nb.ipynb", f"cell{index}", index != 7, f"Cell {index}")
+    delays = scheduler.run_pending()
+    assert len(delays) == 1 and 4 < delays[0] <= 5.0
+
+    client.chat_update.assert_called_once()
+    update = client.chat_update.call_args.kwargs
+    assert (update["channel"], update["ts"]) == ("C1", "1.0")
+    assert "finished" in update["text"]
+    assert "Done: 50/50, failed: 1" in update["text"]
+    assert "Failed: Cell 7" in update["text"]
+    # The summary is posted as a new message in the thread.
+    summary = client.chat_postMessage.call_args.kwargs
+    assert summary["thread_ts"] == "1.0" and summary["reply_broadcast"]
+    assert status.runs == {}
+
+
+def test_run_ends_when_nothing_runs_after_a_failure():
+    status, client, scheduler = _live_status()
+    for cell_id in ("cell1", "cell2", "cell3"):
+        status.cell_registered("nb.ipynb", "nb.ipynb", cell_id)
+    scheduler.run_pending()
+    status.cell_started("nb.ipynb", "cell1")
+    status.cell_finished("nb.ipynb", "cell1", False, "Cell 1")
+    scheduler.run_pending()
+
+    text = client.chat_update.call_args.kwargs["text"]
+    assert text.startswith(":x:")
+    assert "skipped: 2" in text
+    assert status.runs == {}
+
+
+def test_dropped_cells_are_not_counted():
+    status, client, scheduler = _live_status()
+    for cell_id in ("cell1", "cell2"):
+        status.cell_registered("nb.ipynb", "nb.ipynb", cell_id)
+    scheduler.run_pending()
+    status.cell_started("nb.ipynb", "cell1")
+    status.cell_dropped("nb.ipynb", "cell1")
+    status.cell_finished("nb.ipynb", "cell2", True, "Cell 2")
+    scheduler.run_pending()
+
+    assert "Done: 1/1" in client.chat_update.call_args.kwargs["text"]
+    assert status.runs == {}
+
+
+def test_run_of_dropped_cells_only_is_forgotten():
+    status, client, scheduler = _live_status()
+    status.cell_registered("nb.ipynb", "nb.ipynb", "cell1")
+    status.cell_dropped("nb.ipynb", "cell1")
+    assert status.runs == {}
+
+    status.cell_registered("other.ipynb", "other.ipynb", "cell2")
+    status.close()
+    assert status.runs == {}
+
+
+def test_runs_of_each_destination_are_separate():
+    status, client, scheduler = _live_status()
+    status.cell_registered("nb.ipynb", "nb.ipynb", "cell1", destination=("UA", None))
+    status.cell_registered("nb.ipynb", "nb.ipynb", "cell2", destination=("UB", None))
+    scheduler.run_pending()
+
+    channels = [call.kwargs["channel"] for call in client.chat_postMessage.mock_calls]
+    assert sorted(channels) == ["UA", "UB"]
+    status.cell_finished("nb.ipynb", "cell1", True, "Cell 1", destination=("UA", None))
+    assert len(status.runs) == 2
+    status.cell_finished("nb.ipynb", "cell1", True, "Cell 1", destination=("UB", None))
+    assert "queued: 1" in status.runs[("nb.ipynb", ("UB", None))].render()
+
+
+def test_updates_go_through_the_circuit_breaker():
+    status, client, scheduler = _live_status()
+    allowed, recorded = [False], []
+    status.allow_send = lambda: allowed[0]
+    status.record_send = lambda success, started: recorded.append(success)
+    status.cell_registered("nb.ipynb", "nb.ipynb", "cell1")
+    scheduler.run_pending()
+
+    # Refused: nothing posted, the update is planned again.
+    client.chat_postMessage.assert_not_called()
+    assert len(scheduler.calls) == 1
+    allowed[0] = True
+    scheduler.run_pending()
+    client.chat_postMessage.assert_called_once()
+    assert recorded == [True]
+
+    client.chat_update.side_effect = RuntimeError("down")
+    status.cell_finished("nb.ipynb", "cell1", True, "Cell 1")
+    scheduler.run_pending()
+    assert recorded == [True, False]
@@ -0,0 +1,212 @@
+import base64
+import pytest
+from unittest.mock import MagicMock
+from IPython.core.interactiveshell import InteractiveShell
+from traitlets.config import Config
+from jupyterlab_notify import magics
+from jupyterlab_notify import mail
+from jupyterlab_notify.magics import NotifyCellCompletionMagics
+
+
+@pytest.fixture
+def displays(monkeypatch):
+    calls = []
+
+    def fake_display(bundle, raw=False, display_id=None):
+        assert raw
+        calls.append(("display", bundle, display_id))
+
+    def fake_update_display(bundle, raw=False, display_id=None):
+        assert raw
+        calls.append(("update", bundle, display_id))
+
+    monkeypatch.setattr(magics, "display", fake_display)
+    monkeypatch.setattr(magics, "update_display", fake_update_display)
+    monkeypatch.setattr(
+        NotifyCellCompletionMagics, "_setup_smtp_instance", lambda self: None
+    )
+    return calls
+
+
+def _payload(call):
+    return call[1][magics._Notification.NOTIFICATION_MIMETYPE]
+
+
+def test_notifications_update_a_single_display(displays):
+    shell = InteractiveShell.instance()
+    notify_magics = NotifyCellCompletionMagics(shell)
+    for _ in range(3):
+        notify_magics.handle_result(MagicMock(success=True), False, "Done", "Failed")
+
+    assert [call[0] for call in displays] == ["display", "update", "update", "update"]
+    assert len({call[2] for call in displays}) == 1
+    assert _payload(displays[0])["type"] == "INIT"
+    assert _payload(displays[-1])["type"] == "NOTIFY"
+    assert _payload(displays[-1])["payload"]["title"] == "Done"
+    assert "transient" not in _payload(displays[-1])
+
+
+def test_each_cell_creates_its_own_display(displays):
+    shell = InteractiveShell.instance()
+    shell.register_magics(NotifyCellCompletionMagics)
+
+    shell.run_cell("%%notify -s First\nx = 1\n")
+    shell.run_cell("%%notify -s Second\nx = 2\n")
+
+    assert [call[0] for call in displays[-2:]] == ["display", "display"]
+    assert displays[-2][2] != displays[-1][2]
+    assert _payload(displays[-1])["payload"]["title"] == "Second"
+
+
+def test_transient_notifications_never_create_outputs(displays):
+    shell = InteractiveShell.instance()
+    config = Config()
+    config.NotifyCellCompletionMagics.transient = True
+    shell.update_config(config)
+    try:
+        notify_magics = NotifyCellCompletionMagics(shell)
+        notify_magics.handle_result(MagicMock(success=False), False, "Done", "Failed")
+    finally:
+        shell.update_config(
+            Config({"NotifyCellCompletionMagics": {"transient": False}})
+        )
+
+    assert [call[0] for call in displays] == ["update", "update"]
+    assert all(_payload(call)["transient"] for call in displays)
+    assert _payload(displays[-1])["payload"]["title"] == "Failed"
+
+
+def test_notify_cell_supports_top_level_await(displays):
+    shell = InteractiveShell.instance()
+    shell.register_magics(NotifyCellCompletionMagics)
+    notify_magics = shell.magics_manager.registry["NotifyCellCompletionMagics"]
+
+    result = shell.run_cell(
+        "%%notify -s Loaded\n"
+        "import asyncio\n"
+        "await asyncio.sleep(0)\n"
+        "loaded = 41 + 1\n"
+    )
+
+    assert result.success
+    assert shell.user_ns["loaded"] == 42
+    assert _payload(displays[-1])["payload"]["title"] == "Loaded"
+    # The notification is armed for one execution only.
+    count = len(displays)
+    shell.run_cell("loaded += 1")
+    assert len(displays) == count
+    assert notify_magics._cell_args is None
+
+
+def test_notify_cell_reports_failures(displays):
+    shell = InteractiveShell.instance()
+    shell.register_magics(NotifyCellCompletionMagics)
+
+    result = shell.run_cell("%%notify -f Broken\n1 / 0\n")
+
+    assert not result.success
+    assert _payload(displays[-1])["payload"]["title"] == "Broken"
+
+
+def test_notify_cell_reports_syntax_errors(displays):
+    shell = InteractiveShell.instance()
+    shell.register_magics(NotifyCellCompletionMagics)
+
+    result = shell.run_cell("%%notify -f boom\nx = (\n")
+
+    assert result.error_before_exec is not None
+    assert _payload(displays[-1])["payload"]["title"] == "boom"
+
+
+class RichResult:
+    def __repr__(self):
+        return "RichResult()"
+
+    def _repr_html_(self):
+        return "<table><tr><td>42</td></tr></table>"
+
+    def _repr_png_(self):
+        return b"\x89PNG\r\n\x1a\n" + b"\0" * 3000
+
+
+def _rich_magics(displays, max_bytes):
+    shell = InteractiveShell.instance()
+    notify_magics = NotifyCellCompletionMagics(shell)
+    notify_magics.rich_mail = True
+    notify_magics.mail_max_bytes = max_bytes
+    notify_magics.smtp_instance = MagicMock()
+    return notify_magics
+
+
+def test_rich_mail_inlines_html_and_png(displays):
+    notify_magics = _rich_magics(displays, 2**20)
+    future = notify_magics.handle_result(
+        MagicMock(success=True, result=RichResult()), True, "Done", "Failed"
+    )
+    future.result()
+
+    message = notify_magics.smtp_instance.send_message.call_args[0][0]
+    assert message["Subject"] == "Done"
+    assert message.get_body(("plain",)).get_content().strip() == "RichResult()"
+    html_part = message.get_body(("related",))
+    assert "<td>42</td>" in html_part.get_body(("html",)).get_content()
+    assert 'src="cid:cell-output"' in html_part.get_body(("html",)).get_content()
+    image = next(
+        part for part in message.walk() if part.get_content_type() == "image/png"
+    )
+    assert image["Content-ID"] == "<cell-output>"
+    assert image.get_content() == RichResult()._repr_png_()
+
+
+def test_rich_mail_omits_outputs_over_the_size_limit(displays, monkeypatch):
+    monkeypatch.setattr(mail, "downscale_png", lambda data, size: None)
+    notify_magics = _rich_magics(displays, 1000)
+    notify_magics.handle_result(
+        MagicMock(success=True, result=RichResult()), True, "Done", "Failed"
+    ).result()
+
+    message = notify_magics.smtp_instance.send_message.call_args[0][0]
+    assert all(part.get_content_type() != "image/png" for part in message.walk())
+    text = message.get_body(("plain",)).get_content()
+    assert "Image of 4.0 KiB omitted" in text
+    assert len(message.as_bytes()) < 2000
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 56, 57, 58, 1000])
+def test_encoded_size_matches_the_email_encoding(size):
+    encoded = base64.encodebytes(b"x" * size).replace(b"\n", b"\r\n")
+    assert mail.encoded_size(size) == len(encoded)
+
+
+def test_mails_go_through_the_server_then_the_kernel_smtp(displays):
+    notify_magics = NotifyCellCompletionMagics(InteractiveShell.instance())
+    notify_magics._server_mail = MagicMock()
+    notify_magics._server_mail.send.return_value = True
+    notify_magics.smtp_instance = MagicMock()
+    failed = MagicMock(success=False, error_in_exec=ZeroDivisionError("zero"))
+
+    notify_magics.handle_result(failed, True, "Done", "Failed")
+    message, success = notify_magics._server_mail.send.call_args[0]
+    assert message["Subject"] == "Failed"
+    assert success is False
+    notify_magics.smtp_instance.send_message.assert_not_called()
+
+    notify_magics._server_mail.send.return_value = False
+    notify_magics.handle_result(failed, True, "Done", "Failed")
+    notify_magics.smtp_instance.send_message.assert_called_once()
+
+
+def test_smtp_session_only_opened_without_a_server(displays, monkeypatch):
+    opened = []
+    monkeypatch.setattr(
+        NotifyCellCompletionMagics,
+        "_setup_smtp_instance",
+        lambda self: opened.append(self),
+    )
+    monkeypatch.setattr(magics.ServerMail, "discover", lambda: MagicMock())
+    NotifyCellCompletionMagics(InteractiveShell.instance())
+    assert opened == []
+
+    monkeypatch.setattr(magics.ServerMail, "discover", lambda: None)
+    NotifyCellCompletionMagics(InteractiveShell.instance())
+    assert len(opened) == 1
@@ -1,10 +1,20 @@
+import json
+import os
+import socket
 import threading
+import time
+from concurrent.futures import Future
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
 import pytest
 from unittest.mock import MagicMock
 from email.message import EmailMessage
 from traitlets.config import Config
-from jupyterlab_notify import extension
-from jupyterlab_notify.config import NotificationParams
+from jupyterlab_notify import extension, scheduler
+from jupyterlab_notify.config import NotificationParams, notification_params_from_dict
+from jupyterlab_notify.dispatch import FAILURE, HOUSEKEEPING, SUCCESS, TIMEOUT
+from jupyterlab_notify.stats import DurationHistory
+from jupyterlab_notify.templates import CompiledTemplate
 
 
 @pytest.fixture
@@ -72,6 +82,19 @@ def test_send_email_notification(notify_extension):
     assert test_message in sent_msg.get_content()
 
 
+def test_email_html_is_capped_with_the_mail(notify_extension):
+    smtp = notify_extension._config.smtp_instance
+    notify_extension.send_email_notification("Done", html="<b>Done</b>")
+    message = smtp.send_message.call_args[0][0]
+    assert message.get_body(("html",)).get_content().strip() == "<b>Done</b>"
+
+    notify_extension._config.message_max_bytes = {"email": 100}
+    notify_extension.send_email_notification("Done", html="<p>x</p>" * 100)
+    message = smtp.send_message.call_args[0][0]
+    assert not message.is_multipart()
+    assert "HTML output of" in message.get_content()
+
+
 def test_send_notification_modes(notify_extension, monkeypatch):
     """Parametrized test for different notification modes."""
     # mode, success, expected_slack, expected_email
@@ -183,3 +206,1339 @@ def test_send_notification_with_timeout(notify_extension, monkeypatch):
 
     assert "Timeout" in messages.get("slack", "")
     assert "Timeout" in messages.get("email", "")
+
+
+async def test_event_listener_batches_registered_events(notify_extension, monkeypatch):
+    """Events are drained in batches and unregistered cells are filtered out."""
+    notify_extension.cell_ids = {
+        "cell_tracked": NotificationParams(
+            cell_id="cell_tracked",
+            mode="default",
+            slackEnabled=True,
+            emailEnabled=False,
+            successMessage="Success",
+            failureMessage="Failure",
+            threshold=5,
+        )
+    }
+    notify_extension._init_dispatch()
+    notify_extension._intake.batch_size = 2
+
+    sent = []
+
+    def fake_send(params, end_time=None):
+        sent.append((params.cell_id, params.start_time, end_time))
+
+    monkeypatch.setattr(notify_extension, "send_notification", fake_send)
+
+    events = [
+        ("execution_start", "cell_tracked", "2025-03-21T12:00:00.000000Z"),
+        ("execution_start", "cell_other", "2025-03-21T12:00:00.000000Z"),
+        ("execution_end", "cell_other", "2025-03-21T12:00:01.000000Z"),
+        ("execution_end", "cell_tracked", "2025-03-21T12:00:10.000000Z"),
+    ]
+    for event_type, cell_id, timestamp in events:
+        await notify_extension.event_listener(
+            None,
+            extension.NBMODEL_SCHEMA_ID,
+            {
+                "event_type": event_type,
+                "cell_id": cell_id,
+                "document_id": "json:notebook:1",
+                "success": True,
+                "timestamp": timestamp,
+            },
+        )
+    # Only the tracked cell events made it into the intake.
+    assert len(notify_extension._intake) == 2
+
+    await notify_extension._intake.flush()
+    notify_extension._dispatch_executor.shutdown(wait=True)
+
+    assert sent == [
+        (
+            "cell_tracked",
+            "2025-03-21T12:00:00.000000Z",
+            "2025-03-21T12:00:10.000000Z",
+        )
+    ]
+    assert notify_extension.cell_ids == {}
+
+
+def test_default_threshold_accepts_utc_suffix(notify_extension, monkeypatch):
+    """Timestamps emitted by nbmodel use a ``Z`` suffix."""
+    params = NotificationParams(
+        cell_id="cell123",
+        mode="default",
+        slackEnabled=True,
+        emailEnabled=False,
+        successMessage="Success",
+        failureMessage="Failure",
+        threshold=5,
+        success=True,
+        start_time="2025-03-21T12:00:00.123456Z",
+    )
+    messages = []
+    monkeypatch.setattr(notify_extension, "send_slack_notification", messages.append)
+
+    notify_extension.send_notification(params, end_time="2025-03-21T12:00:02.123456Z")
+    assert messages == []
+    notify_extension.send_notification(params, end_time="2025-03-21T12:00:09.123456Z")
+    assert len(messages) == 1
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_custom_timeout_heartbeats(notify_extension, monkeypatch):
+    """A timed-out cell keeps sending escalating heartbeats until it finishes."""
+    notify_extension.cell_ids = {}
+    notify_extension._config.heartbeat_count = 2
+    notify_extension._config.heartbeat_factor = 2.0
+    notify_extension._init_dispatch()
+
+    messages = []
+    monkeypatch.setattr(notify_extension, "send_slack_notification", messages.append)
+
+    params = NotificationParams(
+        cell_id="cell_long",
+        mode="custom-timeout",
+        slackEnabled=True,
+        emailEnabled=False,
+        successMessage="Success",
+        failureMessage="Failure",
+        threshold=0.05,
+    )
+    notify_extension.cell_ids[params.cell_id] = params
+    notify_extension.schedule_timeout(params)
+
+    assert _wait_for(lambda: len(messages) == 3)
+    assert "Execution Status: Timeout" in messages[0]
+    assert "Execution Status: Running" in messages[1]
+    assert "Execution Status: Running" in messages[2]
+    # Capped at heartbeat_count, nothing else is pending.
+    assert len(notify_extension.scheduler) == 0
+
+
+def test_execution_end_cancels_heartbeats(notify_extension, monkeypatch):
+    notify_extension.cell_ids = {}
+    notify_extension._config.heartbeat_count = 5
+    notify_extension._init_dispatch()
+
+    messages = []
+    monkeypatch.setattr(notify_extension, "send_slack_notification", messages.append)
+
+    params = NotificationParams(
+        cell_id="cell_long",
+        mode="custom-timeout",
+        slackEnabled=True,
+        emailEnabled=False,
+        successMessage="Success",
+        failureMessage="Failure",
+        threshold=0.05,
+    )
+    notify_extension.cell_ids[params.cell_id] = params
+    notify_extension.schedule_timeout(params)
+    assert _wait_for(lambda: len(messages) >= 1)
+
+    notify_extension._handle_cell_event(
+        "cell_long", {"event_type": "execution_end", "success": True}
+    )
+    count = len(messages)
+    time.sleep(0.3)
+    assert len(messages) == count
+    assert len(notify_extension.scheduler) == 0
+
+
+def test_scheduler_runs_in_deadline_order_and_cancels():
+    calls = []
+    sched = scheduler.Scheduler()
+    late = sched.call_later(0.1, calls.append, "late")
+    cancelled = sched.call_later(0.02, calls.append, "cancelled")
+    sched.call_later(0.01, calls.append, "early")
+    cancelled.cancel()
+
+    assert cancelled.cancelled and not cancelled.is_alive()
+    assert _wait_for(lambda: calls == ["early", "late"])
+    assert not late.is_alive()
+    assert sched.stop() == []
+
+
+class RecordingExecutor:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        return self.submit_with_priority(None, fn, *args)
+
+    def submit_with_priority(self, priority, fn, *args):
+        self.submitted.append(priority)
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+def test_scheduled_calls_run_in_their_priority_class():
+    executor = RecordingExecutor()
+    sched = scheduler.Scheduler(executor=executor)
+    sched.call_later(0.01, lambda: None, priority=TIMEOUT)
+    sched.call_later(0.02, lambda: None)
+    assert _wait_for(lambda: len(executor.submitted) == 2)
+    assert executor.submitted == [TIMEOUT, None]
+    sched.stop()
+
+
+class DummySMTP:
+    def __init__(self, *args):
+        self.sent = []
+
+    def connect(self):
+        pass
+
+    def send_message(self, message):
+        self.sent.append(message)
+
+
+def test_reload_config_swaps_backends(notify_extension, monkeypatch, tmp_path):
+    """Changed config files are picked up without restarting the server."""
+    monkeypatch.setattr(
+        extension.NotifyExtension,
+        "config_file_paths",
+        property(lambda self: [str(tmp_path)]),
+    )
+    notify_extension._init_dispatch()
+    notify_extension._config_signature = notify_extension._config_files_signature()
+
+    config_file = tmp_path / "jupyter_notify_config.json"
+    config_file.write_text(
+        json.dumps(
+            {
+                "NotificationConfig": {
+                    "email": "new@example.com",
+                    "slack_token": "xoxb-new-token",
+                    "slack_channel_name": "alerts",
+                    "smtp_class": f"{__name__}.DummySMTP",
+                }
+            }
+        )
+    )
+    old_slack_client = notify_extension.slack_client
+
+    notify_extension._check_config_files()
+
+    assert notify_extension.config_generation == 1
+    assert notify_extension.config_reload_error is None
+    assert notify_extension.email == "new@example.com"
+    assert notify_extension.slack_channel_name == "alerts"
+    assert notify_extension.slack_client is not old_slack_client
+    notify_extension.send_email_notification("After reload")
+    assert len(notify_extension._config.smtp_instance.sent) == 1
+
+    # A broken file keeps the previous configuration in place.
+    config_file.write_text("{not json")
+    notify_extension._check_config_files()
+    assert notify_extension.config_generation == 1
+    assert notify_extension.config_reload_error
+    assert notify_extension.email == "new@example.com"
+
+
+def test_regression_mode_uses_duration_history(notify_extension, monkeypatch):
+    """Regression mode notifies when a run exceeds the cell's p95 by the factor."""
+    notify_extension.durations = DurationHistory()
+    for _ in range(10):
+        notify_extension.durations.add("work/pipeline.ipynb", "cell1", 60.0)
+
+    messages = []
+    monkeypatch.setattr(notify_extension, "send_slack_notification", messages.append)
+
+    def run_cell(end_time, success=True):
+        params = NotificationParams(
+            cell_id="cell1",
+            mode="regression",
+            slackEnabled=True,
+            emailEnabled=False,
+            successMessage="Success",
+            failureMessage="Failure",
+            threshold=30,
+            notebook_name="pipeline.ipynb",
+            notebook_path="work/pipeline.ipynb",
+        )
+        notify_extension.cell_ids = {"cell1": params}
+        for event_type, timestamp in (
+            ("execution_start", "2025-03-21T12:00:00Z"),
+            ("execution_end", end_time),
+        ):
+            notification = notify_extension._handle_cell_event(
+                "cell1",
+                {"event_type": event_type, "success": success, "timestamp": timestamp},
+            )
+        if notification is not None:
+            notify_extension.send_notification(*notification)
+
+    # 80s is within 1.5x the 60s p95.
+    run_cell("2025-03-21T12:01:20Z")
+    assert messages == []
+
+    run_cell("2025-03-21T12:03:00Z")
+    assert len(messages) == 1
+    assert "Execution Status: Regression" in messages[0]
+    assert "Cell took 3m, 3.0x its p95 of 1m" in messages[0]
+
+    # Failed runs are reported as failures and not added to the history.
+    count = notify_extension.durations.get("work/pipeline.ipynb", "cell1").count
+    run_cell("2025-03-21T12:05:00Z", success=False)
+    assert "Execution Status: Failed" in messages[1]
+    assert notify_extension.durations.get("work/pipeline.ipynb", "cell1").count == count
+
+
+async def test_event_listener_profiles_unregistered_cells(notify_extension):
+    """With profiling enabled every cell run is recorded, registered or not."""
+    notify_extension.update_config(
+        Config({"NotificationConfig": {"profile_enabled": True}})
+    )
+    notify_extension._init_config()
+    notify_extension._init_dispatch()
+    notify_extension._init_profiler()
+    notify_extension.cell_ids = {}
+
+    for event_type, timestamp in (
+        ("execution_start", "2025-03-21T12:00:00Z"),
+        ("execution_end", "2025-03-21T12:00:03Z"),
+    ):
+        await notify_extension.event_listener(
+            None,
+            extension.NBMODEL_SCHEMA_ID,
+            {
+                "event_type": event_type,
+                "cell_id": "cell_other",
+                "document_id": "json:notebook:1",
+                "success": True,
+                "timestamp": timestamp,
+            },
+        )
+
+    assert len(notify_extension._intake) == 0
+    report = notify_extension.profiler.report("json:notebook:1")
+    assert report["slowest"][0]["cell_id"] == "cell_other"
+    assert report["cumulative_time"] == 3.0
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/stat"), reason="requires /proc")
+def test_completion_message_includes_resource_usage(notify_extension, monkeypatch):
+    notify_extension._init_dispatch()
+    notify_extension._init_resources()
+    monkeypatch.setattr(notify_extension, "_kernel_pid", lambda kernel_id: os.getpid())
+    messages = []
+    monkeypatch.setattr(notify_extension, "send_slack_notification", messages.append)
+
+    params = NotificationParams(
+        cell_id="cell1",
+        mode="always",
+        slackEnabled=True,
+        emailEnabled=False,
+        successMessage="Success",
+        failureMessage="Failure",
+        threshold=0,
+        kernel_id="kernel-1",
+    )
+    notify_extension.cell_ids = {"cell1": params}
+    for event_type, timestamp in (
+        ("execution_start", "2025-03-21T12:00:00Z"),
+        ("execution_end", "2025-03-21T12:00:42Z"),
+    ):
+        notification = notify_extension._handle_cell_event(
+            "cell1",
+            {"event_type": event_type, "success": True, "timestamp": timestamp},
+        )
+    notify_extension.send_notification(*notification)
+    notify_extension.scheduler.stop()
+
+    assert params.resources.wall_time == 42.0
+    assert "Resources: peak RSS " in messages[0]
+    assert messages[0].endswith("wall 42s")
+
+
+async def test_stop_extension_spools_unsent_notifications(
+    notify_extension, monkeypatch, tmp_path
+):
+    """Shutdown waits for sends up to the deadline and spools the rest."""
+    spool_path = str(tmp_path / "spool.jsonl")
+    notify_extension.update_config(
+        Config(
+            {
+                "NotificationConfig": {
+                    "dispatch_workers": 1,
+                    "shutdown_timeout": 0.2,
+                    "spool_path": spool_path,
+                }
+            }
+        )
+    )
+    notify_extension._init_config()
+    notify_extension._init_dispatch()
+    notify_extension.schedule_timeout(
+        NotificationParams(
+            cell_id="pending",
+            mode="custom-timeout",
+            slackEnabled=True,
+            emailEnabled=False,
+            successMessage="Success",
+            failureMessage="Failure",
+            threshold=3600,
+        )
+    )
+
+    release = threading.Event()
+    sent = []
+
+    def slow_send(params, end_time=None):
+        release.wait(5)
+        sent.append(params.cell_id)
+
+    monkeypatch.setattr(notify_extension, "send_notification", slow_send)
+    for index in range(3):
+        params = NotificationParams(
+            cell_id=f"cell{index}",
+            mode="always",
+            slackEnabled=True,
+            emailEnabled=False,
+            successMessage="Success",
+            failureMessage="Failure",
+            threshold=0,
+            success=True,
+            notebook_name="analysis.ipynb",
+        )
+        notify_extension._dispatch([(params, "2025-03-21T12:00:09Z")])
+
+    await notify_extension.stop_extension()
+    release.set()
+
+    assert notify_extension.shutdown_report["timers_cancelled"] == 1
+    assert notify_extension.shutdown_report["in_progress"] == 1
+    assert notify_extension.shutdown_report["spooled"] == 2
+
+    # The spooled notifications are sent by the next server.
+    notify_extension._init_dispatch()
+    notify_extension._dispatch_executor = None
+    notify_extension._init_spool()
+    assert sent[-2:] == ["cell1", "cell2"]
+    assert not os.path.exists(spool_path)
+
+
+def test_live_status_replaces_per_cell_slack_messages(notify_extension, monkeypatch):
+    notify_extension.update_config(
+        Config({"NotificationConfig": {"slack_live_status": True}})
+    )
+    notify_extension._init_config()
+    notify_extension.slack_client = MagicMock()
+    notify_extension.slack_client.chat_postMessage.return_value = {
+        "channel": "C1",
+        "ts": "1.0",
+    }
+    notify_extension.slack_imported = True
+    notify_extension._init_dispatch()
+    notify_extension._init_live_status()
+    notify_extension.cell_ids = {}
+
+    params = NotificationParams(
+        cell_id="cell1",
+        mode="default",
+        slackEnabled=True,
+        emailEnabled=False,
+        successMessage="Success",
+        failureMessage="Failure",
+        threshold=0,
+        notebook_name="nb.ipynb",
+    )
+    notify_extension.register_cell(params)
+    for event_type in ("execution_start", "execution_end"):
+        notification = notify_extension._handle_cell_event(
+            "cell1",
+            {
+                "event_type": event_type,
+                "success": True,
+                "timestamp": "2025-03-21T12:00:00Z",
+            },
+        )
+    notify_extension.send_notification(*notification)
+    assert _wait_for(lambda: notify_extension.slack_client.chat_postMessage.called)
+    notify_extension.scheduler.stop()
+    assert notify_extension.live_status.runs == {}
+
+    # Only the run status message was posted.
+    notify_extension.slack_client.chat_postMessage.assert_called_once()
+    text = notify_extension.slack_client.chat_postMessage.call_args.kwargs["text"]
+    assert "*nb.ipynb* finished" in text
+
+
+def test_live_status_only_counts_notified_cells(notify_extension):
+    notify_extension.live_status = MagicMock()
+    notify_extension.cell_ids = {}
+
+    def params(cell_id, mode, threshold=0):
+        return NotificationParams(
+            cell_id=cell_id,
+            mode=mode,
+            slackEnabled=True,
+            emailEnabled=False,
+            successMessage="Success",
+            failureMessage="Failure",
+            threshold=threshold,
+            notebook_name="nb.ipynb",
+        )
+
+    for cell_id, mode in (("quiet", "never"), ("errors", "on-error")):
+        notify_extension.register_cell(params(cell_id, mode))
+        assert not notify_extension.cell_ids[cell_id].in_live_run
+    notify_extension.live_status.cell_registered.assert_not_called()
+
+    # A default mode cell under its threshold is dropped from the run.
+    notify_extension.register_cell(params("fast", "default", threshold=30))
+    notify_extension.live_status.cell_registered.assert_called_once()
+    for event_type, timestamp in (
+        ("execution_start", "2025-03-21T12:00:00Z"),
+        ("execution_end", "2025-03-21T12:00:05Z"),
+    ):
+        notify_extension._handle_cell_event(
+            "fast",
+            {"event_type": event_type, "success": True, "timestamp": timestamp},
+        )
+    notify_extension.live_status.cell_dropped.assert_called_once_with(
+        "nb.ipynb", "fast", destination=(None, None)
+    )
+    notify_extension.live_status.cell_finished.assert_not_called()
+
+
+def test_registrations_not_started_expire(notify_extension):
+    notify_extension.update_config(
+        Config({"NotificationConfig": {"registration_timeout": 60.0}})
+    )
+    notify_extension._init_config()
+    notify_extension.scheduler = MagicMock()
+    notify_extension.live_status = MagicMock()
+    notify_extension.cell_ids = {}
+    for cell_id in ("waiting", "running"):
+        notify_extension.register_cell(
+            NotificationParams(
+                cell_id=cell_id,
+                mode="default",
+                slackEnabled=True,
+                emailEnabled=False,
+                successMessage="Success",
+                failureMessage="Failure",
+                threshold=0,
+                notebook_name="nb.ipynb",
+            )
+        )
+        notify_extension.cell_ids[cell_id].registered_at -= 120
+    notify_extension.cell_ids["running"].start_time = "2025-03-21T12:00:00Z"
+
+    notify_extension._expire_registrations()
+    assert list(notify_extension.cell_ids) == ["running"]
+    notify_extension.live_status.cell_dropped.assert_called_once_with(
+        "nb.ipynb", "waiting", destination=(None, None)
+    )
+    # The sweep is planned again.
+    notify_extension.scheduler.call_later.assert_called_once()
+
+
+def test_dropped_registrations_stop_iopub_tracking(notify_extension):
+    notify_extension.update_config(
+        Config({"NotificationConfig": {"registration_timeout": 60.0}})
+    )
+    notify_extension._init_config()
+    notify_extension.scheduler = MagicMock()
+    notify_extension.iopub = MagicMock()
+    notify_extension.cell_ids = {}
+
+    def params(msg_id):
+        return NotificationParams(
+            cell_id="cell1",
+            mode="default",
+            slackEnabled=True,
+            emailEnabled=False,
+            successMessage="Success",
+            failureMessage="Failure",
+            threshold=0,
+            kernel_id="k1",
+            msg_id=msg_id,
+        )
+
+    # Registering the cell again replaces its execute request.
+    notify_extension.register_cell(params("m1"))
+    notify_extension.register_cell(params("m2"))
+    notify_extension.iopub.untrack.assert_called_once_with("k1", "m1")
+
+    notify_extension.cell_ids["cell1"].registered_at -= 120
+    notify_extension._expire_registrations()
+    notify_extension.iopub.untrack.assert_called_with("k1", "m2")
+
+
+def _run_params(mode):
+    return NotificationParams(
+        cell_id="run1",
+        mode=mode,
+        slackEnabled=True,
+        emailEnabled=False,
+        successMessage="Run done",
+        failureMessage="Run failed",
+        threshold=0,
+        notebook_name="nb.ipynb",
+    )
+
+
+def _end(cell_id, success=True, error=None):
+    return {
+        "cell_id": cell_id,
+        "event_type": "execution_end",
+        "success": success,
+        "kernel_error": error,
+        "timestamp": "2025-03-21T12:00:05Z",
+    }
+
+
+def test_notebook_run_notifies_once_when_all_cells_ended(notify_extension, monkeypatch):
+    notify_extension.initialize_handlers()
+    messages = []
+    monkeypatch.setattr(notify_extension, "send_slack_notification", messages.append)
+
+    notify_extension.register_run(_run_params("always"), ["a", "b", "c", "a"])
+    assert notify_extension.runs.get("run1").outstanding == 3
+    notify_extension._process_event_batch({"a": [_end("a")], "b": [_end("b")]})
+    assert messages == []
+    notify_extension._process_event_batch({"c": [_end("c")]})
+
+    assert len(messages) == 1
+    assert "Execution Status: Success" in messages[0]
+    assert "Cells run: 3/3" in messages[0]
+    assert len(notify_extension.runs) == 0
+    assert "a" not in notify_extension.runs
+
+
+def test_notebook_run_ends_on_first_failure(notify_extension, monkeypatch):
+    notify_extension.initialize_handlers()
+    messages = []
+    monkeypatch.setattr(notify_extension, "send_slack_notification", messages.append)
+
+    notify_extension.register_run(_run_params("on-error"), ["a", "b", "c"])
+    notify_extension._process_event_batch(
+        {"a": [_end("a")], "b": [_end("b", False, "ZeroDivisionError")]}
+    )
+
+    assert len(messages) == 1
+    assert "Execution Status: Failed" in messages[0]
+    assert "Cells run: 1/3" in messages[0]
+    assert "ZeroDivisionError" in messages[0]
+    # The cells left over are no longer tracked.
+    assert "c" not in notify_extension.runs
+    notify_extension._process_event_batch({"c": [_end("c")]})
+    assert len(messages) == 1
+
+    # Without failure, on-error runs end silently.
+    notify_extension.register_run(_run_params("on-error"), ["d"])
+    notify_extension._process_event_batch({"d": [_end("d")]})
+    assert len(messages) == 1
+
+
+def test_notebook_run_emptied_by_later_runs_is_notified(notify_extension, monkeypatch):
+    notify_extension.initialize_handlers()
+    messages = []
+    monkeypatch.setattr(notify_extension, "send_slack_notification", messages.append)
+
+    notify_extension.register_run(_run_params("always"), ["a", "b", "c"])
+    notify_extension._process_event_batch({"a": [_end("a")]})
+    later = _run_params("always")
+    later.cell_id = "run2"
+    notify_extension.register_run(later, ["b", "c"])
+
+    assert len(messages) == 1
+    assert "Cells run: 1/3" in messages[0]
+    assert notify_extension.runs.get("run1") is None
+    notify_extension._process_event_batch({"b": [_end("b")], "c": [_end("c")]})
+    assert len(messages) == 2
+    assert "Cells run: 2/2" in messages[1]
+
+
+def test_notebook_runs_not_started_expire(notify_extension):
+    notify_extension.update_config(
+        Config({"NotificationConfig": {"registration_timeout": 60.0}})
+    )
+    notify_extension._init_config()
+    notify_extension.initialize_handlers()
+    notify_extension.scheduler = MagicMock()
+    for run_id in ("waiting", "running"):
+        params = _run_params("always")
+        params.cell_id = run_id
+        notify_extension.register_run(params, [f"{run_id}-a", f"{run_id}-b"])
+        params.registered_at -= 120
+    notify_extension._handle_run_event(
+        "running-a",
+        {"event_type": "execution_start", "timestamp": "2025-03-21T12:00:00Z"},
+    )
+
+    notify_extension._expire_registrations()
+    assert notify_extension.runs.get("waiting") is None
+    assert "waiting-a" not in notify_extension.runs
+    assert notify_extension.runs.get("running") is not None
+
+
+def test_notebook_run_heartbeats(notify_extension, monkeypatch):
+    notify_extension.initialize_handlers()
+    notify_extension._config.heartbeat_count = 2
+    notify_extension._init_dispatch()
+    messages = []
+    monkeypatch.setattr(notify_extension, "send_slack_notification", messages.append)
+
+    params = _run_params("custom-timeout")
+    params.threshold = 0.05
+    notify_extension.register_run(params, ["a", "b"])
+    assert _wait_for(lambda: len(messages) == 3)
+    assert "Execution Status: Timeout" in messages[0]
+    assert "Execution Status: Running" in messages[2]
+
+    # Heartbeats stop with the run.
+    params = _run_params("custom-timeout")
+    params.threshold = 0.05
+    notify_extension._config.heartbeat_count = 5
+    notify_extension._config.heartbeat_factor = 20.0
+    notify_extension.register_run(params, ["c"])
+    assert _wait_for(lambda: len(messages) == 4)
+    notify_extension._process_event_batch({"c": [_end("c")]})
+    time.sleep(0.3)
+    assert len(messages) == 4
+    assert len(notify_extension.scheduler) == 0
+
+
+def test_notifications_go_to_the_registering_user(notify_extension, tmp_path):
+    path = tmp_path / "recipients.json"
+    path.write_text(
+        json.dumps({"alice": {"email": "alice@example.com", "slack_user_id": "UA"}})
+    )
+    notify_extension._config.recipients_file = str(path)
+    notify_extension._init_dispatch()
+    notify_extension._init_recipients()
+    notify_extension.scheduler.stop()
+
+    slack = notify_extension.slack_client
+    slack.conversations_open.side_effect = lambda users: {
+        "channel": {"id": f"D-{users[0]}"}
+    }
+    for username in ("alice", "alice", "bob"):
+        params = NotificationParams(
+            cell_id="cell1",
+            mode="always",
+            slackEnabled=True,
+            emailEnabled=True,
+            successMessage="Success",
+            failureMessage="Failure",
+            threshold=0,
+            success=True,
+            # Recipients sent by the client are ignored.
+            recipient_email="spoofed@example.com",
+        )
+        notify_extension.resolve_recipient(params, username)
+        notify_extension.send_notification(params)
+
+    channels = [c.kwargs["channel"] for c in slack.chat_postMessage.call_args_list]
+    assert channels == ["D-UA", "D-UA", "D-U12345678"]
+    # DM channels are opened once per user.
+    assert slack.conversations_open.call_count == 2
+    sent = notify_extension._config.smtp_instance.send_message.call_args_list
+    assert [call.args[0]["To"] for call in sent] == [
+        "alice@example.com",
+        "alice@example.com",
+        "test@example.com",
+    ]
+
+
+def test_routing_rules_replace_destinations(notify_extension, monkeypatch):
+    notify_extension.update_config(
+        Config(
+            {
+                "NotificationConfig": {
+                    "routing_rules": [
+                        {
+                            "notebook": "projects/etl/**",
+                            "status": "Failed",
+                            "slack_channel": "etl-alerts",
+                            "email": "etl@example.com",
+                        }
+                    ]
+                }
+            }
+        )
+    )
+    notify_extension._init_config()
+    notify_extension._config.smtp_instance = MagicMock()
+    notify_extension.slack_client = MagicMock()
+    slack = []
+    emails = []
+    monkeypatch.setattr(
+        notify_extension,
+        "send_slack_notification",
+        lambda message, **kwargs: slack.append(kwargs),
+    )
+    monkeypatch.setattr(
+        notify_extension,
+        "send_email_notification",
+        lambda message, **kwargs: emails.append(kwargs),
+    )
+
+    for success in (False, True):
+        params = NotificationParams(
+            cell_id="cell1",
+            mode="always",
+            slackEnabled=True,
+            emailEnabled=False,
+            successMessage="Success",
+            failureMessage="Failure",
+            threshold=0,
+            success=success,
+            notebook_path="projects/etl/load.ipynb",
+        )
+        notify_extension.send_notification(params)
+
+    assert slack == [{"channel_name": "etl-alerts"}, {}]
+    assert emails == [{"to": "etl@example.com"}]
+
+
+def test_live_runs_only_replace_messages_to_their_destination(
+    notify_extension, monkeypatch
+):
+    notify_extension.update_config(
+        Config(
+            {
+                "NotificationConfig": {
+                    "routing_rules": [
+                        {
+                            "notebook": "etl/**",
+                            "status": "Failed",
+                            "slack_channel": "etl",
+                        }
+                    ]
+                }
+            }
+        )
+    )
+    notify_extension._init_config()
+    slack = []
+    monkeypatch.setattr(
+        notify_extension,
+        "send_slack_notification",
+        lambda message, **kwargs: slack.append(kwargs),
+    )
+
+    for success, recipient in ((True, "UA"), (False, "UA"), (True, None)):
+        params = NotificationParams(
+            cell_id="cell1",
+            mode="always",
+            slackEnabled=True,
+            emailEnabled=False,
+            successMessage="Success",
+            failureMessage="Failure",
+            threshold=0,
+            success=success,
+            notebook_path="etl/load.ipynb",
+            recipient_slack_id=recipient,
+        )
+        params.in_live_run = True
+        notify_extension.send_notification(params)
+
+    # Only the failure, routed away from the run of the user, is posted.
+    assert slack == [{"channel_name": "etl"}]
+
+
+def test_long_errors_are_condensed_per_backend(notify_extension, monkeypatch):
+    notify_extension._config.message_max_bytes = {"slack": 600, "email": 4000}
+    notify_extension._config.error_store_max_bytes = 2**20
+    notify_extension._init_errors()
+    notify_extension.cell_ids = {}
+    slack, emails = [], []
+    monkeypatch.setattr(notify_extension, "send_slack_notification", slack.append)
+    monkeypatch.setattr(notify_extension, "send_email_notification", emails.append)
+
+    params = NotificationParams(
+        cell_id="cell1",
+        mode="always",
+        slackEnabled=True,
+        emailEnabled=True,
+        successMessage="Success",
+        failureMessage="Failure",
+        threshold=0,
+    )
+    notify_extension.cell_ids["cell1"] = params
+    error = "\n".join(f"\x1b[31mline {i}\x1b[0m" for i in range(5000))
+    error += "\nMemoryError: out of memory"
+    notification = notify_extension._handle_cell_event(
+        "cell1",
+        {"event_type": "execution_end", "success": False, "kernel_error": error},
+    )
+    assert len(params.error.encode()) < 4200
+    assert "\x1b" not in params.error
+    notify_extension.send_notification(*notification)
+
+    assert len(slack[0].encode()) <= 600
+    assert len(emails[0].encode()) <= 4000
+    for message in (slack[0], emails[0]):
+        assert message.startswith("Execution Status: Failed")
+        assert "MemoryError: out of memory" in message
+
+    key = params.error.rsplit("/", 1)[1].rstrip("]")
+    assert notify_extension.errors.get(key) == error
+
+
+def test_timeout_due_after_execution_end_sends_nothing(notify_extension, monkeypatch):
+    notify_extension.cell_ids = {}
+    notify_extension._init_dispatch()
+    messages = []
+    monkeypatch.setattr(notify_extension, "send_slack_notification", messages.append)
+
+    params = NotificationParams(
+        cell_id="cell1",
+        mode="custom-timeout",
+        slackEnabled=True,
+        emailEnabled=False,
+        successMessage="Success",
+        failureMessage="Failure",
+        threshold=60,
+    )
+    notify_extension.cell_ids["cell1"] = params
+    notify_extension.schedule_timeout(params)
+    notification = notify_extension._handle_cell_event(
+        "cell1", {"event_type": "execution_end", "success": True}
+    )
+    # The timeout was already running when the cell ended.
+    notify_extension._on_timeout(params)
+    notify_extension.send_notification(*notification)
+
+    assert len(messages) == 1
+    assert "Execution Status: Success" in messages[0]
+
+
+def test_iopub_tracked_registration(notify_extension):
+    notify_extension.cell_ids = {}
+    notify_extension.iopub = MagicMock()
+    params = NotificationParams(
+        cell_id="cell1",
+        mode="always",
+        slackEnabled=True,
+        emailEnabled=False,
+        successMessage="Success",
+        failureMessage="Failure",
+        threshold=0,
+        kernel_id="k1",
+        msg_id="m1",
+    )
+    notify_extension.register_cell(params)
+    notify_extension.iopub.track.assert_called_once_with("k1", "m1", "cell1")
+
+
+def test_open_breaker_fails_sends_fast(notify_extension):
+    notify_extension._init_breakers()
+    smtp = notify_extension._config.smtp_instance
+    smtp.send_message.side_effect = TimeoutError("timed out")
+    for _ in range(5):
+        assert not notify_extension.send_email_notification("message")
+    assert smtp.send_message.call_count == 5
+    assert notify_extension.breakers["smtp"].state == "open"
+
+    assert not notify_extension.send_email_notification("message")
+    assert smtp.send_message.call_count == 5
+    # Slack has its own breaker.
+    assert notify_extension.send_slack_notification("message")
+
+    # A healthy probe lets the next send through, which closes the breaker.
+    smtp.send_message.side_effect = None
+    notify_extension.breakers["smtp"].half_open()
+    assert notify_extension.send_email_notification("message")
+    assert notify_extension.breakers["smtp"].state == "closed"
+
+
+def test_running_index_follows_execution_events(notify_extension):
+    notify_extension.initialize_handlers()
+    params = NotificationParams(
+        cell_id="cell1",
+        mode="always",
+        slackEnabled=False,
+        emailEnabled=False,
+        successMessage="Success",
+        failureMessage="Failure",
+        threshold=0,
+        notebook_path="work/nb.ipynb",
+        user="ann",
+    )
+    notify_extension.register_cell(params)
+    notify_extension._handle_cell_event(
+        "cell1",
+        {"event_type": "execution_start", "timestamp": "2025-03-21T12:00:00Z"},
+    )
+    cells, _, _ = notify_extension.running.longest(10, user="ann")
+    assert cells[0].notebook == "work/nb.ipynb"
+    assert cells[0].started == 1742558400.0
+
+    notify_extension._handle_cell_event(
+        "cell1", {"event_type": "execution_end", "success": True}
+    )
+    assert len(notify_extension.running) == 0
+
+
+def test_message_templates_render_once_per_format(notify_extension, monkeypatch):
+    notify_extension.update_config(
+        Config(
+            {
+                "NotificationConfig": {
+                    "message_templates": {
+                        "slack_blocks": (
+                            '[{"type": "section", "text": '
+                            '{"type": "mrkdwn", "text": "*${status}* ${notebook}"}}]'
+                        ),
+                        "email_html": "<p>${status}: ${message}</p>",
+                        "slack:*:failed": "*${status}* ${message}",
+                    }
+                }
+            }
+        )
+    )
+    notify_extension._init_config()
+    slack, emails = [], []
+    monkeypatch.setattr(
+        notify_extension,
+        "send_slack_notification",
+        lambda message, **kwargs: slack.append((message, kwargs)),
+    )
+    monkeypatch.setattr(
+        notify_extension,
+        "send_email_notification",
+        lambda message, **kwargs: emails.append((message, kwargs)),
+    )
+    renders = []
+    render = CompiledTemplate.render
+    monkeypatch.setattr(
+        CompiledTemplate,
+        "render",
+        lambda self, values: renders.append(self.source) or render(self, values),
+    )
+
+    params = NotificationParams(
+        cell_id="cell1",
+        mode="always",
+        slackEnabled=True,
+        emailEnabled=True,
+        successMessage="Success",
+        failureMessage="Failure",
+        threshold=0,
+        success=True,
+        notebook_name="a<b>.ipynb",
+    )
+    notify_extension.send_notification(params)
+
+    assert (
+        slack[0][0]
+        == emails[0][0]
+        == ("a<b>.ipynb\nExecution Status: Success\nCell id: cell1\nDetails: Success")
+    )
+    assert slack[0][1]["blocks"][0]["text"]["text"] == "*Success* a&lt;b&gt;.ipynb"
+    assert emails[0][1]["html"] == "<p>Success: Success</p>"
+    # Text, blocks and HTML; the text template is shared by Slack and email.
+    assert len(renders) == 3
+
+    params.success = False
+    notify_extension.send_notification(params)
+    assert slack[1][0] == "*Failed* Failure"
+
+
+def test_invalid_message_templates_are_ignored(notify_extension):
+    notify_extension.update_config(
+        Config({"NotificationConfig": {"message_templates": {"text": "$unknown"}}})
+    )
+    notify_extension._init_config()
+    assert notify_extension._config.templates.lookup("text", "always", "Success")
+
+
+def test_kernel_mails_are_queued_on_the_dispatcher(notify_extension):
+    notify_extension._init_breakers()
+    notify_extension._init_dispatch()
+    message = EmailMessage()
+    message["Subject"] = "Cell execution failed"
+    message["To"] = "ann@example.com"
+    try:
+        assert notify_extension.queue_mail(message, success=False) is None
+    finally:
+        notify_extension._dispatch_executor.shutdown(wait=True)
+    smtp = notify_extension._config.smtp_instance
+    smtp.send_message.assert_called_once_with(message)
+    assert notify_extension._in_flight == {}
+
+    notify_extension._config.smtp_instance = None
+    assert notify_extension.queue_mail(message) == "Email is not configured"
+
+
+def _kernel_mail(to="ann@example.com"):
+    message = EmailMessage()
+    message["Subject"] = "Cell execution finished"
+    message["To"] = to
+    message.set_content("42")
+    return message
+
+
+def test_kernel_mails_are_refused_when_they_cannot_be_sent_soon(notify_extension):
+    notify_extension.update_config(
+        Config({"NotificationConfig": {"dispatch_workers": 1, "mail_queue_max": 1}})
+    )
+    notify_extension._init_config()
+    smtp = notify_extension._config.smtp_instance = MagicMock()
+    release = threading.Event()
+    smtp.send_message.side_effect = lambda message: release.wait(5)
+    notify_extension._init_breakers()
+    notify_extension._init_dispatch()
+    try:
+        assert notify_extension.queue_mail(_kernel_mail()) is None
+        assert notify_extension.queue_mail(_kernel_mail()) == "Mail queue is full"
+        release.set()
+        assert _wait_for(lambda: notify_extension._mails_queued == 0)
+        assert notify_extension.queue_mail(_kernel_mail()) is None
+
+        breaker = notify_extension.breakers["smtp"]
+        breaker.state = "open"
+        breaker.opened_at = time.monotonic()
+        assert notify_extension.queue_mail(_kernel_mail()) == (
+            "Email delivery is failing"
+        )
+        assert breaker.rejected == 0
+    finally:
+        notify_extension._dispatch_executor.shutdown(wait=True)
+
+
+async def test_stop_extension_spools_queued_mails(notify_extension, tmp_path):
+    spool_path = str(tmp_path / "spool.jsonl")
+    notify_extension.update_config(
+        Config(
+            {
+                "NotificationConfig": {
+                    "dispatch_workers": 1,
+                    "shutdown_timeout": 0.2,
+                    "spool_path": spool_path,
+                }
+            }
+        )
+    )
+    notify_extension._init_config()
+    smtp = notify_extension._config.smtp_instance = MagicMock()
+    release = threading.Event()
+    smtp.send_message.side_effect = lambda message: release.wait(5)
+    notify_extension._init_dispatch()
+    for to in ("ann@example.com", "bob@example.com"):
+        assert notify_extension.queue_mail(_kernel_mail(to), success=False) is None
+
+    await notify_extension.stop_extension()
+    release.set()
+    assert notify_extension.shutdown_report["in_progress"] == 1
+    assert notify_extension.shutdown_report["spooled"] == 1
+    with open(spool_path) as f:
+        assert json.loads(f.read())["success"] is False
+
+    # The next server sends the spooled mail, still as a failure.
+    smtp.send_message.side_effect = None
+    smtp.send_message.reset_mock()
+    notify_extension._init_dispatch()
+    notify_extension._dispatch_executor = None
+    queued = []
+    queue_mail = notify_extension.queue_mail
+    notify_extension.queue_mail = lambda message, success: (
+        queued.append(success) or queue_mail(message, success)
+    )
+    notify_extension._init_spool()
+    assert queued == [False]
+    message = smtp.send_message.call_args[0][0]
+    assert message["To"] == "bob@example.com"
+    assert message.get_content().strip() == "42"
+
+
+def test_heartbeat_reports_time_since_execution_start(notify_extension, monkeypatch):
+    notify_extension.cell_ids = {}
+    messages = []
+    monkeypatch.setattr(notify_extension, "send_slack_notification", messages.append)
+    started = datetime.now(timezone.utc) - timedelta(hours=1, minutes=2)
+    params = NotificationParams(
+        cell_id="cell_long",
+        mode="custom-timeout",
+        slackEnabled=True,
+        emailEnabled=False,
+        successMessage="Success",
+        failureMessage="Failure",
+        threshold=5,
+        start_time=started.isoformat().replace("+00:00", "Z"),
+    )
+    notify_extension.cell_ids[params.cell_id] = params
+    notify_extension._send_heartbeat(params, 1)
+    assert "Cell still running after 1h 2m" in messages[0]
+
+
+def test_registering_again_cancels_the_previous_timeout(notify_extension, monkeypatch):
+    notify_extension.cell_ids = {}
+    notify_extension._init_dispatch()
+    messages = []
+    monkeypatch.setattr(notify_extension, "send_slack_notification", messages.append)
+
+    def params(threshold):
+        return NotificationParams(
+            cell_id="cell1",
+            mode="custom-timeout",
+            slackEnabled=True,
+            emailEnabled=False,
+            successMessage="Success",
+            failureMessage="Failure",
+            threshold=threshold,
+        )
+
+    first = params(0.05)
+    notify_extension.register_cell(first)
+    notify_extension.register_cell(params(60))
+    time.sleep(0.2)
+    assert first.timer.cancelled
+    assert messages == []
+    assert len(notify_extension.scheduler) == 1
+
+
+def test_smtp_probe_is_bounded_in_time(notify_extension, monkeypatch):
+    monkeypatch.setattr(extension, "HEALTH_PROBE_TIMEOUT", 0.05)
+    left, right = socket.socketpair()
+    timeouts = []
+    smtp = notify_extension._config.smtp_instance
+    smtp.sock = left
+    smtp.noop.side_effect = lambda: timeouts.append(left.gettimeout()) or (250, b"")
+    try:
+        notify_extension._probe_smtp()
+        assert timeouts == [0.05]
+        assert left.gettimeout() is None
+
+        # A send holding the session does not hold the probe for long.
+        with notify_extension._smtp_lock:
+            started = time.monotonic()
+            notify_extension._probe_smtp()
+        assert time.monotonic() - started < 1
+        assert len(timeouts) == 1
+    finally:
+        left.close()
+        right.close()
+
+
+def _regression_params(**kwargs):
+    return NotificationParams(
+        cell_id="cell1",
+        mode="regression",
+        slackEnabled=True,
+        emailEnabled=False,
+        successMessage="Success",
+        failureMessage="Failure",
+        threshold=30,
+        notebook_path="work/pipeline.ipynb",
+        **kwargs,
+    )
+
+
+def test_regression_mode_reports_fast_failures(notify_extension, monkeypatch):
+    notify_extension.durations = DurationHistory()
+    messages = []
+    monkeypatch.setattr(notify_extension, "send_slack_notification", messages.append)
+
+    params = _regression_params(success=False, error="ValueError: bad")
+    params.duration = 1.0
+    notify_extension.send_notification(params)
+    assert len(messages) == 1
+    assert "Execution Status: Failed" in messages[0]
+    assert "p95" not in messages[0]
+
+
+def test_regression_mode_through_trigger(notify_extension, monkeypatch):
+    notify_extension.durations = DurationHistory()
+    for _ in range(10):
+        notify_extension.durations.add("work/pipeline.ipynb", "cell1", 60.0)
+    messages = []
+    monkeypatch.setattr(notify_extension, "send_slack_notification", messages.append)
+
+    def started(seconds_ago):
+        start = datetime.now(timezone.utc) - timedelta(seconds=seconds_ago)
+        return start.isoformat().replace("+00:00", "Z")
+
+    notify_extension.trigger_notification(
+        _regression_params(success=True, start_time=started(70)), "ann"
+    )
+    assert messages == []
+    notify_extension.trigger_notification(
+        _regression_params(success=True, start_time=started(180)), "ann"
+    )
+    assert len(messages) == 1
+    assert "Execution Status: Regression" in messages[0]
+    assert notify_extension.durations.get("work/pipeline.ipynb", "cell1").count == 12
+
+
+def test_client_cannot_set_server_fields(notify_extension, monkeypatch):
+    messages = []
+    monkeypatch.setattr(notify_extension, "send_slack_notification", messages.append)
+    params = notification_params_from_dict(
+        {
+            "cell_id": "cell1",
+            "mode": "default",
+            "slackEnabled": True,
+            "emailEnabled": False,
+            "successMessage": "Success",
+            "failureMessage": "Failure",
+            "threshold": 0,
+            "success": True,
+            "resources": {},
+            "notification_sent": True,
+        }
+    )
+    notify_extension.trigger_notification(params, "ann")
+    assert len(messages) == 1
+    assert "Resources" not in messages[0]
+
+    # Spooled notifications were written by the server and keep them.
+    trusted = notification_params_from_dict(
+        {**asdict(params), "timer": None, "run_total": 3}, trusted=True
+    )
+    assert trusted.run_total == 3
+
+
+def test_triggers_are_dispatched_by_status(notify_extension, monkeypatch):
+    notify_extension._init_dispatch()
+    notify_extension._dispatch_executor.shutdown(wait=True)
+    executor = notify_extension._dispatch_executor = RecordingExecutor()
+    messages = []
+    monkeypatch.setattr(notify_extension, "send_slack_notification", messages.append)
+
+    notify_extension.trigger_notification(_regression_params(success=False), "ann")
+    notify_extension.trigger_notification(
+        _regression_params(success=False), "ann", timed_out=True
+    )
+    notify_extension.trigger_notification(
+        NotificationParams(
+            cell_id="cell2",
+            mode="default",
+            slackEnabled=True,
+            emailEnabled=False,
+            successMessage="Success",
+            failureMessage="Failure",
+            threshold=0,
+            success=True,
+        ),
+        "ann",
+    )
+    assert executor.submitted == [FAILURE, TIMEOUT, SUCCESS]
+    assert "Execution Status: Timeout" in messages[1]
+    assert notify_extension._in_flight == {}
+
+
+def test_housekeeping_runs_below_notifications(notify_extension):
+    notify_extension._init_dispatch()
+    try:
+        dispatcher = notify_extension._dispatch_executor
+        assert dispatcher.default_priority == HOUSEKEEPING
+        assert notify_extension.scheduler.executor is dispatcher
+    finally:
+        notify_extension._dispatch_executor.shutdown(wait=True)
@@ -0,0 +1,50 @@
+from jupyterlab_notify.profile import ExecutionProfiler
+
+
+def _run(profiler, document_id, cell_id, start, end):
+    for event_type, timestamp in (("execution_start", start), ("execution_end", end)):
+        profiler.observe(
+            {
+                "event_type": event_type,
+                "cell_id": cell_id,
+                "document_id": document_id,
+                "success": True,
+                "timestamp": timestamp,
+            }
+        )
+
+
+def test_profiler_is_bounded():
+    profiler = ExecutionProfiler(max_notebooks=2, max_runs=3)
+    for second in range(5):
+        _run(
+            profiler,
+            "json:notebook:1",
+            f"cell{second}",
+            f"2025-03-21T12:00:0{second}Z",
+            f"2025-03-21T12:00:0{second}.500000Z",
+        )
+    profiler.add_alias("a.ipynb", "json:notebook:1")
+
+    report = profiler.report("json:notebook:1")
+    assert [run["cell_id"] for run in report["timeline"]] == ["cell2", "cell3", "cell4"]
+    # Totals still cover every run.
+    assert report["cumulative_time"] == 2.5
+
+    _run(
+        profiler,
+        "json:notebook:2",
+        "cell1",
+        "2025-03-21T12:00:00Z",
+        "2025-03-21T12:00:01Z",
+    )
+    _run(
+        profiler,
+        "json:notebook:3",
+        "cell1",
+        "2025-03-21T12:00:00Z",
+        "2025-03-21T12:00:01Z",
+    )
+    assert len(profiler) == 2
+    assert profiler.resolve("a.ipynb") is None
+    assert profiler.report("json:notebook:1") is None
@@ -0,0 +1,31 @@
+from jupyterlab_notify.ratelimit import RateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_refills_at_the_rate():
+    clock = Clock()
+    limiter = RateLimiter(rate=6.0, burst=3, clock=clock)
+    assert [limiter.allow("ann") for _ in range(4)] == [True, True, True, False]
+    # Each user has their own bucket.
+    assert limiter.allow("bob")
+
+    clock.now = 10.0
+    assert limiter.allow("ann")
+    assert not limiter.allow("ann")
+    clock.now = 1000.0
+    assert [limiter.allow("ann") for _ in range(4)] == [True, True, True, False]
+
+
+def test_least_recent_users_are_forgotten():
+    limiter = RateLimiter(rate=0.0, burst=1, max_keys=2, clock=Clock())
+    for user in ("ann", "bob", "eve"):
+        assert limiter.allow(user)
+    assert limiter.allow("ann")
+    assert not limiter.allow("eve")
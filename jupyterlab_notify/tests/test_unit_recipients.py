@@ -0,0 +1,43 @@
+import json
+from jupyterlab_notify.recipients import (
+    Recipient,
+    RecipientDirectory,
+    load_recipients_file,
+)
+
+
+def test_directory_loads_in_bulk_and_keeps_map_on_failure():
+    entries = {"alice": {"email": "alice@example.com", "slack_user_id": "U1"}}
+    calls = []
+
+    def source():
+        calls.append(1)
+        if len(calls) > 1:
+            raise OSError("unavailable")
+        return entries
+
+    directory = RecipientDirectory(source, ttl=0)
+    assert directory.refresh()
+    assert directory.lookup("alice") == Recipient("alice@example.com", "U1")
+    assert directory.lookup("bob") is None
+    assert directory.lookup(None) is None
+
+    assert not directory.refresh()
+    assert directory.lookup("alice") == Recipient("alice@example.com", "U1")
+
+
+def test_directory_reloads_only_when_expired():
+    calls = []
+    directory = RecipientDirectory(lambda: calls.append(1) or {}, ttl=3600)
+    assert directory.refresh()
+    assert not directory.refresh()
+    assert directory.refresh(force=True)
+    assert len(calls) == 2
+
+
+def test_load_recipients_file(tmp_path):
+    path = tmp_path / "recipients.json"
+    path.write_text(json.dumps({"bob": {"slack_user_id": "U2"}}))
+    directory = RecipientDirectory(lambda: load_recipients_file(str(path)))
+    directory.refresh()
+    assert directory.lookup("bob") == Recipient(None, "U2")
@@ -0,0 +1,40 @@
+import os
+import sys
+import time
+import pytest
+from jupyterlab_notify.resources import ResourceSampler, read_process_usage
+from jupyterlab_notify.scheduler import Scheduler
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="requires /proc"
+)
+
+
+def test_read_process_usage():
+    cpu, rss = read_process_usage(os.getpid())
+    assert cpu > 0
+    assert rss > 0
+    # Not a running process.
+    assert read_process_usage(2**22 + 1) is None
+
+
+def test_sampler_tracks_peak_and_cpu():
+    scheduler = Scheduler()
+    sampler = ResourceSampler(scheduler, interval=0.01)
+    assert sampler.start("cell1", os.getpid())
+
+    buffer = bytearray(64 * 1024 * 1024)
+    deadline = time.process_time() + 0.2
+    while time.process_time() < deadline:
+        pass
+    time.sleep(0.05)
+    peak_during = read_process_usage(os.getpid())[1]
+    del buffer
+
+    usage = sampler.stop("cell1")
+    scheduler.stop()
+    assert usage.cpu_seconds >= 0.1
+    assert usage.peak_rss >= peak_during - 4096
+    assert usage.wall_time > 0.2
+    assert len(sampler) == 0
+    assert sampler.stop("cell1") is None
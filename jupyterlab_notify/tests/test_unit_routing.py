@@ -0,0 +1,72 @@
+import pytest
+from jupyterlab_notify.routing import Route, Router, RoutingRuleError, glob_to_regex
+
+
+@pytest.mark.parametrize(
+    "pattern, path, expected",
+    [
+        ("projects/etl/**", "projects/etl/daily.ipynb", True),
+        ("projects/etl/**", "projects/etl/sub/daily.ipynb", True),
+        ("projects/etl/**", "projects/etlx/daily.ipynb", False),
+        ("prod/*.ipynb", "prod/report.ipynb", True),
+        ("prod/*.ipynb", "prod/sub/report.ipynb", False),
+        ("**/scratch-?.ipynb", "a/b/scratch-1.ipynb", True),
+        ("**/scratch-?.ipynb", "scratch-1.ipynb", True),
+        ("*.ipynb", "dir/top.ipynb", False),
+    ],
+)
+def test_glob_to_regex(pattern, path, expected):
+    assert (glob_to_regex(pattern).match(path) is not None) is expected
+
+
+def test_router_first_matching_rule_wins():
+    router = Router(
+        [
+            {"notebook": "prod/*.ipynb", "status": "failed", "email": "ops@x.org"},
+            {"notebook": "projects/etl/**", "slack_channel": "etl-alerts"},
+            {"notebook": "prod/*.ipynb", "slack_channel": "prod"},
+            {"user": ["alice"], "slack_user_id": "UA"},
+        ]
+    )
+    assert router.route("prod/a.ipynb", "Failed") == Route(email="ops@x.org")
+    assert router.route("prod/a.ipynb", "Success") == Route(slack_channel="prod")
+    assert router.route("/projects/etl/x/y.ipynb", "Timeout", "alice") == Route(
+        slack_channel="etl-alerts"
+    )
+    assert router.route("other.ipynb", "Success", "alice") == Route(slack_user_id="UA")
+    assert router.route("other.ipynb", "Success", "bob") is None
+
+
+def test_router_only_tests_rules_sharing_the_literal_prefix():
+    rules = [{"notebook": f"team{i}/**", "slack_channel": f"c{i}"} for i in range(500)]
+    router = Router(rules)
+    assert len(router) == 500
+    assert router._root.buckets == {}
+    assert router.route("team321/x.ipynb", "Success") == Route(slack_channel="c321")
+
+
+@pytest.mark.parametrize(
+    "rule",
+    [
+        {"notebook": "a/**"},
+        {"status": "exploded", "email": "x@y.org"},
+        {"colour": "red", "email": "x@y.org"},
+        {"user": 3, "email": "x@y.org"},
+    ],
+)
+def test_router_rejects_invalid_rules(rule):
+    with pytest.raises(RoutingRuleError):
+        Router([rule])
+
+
+def test_router_indexes_rules_without_prefix_by_status_and_user():
+    rules = [{"user": f"user{i}", "slack_user_id": f"U{i}"} for i in range(500)]
+    rules.append({"status": "failed", "email": "ops@x.org"})
+    rules.append({"notebook": "**", "slack_channel": "all"})
+    router = Router(rules)
+    assert len(router._root.buckets) == 502
+    assert router._root.buckets[("failed", None)][0].route == Route(email="ops@x.org")
+    assert router.route("x.ipynb", "Success", "user321") == Route(slack_user_id="U321")
+    assert router.route("x.ipynb", "Failed", "bob") == Route(email="ops@x.org")
+    assert router.route("x.ipynb", "Success", "bob") == Route(slack_channel="all")
+    assert router.route("x.ipynb", "Success") == Route(slack_channel="all")
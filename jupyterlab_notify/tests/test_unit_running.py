@@ -0,0 +1,57 @@
+from jupyterlab_notify.running import (
+    RunningCell,
+    RunningIndex,
+    format_cursor,
+    parse_cursor,
+)
+
+
+def _index():
+    index = RunningIndex()
+    for i, (user, notebook) in enumerate(
+        [("ann", "a.ipynb"), ("bob", "a.ipynb"), ("ann", "b.ipynb"), ("bob", "b.ipynb")]
+    ):
+        index.start(
+            RunningCell(f"c{i}", started=float(i), notebook=notebook, user=user)
+        )
+    return index
+
+
+def test_longest_running_by_user_and_notebook():
+    index = _index()
+    cells, cursor, total = index.longest(10)
+    assert [cell.cell_id for cell in cells] == ["c0", "c1", "c2", "c3"]
+    assert cursor is None and total == 4
+
+    cells, _, total = index.longest(10, user="ann")
+    assert [cell.cell_id for cell in cells] == ["c0", "c2"]
+    cells, _, _ = index.longest(10, notebook="b.ipynb")
+    assert [cell.cell_id for cell in cells] == ["c2", "c3"]
+    cells, _, total = index.longest(10, user="bob", notebook="b.ipynb")
+    assert [cell.cell_id for cell in cells] == ["c3"] and total == 1
+
+
+def test_pagination_and_finish():
+    index = _index()
+    cells, cursor, _ = index.longest(2)
+    assert cursor == (1.0, "c1")
+    assert parse_cursor(format_cursor(cursor)) == cursor
+    cells, cursor, _ = index.longest(2, after=cursor)
+    assert [cell.cell_id for cell in cells] == ["c2", "c3"]
+    assert cursor is None
+
+    assert index.finish("c0").cell_id == "c0"
+    assert index.finish("c0") is None
+    assert "c0" not in index
+    index.finish("c2")
+    cells, _, _ = index.longest(10, user="ann")
+    assert cells == []
+    assert "ann" not in index._by_user
+
+
+def test_restart_replaces_entry():
+    index = _index()
+    index.start(RunningCell("c0", started=10.0, notebook="a.ipynb", user="ann"))
+    cells, _, _ = index.longest(10)
+    assert [cell.cell_id for cell in cells] == ["c1", "c2", "c3", "c0"]
+    assert len(index) == 4
@@ -0,0 +1,123 @@
+import json
+import os
+import socketserver
+import threading
+from email.message import EmailMessage
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from jupyterlab_notify.server_mail import ServerMail, find_server
+
+
+class MailServer:
+    """HTTP server answering mail posts with ``code``, recording requests."""
+
+    def __init__(self, code=202, sock=None):
+        self.code = code
+        self.requests = []
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                outer.requests.append((self.path, dict(self.headers), body))
+                self.send_response(outer.code)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        if sock is None:
+            self.server = HTTPServer(("127.0.0.1", 0), Handler)
+            self.info = {"url": f"http://127.0.0.1:{self.server.server_port}/"}
+        else:
+
+            class UnixServer(socketserver.UnixStreamServer):
+                def get_request(self):
+                    request, _ = super().get_request()
+                    return request, ("local", 0)
+
+            self.server = UnixServer(sock, Handler)
+            self.info = {"url": "http+unix://server/", "sock": sock}
+        self.info.update(token="secret", base_url="/lab/")
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _message():
+    message = EmailMessage()
+    message["Subject"] = "Done"
+    message["To"] = "ann@example.com"
+    message.set_content("42")
+    return message
+
+
+def test_find_server_next_to_the_connection_file(tmp_path):
+    info = {"pid": 4242, "url": "http://localhost:8888/", "token": "t"}
+    (tmp_path / "jpserver-4242.json").write_text(json.dumps(info))
+    (tmp_path / "jpserver-7.json").write_text(json.dumps(dict(info, pid=7)))
+    connection_file = str(tmp_path / "kernel-abc.json")
+
+    assert find_server(connection_file, pid=4242) == info
+    assert find_server(connection_file, pid=1) is None
+
+
+def test_posts_mail_with_the_server_token():
+    server = MailServer()
+    message = _message()
+    try:
+        assert ServerMail(server.info).send(message, success=False)
+    finally:
+        server.close()
+    path, headers, body = server.requests[0]
+    assert path == "/lab/api/jupyter-notify/mail?status=failure"
+    assert headers["Authorization"] == "token secret"
+    assert headers["Content-Type"] == "message/rfc822"
+    assert b"Subject: Done" in body
+    # The server addresses the mail; the message of the caller is unchanged.
+    assert b"To:" not in body
+    assert message["To"] == "ann@example.com"
+
+
+@pytest.mark.skipif(not hasattr(socketserver, "UnixStreamServer"), reason="POSIX")
+def test_posts_mail_over_the_server_unix_socket(tmp_path):
+    server = MailServer(sock=str(tmp_path / "jupyter.sock"))
+    try:
+        assert ServerMail(server.info).send(_message())
+    finally:
+        server.close()
+    assert server.requests[0][0] == "/lab/api/jupyter-notify/mail?status=success"
+
+
+def test_refusing_server_is_not_asked_again():
+    server = MailServer(code=404)
+    server_mail = ServerMail(server.info)
+    try:
+        assert not server_mail.send(_message())
+        assert not server_mail.send(_message())
+    finally:
+        server.close()
+    assert len(server.requests) == 1
+
+
+def test_unreachable_server_is_retried(tmp_path):
+    server_mail = ServerMail(
+        {"url": "http://server/", "sock": os.path.join(tmp_path, "missing.sock")}
+    )
+    assert not server_mail.send(_message())
+    assert not server_mail.refused
+
+
+def test_rate_limited_mails_are_retried():
+    server = MailServer(code=429)
+    server_mail = ServerMail(server.info)
+    try:
+        assert not server_mail.send(_message())
+        assert not server_mail.send(_message())
+    finally:
+        server.close()
+    assert len(server.requests) == 2
@@ -0,0 +1,57 @@
+import random
+from jupyterlab_notify.stats import DurationHistory, P2Quantile
+
+
+def test_p2_quantile_tracks_p95():
+    rng = random.Random(42)
+    samples = [rng.expovariate(1 / 30) for _ in range(5000)]
+    sketch = P2Quantile(0.95)
+    for sample in samples:
+        sketch.add(sample)
+
+    exact = sorted(samples)[int(0.95 * len(samples))]
+    assert abs(sketch.value() - exact) / exact < 0.05
+
+
+def test_p2_quantile_with_few_samples():
+    sketch = P2Quantile(0.95)
+    assert sketch.value() is None
+    for sample in (3.0, 1.0, 2.0):
+        sketch.add(sample)
+    assert sketch.value() == 3.0
+
+
+def test_duration_history_persists(tmp_path):
+    path = str(tmp_path / "durations.json")
+    history = DurationHistory(path)
+    for duration in range(1, 21):
+        history.add("analysis.ipynb", "cell1", float(duration))
+    history.add("other.ipynb", "cell1", 5.0)
+    assert history.save()
+    # Nothing changed since the last save.
+    assert not history.save()
+
+    restored = DurationHistory(path)
+    stats = restored.get("analysis.ipynb", "cell1")
+    original = history.get("analysis.ipynb", "cell1")
+    assert stats.count == 20
+    assert stats.ewma == original.ewma
+    assert stats.quantile.value() == original.quantile.value()
+    assert restored.get("other.ipynb", "cell1").count == 1
+
+    # The restored sketch keeps updating like the original one.
+    stats.add(100.0, restored.alpha)
+    original.add(100.0, history.alpha)
+    assert stats.quantile.value() == original.quantile.value()
+
+
+def test_duration_history_evicts_least_recently_run(tmp_path):
+    history = DurationHistory(max_cells=2)
+    history.add("nb", "cell1", 1.0)
+    history.add("nb", "cell2", 1.0)
+    history.add("nb", "cell1", 1.0)
+    history.add("nb", "cell3", 1.0)
+
+    assert len(history) == 2
+    assert history.get("nb", "cell2") is None
+    assert history.get("nb", "cell1").count == 2
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+from jupyterlab_notify.templates import (
+    CompiledTemplate,
+    MessageFields,
+    TemplateError,
+    TemplateSet,
+)
+
+
+def _fields(**values):
+    calls = []
+
+    def provider(name, value):
+        def provide():
+            calls.append(name)
+            return value
+
+        return provide
+
+    fields = MessageFields({name: provider(name, v) for name, v in values.items()})
+    return fields, calls
+
+
+def test_compiled_template_renders_fields_and_literals():
+    template = CompiledTemplate("$$${status}: $message ($user)")
+    assert template.fields == ["status", "message", "user"]
+    assert (
+        template.render({"status": "Failed", "message": "boom", "user": "ann"})
+        == "$Failed: boom (ann)"
+    )
+
+
+@pytest.mark.parametrize("source", ["$unknown", "${status", "cost: $5"])
+def test_compiled_template_rejects_invalid_sources(source):
+    with pytest.raises(TemplateError):
+        CompiledTemplate(source)
+
+
+def test_default_text_template_matches_plain_message():
+    fields, _ = _fields(
+        status="Success",
+        cell_info="Cell: 3",
+        message="Done",
+        notebook_line=None,
+        resources_line=None,
+    )
+    message = TemplateSet().message("always", "Success", fields)
+    assert message.text == "Execution Status: Success\nCell: 3\nDetails: Done"
+    # Formats without templates fall back to text, or have none.
+    assert message.render("slack") is message.text
+    assert message.render("email") is message.text
+    assert message.render("slack_blocks") is None
+    assert message.render("email_html") is None
+
+
+def test_most_specific_template_wins():
+    templates = TemplateSet(
+        {
+            "slack": "any $status",
+            "slack:on-error": "on-error $status",
+            "slack:*:failed": "failed $status",
+            "slack:always:Failed": "always failed",
+        }
+    )
+    assert templates.lookup("slack", "always", "Failed").source == "always failed"
+    assert templates.lookup("slack", "on-error", "Failed").source == "on-error $status"
+    assert templates.lookup("slack", "default", "Failed").source == "failed $status"
+    assert templates.lookup("slack", "default", "Success").source == "any $status"
+    assert templates.lookup("email", "default", "Success") is templates.lookup(
+        "text", "default", "Success"
+    )
+
+
+def test_fields_and_renders_are_computed_once_per_message():
+    templates = TemplateSet(
+        {
+            "slack": "*$status* $message",
+            "email_html": "<b>$status</b> $message",
+        }
+    )
+    fields, calls = _fields(status="Failed", message="a < b & c")
+    message = templates.message("always", "Failed", fields)
+    slack = message.render("slack")
+    assert slack == "*Failed* a &lt; b &amp; c"
+    assert message.render("slack") is slack
+    assert message.render("email_html") == "<b>Failed</b> a &lt; b &amp; c"
+    assert sorted(calls) == ["message", "status"]
+
+
+def test_slack_blocks_are_json_escaped():
+    source = '[{"type": "section", "text": {"type": "mrkdwn", "text": "$message"}}]'
+    fields, _ = _fields(message='quote " and\nnewline <x>')
+    message = TemplateSet({"slack_blocks": source}).message("always", "Failed", fields)
+    blocks = json.loads(message.render("slack_blocks"))
+    assert blocks[0]["text"]["text"] == 'quote " and\nnewline &lt;x&gt;'
+
+
+@pytest.mark.parametrize(
+    "templates",
+    [
+        {"sms": "$status"},
+        {"slack:a:b:c": "$status"},
+        {"text": "$nope"},
+        {"slack_blocks": '{"text": "$status"}'},
+        {"slack_blocks": "[$status]"},
+    ],
+)
+def test_template_set_rejects_invalid_templates(templates):
+    with pytest.raises(TemplateError):
+        TemplateSet(templates)
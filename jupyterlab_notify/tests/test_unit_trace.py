@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+from jupyterlab_notify.replay import replay
+from jupyterlab_notify.trace import EventRecorder, read_trace
+
+
+def test_recorder_anonymizes_ids(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    recorder = EventRecorder(str(path))
+    recorder.registration("cell-secret", "always", 0)
+    recorder.event(
+        {
+            "event_type": "execution_end",
+            "cell_id": "cell-secret",
+            "document_id": "json:notebook:/home/me/private.ipynb",
+            "success": False,
+            "kernel_error": "KeyError: 'password'",
+        },
+        registered=True,
+    )
+    recorder.close()
+
+    text = path.read_text()
+    assert "secret" not in text
+    assert "private" not in text
+    assert "password" not in text
+    header, registration, end = [json.loads(line) for line in text.splitlines()]
+    assert header["v"] == 1
+    assert registration["k"] == "reg"
+    assert end == {
+        "t": end["t"],
+        "k": "end",
+        "c": registration["c"],
+        "d": end["d"],
+        "r": True,
+        "ok": False,
+        "err": True,
+    }
+
+
+def test_read_trace_chains_appended_recordings(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    lines = [
+        {"v": 1, "started": 0},
+        {"t": 1.0, "k": "start", "c": "a"},
+        {"t": 2.0, "k": "end", "c": "a", "ok": True},
+        {"v": 1, "started": 100},
+        {"t": 0.5, "k": "start", "c": "b"},
+    ]
+    path.write_text("\n".join(json.dumps(line) for line in lines) + "\nnot json\n")
+    assert [record["t"] for record in read_trace(str(path))] == [1.0, 2.0, 2.5]
+
+
+def test_replay_reports_one_notification_per_registration():
+    records = []
+    for i in range(5):
+        cell = f"c{i}"
+        t = i * 0.2
+        records += [
+            {"t": t, "k": "reg", "c": cell, "m": "default", "th": 0},
+            {"t": t + 0.01, "k": "start", "c": cell, "d": "d", "r": True},
+            {"t": t + 0.1, "k": "end", "c": cell, "d": "d", "r": True, "ok": i != 2},
+        ]
+    records.append({"t": 1.0, "k": "reg", "c": "never", "m": "never", "th": 0})
+    records.append({"t": 1.1, "k": "end", "c": "never", "r": True, "ok": True})
+
+    report = asyncio.run(replay(records, speed=10))
+
+    assert report["registrations"] == 6
+    assert report["notifications"] == 5
+    assert report["dropped"] == report["duplicated"] == report["unexpected"] == 0
+    assert report["latency"]["max"] is not None
+    assert report["registry"]
+
+
+def test_replay_defaults_records_without_mode_or_threshold():
+    records = [
+        {"t": 0.0, "k": "reg", "c": "slow"},
+        {"t": 0.01, "k": "reg", "c": "fast", "m": None, "th": None},
+        {"t": 0.02, "k": "start", "c": "slow", "d": "d", "r": True},
+        {"t": 0.03, "k": "start", "c": "fast", "d": "d", "r": True},
+        {"t": 0.04, "k": "end", "c": "fast", "d": "d", "r": True, "ok": True},
+        {"t": 0.05, "k": "end", "c": "slow", "d": "d", "r": True, "ok": True},
+    ]
+    report = asyncio.run(replay(records, speed=10))
+
+    # Replayed in default mode, with no threshold: both are notified.
+    assert report["registrations"] == 2
+    assert report["notifications"] == 2
+    assert report["dropped"] == report["unexpected"] == 0
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import IO, Any, Dict, Iterator, List, Optional
+
+TRACE_VERSION = 1
+
+
+class EventRecorder:
+    """
+    Record the cell execution events and registrations seen by the server.
+
+    Each line of the JSON lines file is one record, with its time ``t`` in
+    seconds since the recording started. Cell and document ids are replaced
+    by salted hashes, stable within one file only, and errors by a flag, so
+    a trace holds no code, output or path. Records are buffered and written
+    by the file object; ``close`` flushes them.
+    """
+
+    def __init__(self, path: str, log: Optional[logging.Logger] = None) -> None:
+        self.path = path
+        self.log = log or logging.getLogger(__name__)
+        self._salt = os.urandom(16)
+        self._started = time.monotonic()
+        self.count = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file: Optional[IO[str]] = open(path, "a")
+        self._write({"v": TRACE_VERSION, "started": time.time()})
+
+    def _anonymize(self, value: Optional[str]) -> Optional[str]:
+        if not value:
+            return None
+        return hashlib.blake2b(
+            value.encode("utf-8"), digest_size=8, key=self._salt
+        ).hexdigest()
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        if self._file is None:
+            return
+        try:
+            self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        except (OSError, ValueError) as exc:
+            self.log.error(f"Stopped recording events to {self.path}: {exc}")
+            self.close()
+
+    def _elapsed(self) -> float:
+        return round(time.monotonic() - self._started, 4)
+
+    def registration(
+        self,
+        cell_id: str,
+        mode: str,
+        threshold: float,
+        cell_ids: Optional[List[str]] = None,
+    ) -> None:
+        """Record a cell registration, or a run of ``cell_ids`` named ``cell_id``."""
+        record = {
+            "t": self._elapsed(),
+            "k": "reg" if cell_ids is None else "run",
+            "c": self._anonymize(cell_id),
+            "m": mode,
+            "th": threshold,
+        }
+        if cell_ids is not None:
+            record["cs"] = [self._anonymize(cell) for cell in cell_ids]
+        self._write(record)
+
+    def event(self, data: Dict[str, Any], registered: bool) -> None:
+        event_type = data.get("event_type")
+        record = {
+            "t": self._elapsed(),
+            "k": "start" if event_type == "execution_start" else "end",
+            "c": self._anonymize(data.get("cell_id")),
+            "d": self._anonymize(data.get("document_id")),
+            "r": registered,
+        }
+        if event_type == "execution_end":
+            record["ok"] = bool(data.get("success"))
+            record["err"] = bool(data.get("kernel_error"))
+        self._write(record)
+        self.count += 1
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+        except OSError as exc:
+            self.log.error(f"Failed to close event trace {self.path}: {exc}")
+        self._file = None
+
+
+def read_trace(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the records of a trace, skipping headers and invalid lines.
+
+    A file appended to by several server runs holds one recording after the
+    other; their times are shifted to follow each other.
+    """
+    offset = last = 0.0
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(record, dict):
+                continue
+            if "v" in record:
+                offset = last
+            elif "k" in record and isinstance(record.get("t"), (int, float)):
+                record["t"] += offset
+                last = record["t"]
+                yield record
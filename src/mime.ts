@@ -9,7 +9,7 @@ import { Widget } from '@lumino/widgets';
 /**
  * The default mime type for the extension.
  */
-const MIME_TYPE = 'application/desktop-notify+json';
+export const MIME_TYPE = 'application/desktop-notify+json';
 const PROCESSED_KEY = 'isProcessed';
 // The below can be used to customize notifications
 const NOTIFICATION_OPTIONS = {
@@ -21,6 +21,7 @@ interface INotifyMimeData {
   payload: Record<string, unknown>;
   isProcessed: boolean;
   id: string;
+  transient?: boolean;
 }
 
 /**
@@ -47,9 +47,21 @@ export interface INotifyMetadata {
  */
 export interface IInitialResponse {
   nbmodel_installed: boolean;
+  iopub_tracking?: boolean;
   email_configured: boolean;
   slack_configured: boolean;
   smtp_server_running: boolean;
+  health?: Record<string, IBackendHealth>;
+}
+
+/**
+ * Cached result of a server-side backend health probe
+ */
+export interface IBackendHealth {
+  ok: boolean | null;
+  checked_at: number | null;
+  latency: number | null;
+  error: string | null;
 }
 
 /**
@@ -64,8 +76,11 @@ export interface INotifyPayload {
   failureMessage: string;
   threshold: number | null;
   notebook_name: string;
+  notebook_path: string | null;
+  kernel_id: string | null;
   notebookId: string;
   execution_count: number | null;
+  msg_id?: string;
 }
 
 /**
@@ -104,6 +119,7 @@ export const ModeIds = [
   'never',
   'on-error',
   'custom-timeout',
+  'regression',
 ] as const;
 export type ModeId = (typeof ModeIds)[number];
 